@@ -0,0 +1,226 @@
+"""Asyncio serving mode for the chat API, an alternative to backend_server.py's Flask server.
+
+Serves /api/chat, /api/chat/stream, /api/clear-history, /api/knowledge-base-info,
+/api/health and /metrics on aiohttp.
+Completions go through one shared AsyncOpenAI client with a pooled connection
+limit, so requests waiting on OpenAI never hold a worker and don't block each
+other. Retrieval (FAISS/BM25 search, plus the query embedding on a cache miss)
+runs in a bounded thread pool. Chat requests beyond the concurrency limit wait
+in a bounded queue and are answered 503 with Retry-After once it is full.
+
+    python async_server.py
+"""
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Add current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chatbot import TFTChatbotManager
+from resilience import AdmissionController, Overloaded
+from session_store import SESSION_ID_RE, resolve_session_id
+from telemetry import CONTENT_TYPE, REGISTRY
+
+NO_CACHE_HEADERS = {
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'Expires': '0'
+}
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    """Allow cross-origin calls from the frontend, like flask_cors in backend_server.py"""
+    if request.method == 'OPTIONS':
+        response = web.Response()
+    else:
+        response = await handler(request)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Cache-Control, Pragma, X-Session-ID'
+    response.headers['Access-Control-Expose-Headers'] = 'X-Session-ID'
+    return response
+
+
+async def _read_json(request) -> dict:
+    try:
+        data = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _session_id(request, data: dict) -> str:
+    return resolve_session_id(data.get('session_id') or request.headers.get('X-Session-ID'))
+
+
+def _overloaded(error: Overloaded):
+    return web.json_response({'error': 'Server overloaded, please retry shortly'}, status=503,
+                             headers={'Retry-After': str(error.retry_after)})
+
+
+async def chat(request):
+    data = await _read_json(request)
+    message = str(data.get('message', '')).strip()
+    if not message:
+        return web.json_response({'error': 'Message is required'}, status=400)
+
+    session_id = _session_id(request, data)
+    try:
+        async with request.app['admission'].aadmit():
+            response = await request.app['chatbot_manager'].aget_response(message, session_id)
+    except Overloaded as e:
+        return _overloaded(e)
+    return web.json_response({'response': response, 'session_id': session_id}, headers=NO_CACHE_HEADERS)
+
+
+async def chat_stream(request):
+    """Stream the answer as Server-Sent Events: `data: {"delta": ...}` chunks, then `event: done`"""
+    data = await _read_json(request)
+    message = str(data.get('message', '')).strip()
+    if not message:
+        return web.json_response({'error': 'Message is required'}, status=400)
+
+    session_id = _session_id(request, data)
+    # Admitted before the response starts, so a shed request can still be answered 503
+    try:
+        async with request.app['admission'].aadmit():
+            response = web.StreamResponse(headers={
+                'Content-Type': 'text/event-stream',
+                'Cache-Control': 'no-cache, no-store, must-revalidate',
+                'X-Accel-Buffering': 'no',  # Disable proxy buffering
+                'X-Session-ID': session_id
+            })
+            await response.prepare(request)
+            try:
+                async for delta in request.app['chatbot_manager'].astream_response(message, session_id):
+                    await response.write(f"data: {json.dumps({'delta': delta})}\n\n".encode('utf-8'))
+                await response.write(f"event: done\ndata: {json.dumps({'session_id': session_id})}\n\n".encode('utf-8'))
+            except ConnectionResetError:
+                return response  # Client went away mid-stream
+            except Exception as e:
+                print(f"Error in chat stream endpoint: {e}")
+                await response.write(f"event: error\ndata: {json.dumps({'error': 'Internal server error'})}\n\n".encode('utf-8'))
+    except Overloaded as e:
+        return _overloaded(e)
+    await response.write_eof()
+    return response
+
+
+async def clear_history(request):
+    """Forget the conversation history of the requesting session"""
+    data = await _read_json(request)
+    session_id = data.get('session_id') or request.headers.get('X-Session-ID', '')
+    if not isinstance(session_id, str) or not SESSION_ID_RE.match(session_id):
+        return web.json_response({'error': 'A valid session_id is required'}, status=400)
+
+    # Deletes the session from SQLite too when TFT_SESSION_DB is set
+    await asyncio.to_thread(request.app['chatbot_manager'].clear_history, session_id)
+    return web.json_response({'status': 'cleared', 'session_id': session_id})
+
+
+async def stats(request):
+    """Cache, session, request coalescing, circuit breaker and admission statistics"""
+    return web.json_response({**request.app['chatbot_manager'].get_stats(),
+                              'admission': request.app['admission'].get_stats()})
+
+
+async def knowledge_base_info(request):
+    """Knowledge base statistics, revalidated with If-None-Match against their ETag"""
+    body, etag = request.app['chatbot_manager'].knowledge_base_info()
+    if any(match.value in (etag, '*') for match in request.if_none_match or ()):
+        response = web.Response(status=304)
+    else:
+        response = web.Response(body=body, content_type='application/json')
+    response.etag = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+async def metrics(request):
+    """Prometheus metrics: per-stage latency, tokens, cache hit rates, upstream errors and index size"""
+    return web.Response(body=REGISTRY.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+
+async def health(request):
+    return web.json_response({
+        'status': 'healthy',
+        'chatbot_initialized': request.app['chatbot_manager'].chatbot is not None,
+        'mode': 'async'
+    })
+
+
+def create_app(chatbot_manager: TFTChatbotManager, max_concurrency: int = 64,
+               retrieval_threads: Optional[int] = None, max_queue: int = 64,
+               queue_timeout: float = 2.0) -> web.Application:
+    """Build the aiohttp application around an initialized chatbot manager.
+
+    At most `max_concurrency` chat requests run at once; up to `max_queue` more
+    wait at most `queue_timeout` seconds for their turn, and the rest are shed.
+    Retrieval can block on a query embedding, so by default every admitted
+    request gets a retrieval thread.
+    """
+    app = web.Application(middlewares=[cors_middleware])
+    app['chatbot_manager'] = chatbot_manager
+    app['admission'] = AdmissionController(max_concurrency, max_queue, queue_timeout)
+    REGISTRY.register_collector("admission", app['admission'].collect_metrics)
+
+    async def start_retrieval_pool(app):
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=retrieval_threads or max_concurrency, thread_name_prefix="retrieval")
+        )
+
+    async def close_openai_client(app):
+        if chatbot_manager.chatbot is not None:
+            await chatbot_manager.chatbot.async_client.close()
+
+    app.on_startup.append(start_retrieval_pool)
+    app.on_cleanup.append(close_openai_client)
+    app.router.add_post('/api/chat', chat)
+    app.router.add_post('/api/chat/stream', chat_stream)
+    app.router.add_post('/api/clear-history', clear_history)
+    app.router.add_get('/api/stats', stats)
+    app.router.add_get('/api/knowledge-base-info', knowledge_base_info)
+    app.router.add_get('/api/health', health)
+    app.router.add_get('/metrics', metrics)
+    app.router.add_route('OPTIONS', '/{tail:.*}', health)  # CORS preflight, answered by the middleware
+    return app
+
+
+if __name__ == '__main__':
+    print("🚀 Starting TFT QA Bot Backend Server (async mode)...")
+
+    openai_api_key = os.getenv('OPENAI_API_KEY')
+    if not openai_api_key:
+        print("❌ OPENAI_API_KEY not found in environment variables")
+        sys.exit(1)
+
+    chatbot_manager = TFTChatbotManager(openai_api_key)
+    sync_on_start = os.getenv('TFT_SYNC_ON_START', 'false').lower() == 'true'
+    if not chatbot_manager.initialize(force_rebuild=False, sync=sync_on_start):
+        print("❌ Failed to initialize chatbot. Exiting.")
+        sys.exit(1)
+
+    port = int(os.getenv('PORT', '5000'))
+    print(f"🌐 Starting aiohttp server on 0.0.0.0:{port}")
+    web.run_app(
+        create_app(
+            chatbot_manager,
+            max_concurrency=int(os.getenv('TFT_ASYNC_MAX_CONCURRENCY', '64')),
+            retrieval_threads=int(os.getenv('TFT_ASYNC_RETRIEVAL_THREADS', '0')) or None,
+            max_queue=int(os.getenv('TFT_MAX_QUEUE', '64')),
+            queue_timeout=float(os.getenv('TFT_QUEUE_TIMEOUT', '2'))
+        ),
+        host='0.0.0.0',
+        port=port,
+        print=None
+    )
@@ -1,6 +1,8 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, make_response, Response, stream_with_context
 from flask_cors import CORS
+import functools
 import os
+import signal
 import sys
 import json
 from dotenv import load_dotenv
@@ -13,6 +15,10 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import your existing chatbot
 from chatbot import TFTChatbotManager
+from session_store import SESSION_ID_RE, resolve_session_id
+from batch_qa import BatchInputError, read_questions, with_ids
+from resilience import AdmissionController, Overloaded
+from telemetry import CONTENT_TYPE, REGISTRY
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
@@ -20,6 +26,14 @@ CORS(app)  # Enable CORS for React frontend
 # Initialize chatbot manager
 chatbot_manager = None
 
+# Chat requests answered at once (per process); beyond that a bounded queue, then 503
+admission = AdmissionController(
+    max_concurrency=int(os.getenv('TFT_MAX_CONCURRENCY', '16')),
+    max_queue=int(os.getenv('TFT_MAX_QUEUE', '64')),
+    queue_timeout=float(os.getenv('TFT_QUEUE_TIMEOUT', '2'))
+)
+REGISTRY.register_collector("admission", admission.collect_metrics)
+
 def initialize_chatbot():
     global chatbot_manager
     try:
@@ -36,7 +50,8 @@ def initialize_chatbot():
         
         # Initialize the chatbot (this will load/create the vector store)
         print("🔧 Initializing vector store...")
-        chatbot_manager.initialize(force_rebuild=False)
+        sync_on_start = os.getenv('TFT_SYNC_ON_START', 'false').lower() == 'true'
+        chatbot_manager.initialize(force_rebuild=False, sync=sync_on_start)
         
         # Verify enhanced search is available
         if hasattr(chatbot_manager.chatbot, '_get_enhanced_context'):
@@ -53,7 +68,52 @@ def initialize_chatbot():
         traceback.print_exc()
         return False
 
+def create_app():
+    """Application factory for multi-process serving (gunicorn -c gunicorn.conf.py).
+    
+    Called once in the gunicorn master: the chatbot is initialized and every index
+    shard loaded before the workers are forked, so they share the index in memory.
+    """
+    if chatbot_manager is None:
+        if not initialize_chatbot():
+            raise RuntimeError("Failed to initialize chatbot")
+        chatbot_manager.vector_store.load_all_shards()
+    return app
+
+def reload_index(signum=None, frame=None):
+    """Swap in the index saved on disk (SIGHUP)"""
+    if chatbot_manager:
+        chatbot_manager.reload_index()
+
+def admitted(view):
+    """Answer a chat endpoint within the admission limits; shed requests get 503 with Retry-After.
+    
+    The slot is held until the response is closed, so streamed answers keep it while they stream.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            admission.acquire()
+        except Overloaded as e:
+            response = jsonify({'error': 'Server overloaded, please retry shortly'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            admission.release()
+            raise
+        response.call_on_close(admission.release)
+        return response
+    return wrapper
+
+def get_session_id(data):
+    """Session id from the request body or X-Session-ID header; a new one is issued when missing or malformed"""
+    return resolve_session_id(data.get('session_id') or request.headers.get('X-Session-ID'))
+
 @app.route('/api/chat', methods=['POST'])
+@admitted
 def chat():
     try:
         data = request.get_json()
@@ -66,10 +126,11 @@ def chat():
             return jsonify({'error': 'Chatbot not initialized'}), 500
         
         # Get response from your existing chatbot
-        response = chatbot_manager.get_response(message)
+        session_id = get_session_id(data)
+        response = chatbot_manager.get_response(message, session_id)
         
         # Add cache-busting headers to prevent browser caching
-        response_obj = jsonify({'response': response})
+        response_obj = jsonify({'response': response, 'session_id': session_id})
         response_obj.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
         response_obj.headers['Pragma'] = 'no-cache'
         response_obj.headers['Expires'] = '0'
@@ -80,6 +141,100 @@ def chat():
         print(f"Error in chat endpoint: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+@admitted
+def chat_stream():
+    """Stream the answer as Server-Sent Events: `data: {"delta": ...}` chunks, then `event: done`"""
+    data = request.get_json(silent=True) or {}
+    message = data.get('message', '').strip()
+    
+    if not message:
+        return jsonify({'error': 'Message is required'}), 400
+    
+    if not chatbot_manager:
+        return jsonify({'error': 'Chatbot not initialized'}), 500
+    
+    session_id = get_session_id(data)
+    
+    def generate():
+        try:
+            for delta in chatbot_manager.stream_response(message, session_id):
+                yield f"data: {json.dumps({'delta': delta})}\n\n"
+            yield f"event: done\ndata: {json.dumps({'session_id': session_id})}\n\n"
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': 'Internal server error'})}\n\n"
+    
+    response_obj = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response_obj.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response_obj.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering
+    response_obj.headers['X-Session-ID'] = session_id
+    return response_obj
+
+@app.route('/api/chat/batch', methods=['POST'])
+@admitted
+def chat_batch():
+    """Answer a JSONL body of questions, streaming one JSON line per answer as each completes"""
+    try:
+        items = read_questions(request.get_data(as_text=True).splitlines())
+    except BatchInputError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not items:
+        return jsonify({'error': 'At least one question is required'}), 400
+    
+    max_questions = int(os.getenv('TFT_BATCH_MAX_QUESTIONS', '1000'))
+    if len(items) > max_questions:
+        return jsonify({'error': f'At most {max_questions} questions per batch'}), 413
+    
+    if not chatbot_manager:
+        return jsonify({'error': 'Chatbot not initialized'}), 500
+    
+    concurrency = int(os.getenv('TFT_BATCH_CONCURRENCY', '8'))
+    
+    def generate():
+        try:
+            # The batch holds one admission slot; further completions in flight take their own
+            results = chatbot_manager.answer_batch([item['question'] for item in items], max_concurrency=concurrency,
+                                                   admission=admission)
+            for result in with_ids(results, items):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            print(f"Error in chat batch endpoint: {e}")
+            yield json.dumps({'error': 'Internal server error'}) + "\n"
+    
+    response_obj = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response_obj.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response_obj.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering
+    return response_obj
+
+@app.route('/api/clear-history', methods=['POST'])
+def clear_history():
+    """Forget the conversation history of the requesting session"""
+    data = request.get_json(silent=True) or {}
+    session_id = data.get('session_id') or request.headers.get('X-Session-ID', '')
+    if not isinstance(session_id, str) or not SESSION_ID_RE.match(session_id):
+        return jsonify({'error': 'A valid session_id is required'}), 400
+    
+    if not chatbot_manager:
+        return jsonify({'error': 'Chatbot not initialized'}), 500
+    
+    chatbot_manager.clear_history(session_id)
+    return jsonify({'status': 'cleared', 'session_id': session_id})
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """Cache, session, request coalescing, circuit breaker and admission statistics"""
+    if not chatbot_manager:
+        return jsonify({'error': 'Chatbot not initialized'}), 500
+    
+    return jsonify({**chatbot_manager.get_stats(), 'admission': admission.get_stats()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: per-stage latency, tokens, cache hit rates, upstream errors and index size"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/api/health', methods=['GET'])
 def health():
     return jsonify({
@@ -89,30 +244,18 @@ def health():
 
 @app.route('/api/knowledge-base-info', methods=['GET'])
 def knowledge_base_info():
-    try:
-        # Load the main TFT15 knowledge base
-        kb_file = 'tft15_knowledge_base.json'
-        if not os.path.exists(kb_file):
-            kb_file = 'tft15_enhanced_knowledge_base.json'
-        
-        with open(kb_file, 'r', encoding='utf-8') as f:
-            kb_data = json.load(f)
-        
-        documents = kb_data.get('documents', [])
-        
-        return jsonify({
-            'knowledge_base_file': kb_file,
-            'total_documents': len(documents),
-            'document_types': {
-                'champions': len([doc for doc in documents if doc.get('metadata', {}).get('type') == 'champion']),
-                'traits': len([doc for doc in documents if doc.get('metadata', {}).get('type') == 'trait']),
-                'items': len([doc for doc in documents if doc.get('metadata', {}).get('type') == 'item']),
-                'power_ups': len([doc for doc in documents if doc.get('metadata', {}).get('type') == 'power_up']),
-                'general': len([doc for doc in documents if doc.get('metadata', {}).get('type') == 'general'])
-            }
-        })
-    except Exception as e:
-        return jsonify({'error': f'Could not load knowledge base info: {e}'}), 500
+    if not chatbot_manager:
+        return jsonify({'error': 'Chatbot not initialized'}), 500
+    
+    # Precomputed from the loaded index; clients revalidate with If-None-Match
+    body, etag = chatbot_manager.knowledge_base_info()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, content_type='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/test-enhanced-search', methods=['GET'])
 def test_enhanced_search():
@@ -139,10 +282,18 @@ def test_enhanced_search():
         return jsonify({'error': f'Test failed: {e}'}), 500
 
 if __name__ == '__main__':
+    if '--build-index' in sys.argv[1:]:
+        # Deploy build step (render.yaml): build or sync tft15_index.tftidx and exit, so the
+        # server starts by memory-mapping the index instead of embedding the knowledge base
+        print("🔧 Building the index...")
+        sys.exit(0 if initialize_chatbot() else 1)
+    
     print("🚀 Starting TFT QA Bot Backend Server...")
     
     # Initialize chatbot
     if initialize_chatbot():
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, reload_index)
         port = int(os.getenv('PORT', '5000'))
         debug = os.getenv('FLASK_DEBUG', 'false').lower() == 'true'
         print(f"🌐 Starting Flask server on 0.0.0.0:{port}")
@@ -0,0 +1,106 @@
+"""Bulk question answering from a JSONL file, for regenerating FAQ answers and regression runs.
+
+Each input line is a JSON object with a "question" (optionally an "id"), or a bare
+JSON string. Answers are written as JSONL as they complete, one object per
+question with its index, id, answer and timings; a summary goes to stderr.
+
+    python batch_qa.py questions.jsonl -o answers.jsonl --concurrency 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, List
+
+from dotenv import load_dotenv
+
+# Add current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from chatbot import TFTChatbotManager
+
+
+class BatchInputError(ValueError):
+    """A batch input line could not be read as a question"""
+
+
+def read_questions(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """Parse JSONL question lines into {"id", "question"} items; blank lines are skipped"""
+    items = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise BatchInputError(f"Line {number}: invalid JSON ({e.msg})") from None
+
+        if isinstance(record, str):
+            record = {"question": record}
+        if not isinstance(record, dict):
+            raise BatchInputError(f"Line {number}: expected an object or a string")
+        question = record.get("question") or record.get("message")
+        if not isinstance(question, str) or not question.strip():
+            raise BatchInputError(f"Line {number}: expected a question string")
+        items.append({"id": record.get("id", len(items)), "question": question.strip()})
+    return items
+
+
+def with_ids(results: Iterable[Dict[str, Any]], items: List[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+    """Attach each input item's id to the results of `answer_batch`"""
+    for result in results:
+        yield {"id": items[result["index"]]["id"], **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of questions ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="JSONL file for the answers (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("TFT_BATCH_CONCURRENCY", "8")),
+                        help="Completions in flight at once")
+    args = parser.parse_args()
+
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        print("Please set OPENAI_API_KEY in your .env file", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.input == "-":
+            items = read_questions(sys.stdin)
+        else:
+            with open(args.input, 'r', encoding='utf-8') as f:
+                items = read_questions(f)
+    except BatchInputError as e:
+        print(f"{args.input}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    manager = TFTChatbotManager(api_key)
+    if not manager.initialize():
+        print("Failed to initialize chatbot", file=sys.stderr)
+        sys.exit(1)
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.perf_counter()
+    errors = cached = 0
+    try:
+        results = manager.answer_batch([item["question"] for item in items], max_concurrency=args.concurrency)
+        for result in with_ids(results, items):
+            errors += "error" in result
+            cached += bool(result.get("cached"))
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Answered {len(items)} questions in {elapsed:.1f}s ({len(items) / max(elapsed, 1e-9):.1f}/s), "
+          f"{cached} from cache, {errors} errors", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
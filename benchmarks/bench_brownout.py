@@ -0,0 +1,173 @@
+"""Benchmark: /api/chat latency and outcomes through an upstream brownout.
+
+Serves the Flask chat API in-process against mock_openai.py's server, also
+in-process so its faults can be switched mid-run. Clients keep --concurrency
+requests in flight through three phases of --phase seconds: healthy, brownout
+(--slow-rate of upstream calls take --slow-latency seconds longer, or fail with
+--error-rate) and recovered. Reports per phase how many answers were complete,
+degraded to retrieved documents (circuit open or upstream failed), shed with 503
+or failed, with p50/p99/max latency. --no-breaker runs without the completion
+circuit breaker, so every request waits out the upstream timeout.
+
+    python benchmarks/bench_brownout.py --concurrency 20 --phase 10
+    python benchmarks/bench_brownout.py --no-breaker
+    python benchmarks/bench_brownout.py --error-rate 1.0 --slow-rate 0
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import aiohttp
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import backend_server
+from chatbot import DEGRADED_NOTICE, ERROR_RESPONSE, TFTChatbot, TFTChatbotManager
+from embedding_providers import OpenAIEmbeddingProvider
+from mock_openai import MockOpenAIServer
+
+QUESTIONS = [
+    "How do Luchador champions synergize with power-ups?",
+    "Which items are good on tanks?",
+    "Which items give attack speed?",
+    "What augments help Battle Academia comps?",
+    "mana on hit items for casters",
+    "What champions synergize with Star Guardian?",
+]
+PHASES = ("healthy", "brownout", "recovered")
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def build_manager(documents, breaker: bool) -> TFTChatbotManager:
+    """Chatbot manager with the configured upstream timeouts, wired to the mock server named by OPENAI_BASE_URL"""
+    manager = TFTChatbotManager("mock-key")
+    provider = OpenAIEmbeddingProvider(client=manager.create_embedding_client())
+    manager.vector_store = manager.create_vector_store(provider, "flat")
+    manager.vector_store.build_index(documents, manager.vector_store.create_embeddings(documents))
+    manager.chatbot = TFTChatbot("mock-key", manager.vector_store, client=manager.create_client(),
+                                 completion_breaker=manager.breakers["chat_completions"] if breaker else None)
+    return manager
+
+
+def percentile(latencies, p):
+    ordered = sorted(latencies) or [0.0]
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1)
+
+
+async def generate_load(url: str, concurrency: int, phase_seconds: float, on_phase):
+    """Closed-loop load through every phase; (phase, outcome, latency) per request"""
+    samples = []
+    start = time.perf_counter()
+    end = start + phase_seconds * len(PHASES)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+
+    async def switch_phases():
+        for number in range(1, len(PHASES)):
+            await asyncio.sleep(start + number * phase_seconds - time.perf_counter())
+            on_phase(PHASES[number])
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def client(number):
+            i = number
+            while time.perf_counter() < end:
+                sent = time.perf_counter()
+                phase = PHASES[min(len(PHASES) - 1, int((sent - start) // phase_seconds))]
+                # Numbered so that no two requests are coalesced into one upstream call
+                payload = {"message": f"{QUESTIONS[i % len(QUESTIONS)]} ({i})", "session_id": f"brownout-{number}"}
+                i += concurrency
+                try:
+                    async with session.post(url, json=payload) as response:
+                        body = await response.json(content_type=None)
+                        if response.status == 503:
+                            outcome = "shed"
+                        elif response.status != 200 or body.get("response") == ERROR_RESPONSE:
+                            outcome = "error"
+                        elif body.get("response", "").startswith(DEGRADED_NOTICE):
+                            outcome = "degraded"
+                        else:
+                            outcome = "ok"
+                except aiohttp.ClientError:
+                    outcome = "error"
+                samples.append((phase, outcome, time.perf_counter() - sent))
+                if outcome == "shed":
+                    await asyncio.sleep(0.1)
+
+        await asyncio.gather(switch_phases(), *(client(number) for number in range(concurrency)))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", default=os.path.join(ROOT, "tft15_knowledge_base.json"))
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--phase", type=float, default=10.0, help="Seconds of each phase")
+    parser.add_argument("--slow-rate", type=float, default=1.0, help="Share of upstream calls slowed in the brownout")
+    parser.add_argument("--slow-latency", type=float, default=30.0, help="Extra seconds of a slowed upstream call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream calls failing in the brownout")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Chat completion timeout (TFT_OPENAI_TIMEOUT)")
+    parser.add_argument("--embedding-timeout", type=float, default=1.0, help="TFT_EMBEDDING_TIMEOUT")
+    parser.add_argument("--breaker-reset", type=float, default=3.0, help="TFT_BREAKER_RESET")
+    parser.add_argument("--no-breaker", action="store_true", help="No circuit breaker on completions")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    with open(args.kb, 'r', encoding='utf-8') as f:
+        documents = json.load(f)["documents"]
+
+    mock = MockOpenAIServer(embedding_latency=0.01, ttft=0.2, token_delay=0.005).start()
+    os.environ.update(OPENAI_BASE_URL=mock.base_url, TFT_OPENAI_TIMEOUT=str(args.timeout),
+                      TFT_EMBEDDING_TIMEOUT=str(args.embedding_timeout), TFT_BREAKER_RESET=str(args.breaker_reset))
+    backend_server.chatbot_manager = build_manager(documents, breaker=not args.no_breaker)
+    server = make_server("127.0.0.1", 0, backend_server.app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def on_phase(phase):
+        if phase == "brownout":
+            mock.set_faults(error_rate=args.error_rate, slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+        else:
+            mock.set_faults()
+
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/api/chat"
+        samples = asyncio.run(generate_load(url, args.concurrency, args.phase, on_phase))
+    finally:
+        server.shutdown()
+        mock.stop()
+
+    results = {}
+    for phase in PHASES:
+        latencies = [latency for sample_phase, _, latency in samples if sample_phase == phase]
+        outcomes = [outcome for sample_phase, outcome, _ in samples if sample_phase == phase]
+        results[phase] = {
+            "requests": len(outcomes),
+            **{outcome: outcomes.count(outcome) for outcome in ("ok", "degraded", "shed", "error")},
+            "p50_ms": percentile(latencies, 0.50),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": round(max(latencies, default=0.0) * 1000, 1),
+        }
+
+    if args.json:
+        print(json.dumps({"breaker": not args.no_breaker, "phases": results}, indent=2))
+        return
+    print(f"completion breaker {'off' if args.no_breaker else 'on'}, timeout {args.timeout}s, "
+          f"{args.concurrency} concurrent clients")
+    print(f"{'phase':<10}{'reqs':>6}{'ok':>6}{'degraded':>10}{'shed':>6}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'max ms':>9}")
+    for phase, r in results.items():
+        print(f"{phase:<10}{r['requests']:>6}{r['ok']:>6}{r['degraded']:>10}{r['shed']:>6}{r['error']:>8}"
+              f"{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark: sequential per-document embedding vs the batched, concurrent pipeline.
+
+Runs against mock_openai.FakeOpenAIClient, which simulates per-request latency,
+so the numbers reflect round-trip savings rather than OpenAI throughput. With
+--local, the knowledge base is also embedded with a local sentence-transformers
+model on the CPU, and single-query embedding latency is compared with the API's.
+
+    python benchmarks/bench_embeddings.py --latency 0.02
+    python benchmarks/bench_embeddings.py --local sentence-transformers/all-MiniLM-L6-v2
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_providers import LocalEmbeddingProvider, OpenAIEmbeddingProvider
+from mock_openai import FakeOpenAIClient
+from vector_store import TFTVectorStore
+import vector_store
+
+
+def load_documents(path, limit=None):
+    with open(path, 'r', encoding='utf-8') as f:
+        documents = json.load(f).get("documents", [])
+    return documents[:limit] if limit else documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", default="tft15_knowledge_base.json")
+    parser.add_argument("--limit", type=int, default=None, help="Only embed the first N documents")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated seconds per request")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-tokens", type=int, default=OpenAIEmbeddingProvider.max_batch_tokens)
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Inject a 429 on every Nth request")
+    parser.add_argument("--skip-baseline", action="store_true")
+    parser.add_argument("--local", metavar="MODEL", help="Also embed with this local sentence-transformers model")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # Simulated rate limits should not stall the benchmark on real backoff delays
+    vector_store._backoff_delay = lambda attempt, error: 0.01
+
+    documents = load_documents(args.kb, args.limit)
+    print(f"Documents: {len(documents)}  simulated latency: {args.latency * 1000:.0f}ms/request")
+
+    results = {}
+    if not args.skip_baseline:
+        client = FakeOpenAIClient(latency=args.latency)
+        store = TFTVectorStore("fake-key", client=client)
+        start = time.perf_counter()
+        for doc in documents:
+            store.get_embedding(doc['content'])
+        results["sequential"] = (time.perf_counter() - start, client.embedding_calls)
+
+    client = FakeOpenAIClient(latency=args.latency, rate_limit_every=args.rate_limit_every)
+    store = TFTVectorStore("fake-key", client=client)
+    start = time.perf_counter()
+    embeddings = store.create_embeddings(documents, max_batch_tokens=args.batch_tokens,
+                                         max_concurrency=args.concurrency)
+    results["batched"] = (time.perf_counter() - start, client.embedding_calls)
+    assert len(embeddings) == len(documents)
+
+    query_latencies = {}
+    if args.local:
+        local_store = TFTVectorStore("fake-key", embedding_provider=LocalEmbeddingProvider(args.local))
+        start = time.perf_counter()
+        local_store.create_embeddings(documents)
+        results["local"] = (time.perf_counter() - start, 0)
+
+        questions = [f"What does {doc['metadata'].get('name', 'this')} do?" for doc in documents[:50]]
+        for name, query_store in (("api", store), ("local", local_store)):
+            samples = []
+            for question in questions:
+                start = time.perf_counter()
+                query_store.get_embedding(question)
+                samples.append(time.perf_counter() - start)
+            query_latencies[name] = statistics.median(samples) * 1000
+
+    print(f"{'mode':<12}{'seconds':>10}{'requests':>10}{'docs/s':>10}")
+    for mode, (seconds, calls) in results.items():
+        print(f"{mode:<12}{seconds:>10.2f}{calls:>10}{len(documents) / seconds:>10.1f}")
+    if "sequential" in results:
+        print(f"Speedup: {results['sequential'][0] / results['batched'][0]:.1f}x")
+    if query_latencies:
+        print(f"Query embedding p50: simulated API {query_latencies['api']:.1f}ms, local {query_latencies['local']:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
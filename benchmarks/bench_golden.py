@@ -0,0 +1,269 @@
+"""Retrieval regression suite: golden questions with expected document ids.
+
+Scores TFTVectorStore.search, TFTVectorStore.search_by_pattern and
+TFTChatbot._get_enhanced_context on benchmarks/golden_questions.jsonl by
+recall@k (share of a question's expected documents in the top k), MRR (reciprocal
+rank of the first expected document) and end-to-end latency, overall and per
+question type. For the enhanced context, the ranking is the order of documents in
+the assembled context.
+
+Runs offline: embeddings come from mock_openai.FakeOpenAIClient, or are replayed
+from a file recorded once against the real API with --record. Results are written
+as JSON; --baseline compares them with an earlier run and exits with status 1 when
+recall or MRR dropped by more than --tolerance.
+
+    python benchmarks/bench_golden.py --output golden.json
+    python benchmarks/bench_golden.py --baseline golden.json            # after a retrieval change
+    OPENAI_API_KEY=... python benchmarks/bench_golden.py --record golden_embeddings.npz
+    python benchmarks/bench_golden.py --embeddings golden_embeddings.npz
+    python benchmarks/bench_golden.py --generate                        # rewrite the golden set from the KB
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot import TFTChatbot
+from context_builder import ContextBuilder
+from embedding_providers import EmbeddingProvider, OpenAIEmbeddingProvider
+from mock_openai import FakeOpenAIClient
+from vector_store import TFTVectorStore
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_questions.jsonl")
+METHODS = ("search", "search_by_pattern", "enhanced_context")
+CUTOFFS = (1, 5)
+GATED_METRICS = ("recall@1", "recall@5", "recall@k", "mrr")
+
+TEMPLATES = {
+    "champion": "What tier is {name}?",
+    "trait": "What does the {name} trait do?",
+    "item": "Tell me about the {name} item",
+    "augment": "What does the {name} augment do?",
+}
+
+
+def generate_golden(documents, per_type=25, descriptions=15, seed=20):
+    """Golden questions from the knowledge base: name questions per type, augment descriptions, tier lists"""
+    rng = random.Random(seed)
+    golden = []
+    for doc_type, template in TEMPLATES.items():
+        docs = sorted((doc for doc in documents if doc['metadata'].get('type') == doc_type),
+                      key=lambda doc: doc['metadata']['id'])
+        for doc in rng.sample(docs, min(per_type, len(docs))):
+            name = doc['metadata']['name']
+            golden.append({"question": template.format(name=name), "type": doc_type,
+                           "expected": [doc['metadata']['id']], "pattern": f"Name: {name}"})
+
+    augments = sorted((doc for doc in documents if doc['metadata'].get('type') == "augment"
+                       and len(doc['content'].split("Description:", 1)[-1].split()) >= 8),
+                      key=lambda doc: doc['metadata']['id'])
+    for doc in rng.sample(augments, min(descriptions, len(augments))):
+        words = doc['content'].split("Description:", 1)[1].split()
+        golden.append({"question": f"Which augment says: {' '.join(words[:12])}", "type": "description",
+                       "expected": [doc['metadata']['id']], "pattern": " ".join(words[:6])})
+
+    for tier in range(1, 6):
+        champions = sorted(doc['metadata']['id'] for doc in documents
+                           if doc['metadata'].get('type') == "champion" and f"Tier: {tier}" in doc['content'])
+        golden.append({"question": f"List all {tier}-cost champions", "type": "tier_list",
+                       "expected": champions, "pattern": f"Tier: {tier}"})
+
+    for number, item in enumerate(golden, 1):
+        item["id"] = f"q{number:03d}"
+    return golden
+
+
+def load_golden(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class RecordedEmbeddingProvider(EmbeddingProvider):
+    """Replays embeddings recorded by --record; unknown texts are an error, never an API call"""
+
+    max_batch_tokens = 1_000_000
+
+    def __init__(self, path):
+        data = np.load(path, allow_pickle=False)
+        self.model = str(data["model"])
+        self.vectors = dict(zip(data["texts"].tolist(), data["vectors"]))
+        self.dimension = data["vectors"].shape[1]
+
+    def embed(self, texts):
+        missing = [text for text in texts if text not in self.vectors]
+        if missing:
+            raise KeyError(f"No recorded embedding for {missing[0]!r}; re-record with --record")
+        return [self.vectors[text].tolist() for text in texts]
+
+
+class RecordingContextBuilder(ContextBuilder):
+    """ContextBuilder that remembers which documents made it into the last context, in order"""
+
+    included = []
+
+    def build(self, results, header=""):
+        context, stats, keys = super().build(results, header)
+        padded = context + "\n\n"
+        self.included = []
+        for doc, _ in results:
+            if f"\n{doc.get('content', '')}\n\n" in padded and doc not in self.included:
+                self.included.append(doc)
+        return context, stats, keys
+
+
+def record_embeddings(documents, golden, path):
+    """Embed the knowledge base and every golden question with the real API and save them"""
+    provider = OpenAIEmbeddingProvider(api_key=os.environ["OPENAI_API_KEY"])
+    store = TFTVectorStore("unused", embedding_provider=provider)
+    texts = sorted({store._prepare_text(doc.get('content', ''))[0] for doc in documents}
+                   | {item["question"] for item in golden})
+    vectors = []
+    for start in range(0, len(texts), provider.max_batch_size):
+        vectors.extend(provider.embed(texts[start:start + provider.max_batch_size]))
+    np.savez_compressed(path, model=provider.model, texts=np.array(texts), vectors=np.array(vectors, dtype=np.float32))
+    print(f"Recorded {len(texts)} embeddings from {provider.model} to {path}")
+
+
+def score(ranked_ids, expected, k):
+    expected = set(expected)
+    metrics = {f"recall@{cutoff}": len(expected & set(ranked_ids[:cutoff])) / len(expected) for cutoff in CUTOFFS}
+    metrics["recall@k"] = len(expected & set(ranked_ids[:k])) / len(expected)
+    metrics["mrr"] = next((1 / rank for rank, doc_id in enumerate(ranked_ids[:k], 1) if doc_id in expected), 0.0)
+    return metrics
+
+
+def summarize(rows):
+    latencies = sorted(row["latency_ms"] for row in rows)
+    summary = {"questions": len(rows)}
+    for metric in GATED_METRICS:
+        summary[metric] = round(statistics.mean(row[metric] for row in rows), 4)
+    summary["latency_ms"] = {
+        "mean": round(statistics.mean(latencies), 3),
+        "p50": round(statistics.median(latencies), 3),
+        "p95": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+    }
+    return summary
+
+
+def run(store, chatbot, golden, k):
+    """Score every method on every golden question; returns {method: {"all" | type: summary}}"""
+    calls = {
+        "search": lambda item: [doc for doc, _ in store.search(item["question"], k)],
+        "search_by_pattern": lambda item: store.search_by_pattern(item["pattern"]),
+        "enhanced_context": lambda item: (chatbot._get_enhanced_context(item["question"]),
+                                          chatbot.context_builder.included)[1],
+    }
+    results = {}
+    for method in METHODS:
+        rows = defaultdict(list)
+        for item in golden:
+            start = time.perf_counter()
+            docs = calls[method](item)
+            latency_ms = (time.perf_counter() - start) * 1000
+            row = dict(score([doc['metadata'].get('id') for doc in docs], item["expected"], k), latency_ms=latency_ms)
+            rows["all"].append(row)
+            rows[item["type"]].append(row)
+        results[method] = {group: summarize(group_rows) for group, group_rows in rows.items()}
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print metric changes against a baseline run; returns the regressions beyond `tolerance`"""
+    regressions = []
+    print(f"\n{'method/type':<32}{'metric':>10}{'baseline':>10}{'now':>10}{'change':>9}")
+    for method, groups in results["methods"].items():
+        for group, summary in groups.items():
+            before = baseline.get("methods", {}).get(method, {}).get(group)
+            if before is None:
+                continue
+            for metric in GATED_METRICS + ("latency_p50",):
+                old = before["latency_ms"]["p50"] if metric == "latency_p50" else before[metric]
+                new = summary["latency_ms"]["p50"] if metric == "latency_p50" else summary[metric]
+                if abs(new - old) < 1e-9:
+                    continue
+                regressed = metric in GATED_METRICS and new < old - tolerance
+                if regressed:
+                    regressions.append(f"{method}/{group} {metric} {old:.3f} -> {new:.3f}")
+                print(f"{method + '/' + group:<32}{metric:>10}{old:>10.3f}{new:>10.3f}{new - old:>+9.3f}"
+                      f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", default="tft15_knowledge_base.json")
+    parser.add_argument("--golden", default=GOLDEN_PATH)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--embeddings", help="Recorded embeddings (.npz) to replay instead of fake ones")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per fake embeddings request")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Allowed drop in recall or MRR")
+    parser.add_argument("--record", metavar="PATH", help="Record real embeddings of the KB and golden questions")
+    parser.add_argument("--generate", action="store_true", help="Regenerate the golden questions from the KB")
+    args = parser.parse_args()
+
+    with open(args.kb, 'r', encoding='utf-8') as f:
+        documents = json.load(f)["documents"]
+
+    if args.generate:
+        golden = generate_golden(documents)
+        with open(args.golden, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(item) + "\n" for item in golden)
+        print(f"Wrote {len(golden)} golden questions to {args.golden}")
+        return
+    golden = load_golden(args.golden)
+    if args.record:
+        record_embeddings(documents, golden, args.record)
+        return
+
+    if args.embeddings:
+        provider = RecordedEmbeddingProvider(args.embeddings)
+        embeddings = f"recorded:{provider.model}"
+    else:
+        provider = OpenAIEmbeddingProvider(FakeOpenAIClient(latency=args.latency, per_input_latency=0.0))
+        embeddings = "fake"
+    # No query cache: every search pays for its query embedding
+    store = TFTVectorStore("fake-key", embedding_provider=provider)
+    store.build_index(documents, store.create_embeddings(documents))
+    chatbot = TFTChatbot("fake-key", store, client=FakeOpenAIClient(), async_client=object())
+    chatbot.context_builder = RecordingContextBuilder(store.encoding, chatbot.context_builder.max_tokens,
+                                                      chatbot.context_builder.min_score)
+
+    results = {
+        "config": {"k": args.k, "embeddings": embeddings, "questions": len(golden),
+                   "golden": os.path.basename(args.golden), "index_fingerprint": store.fingerprint},
+        "methods": run(store, chatbot, golden, args.k),
+    }
+
+    print(f"{'method/type':<32}{'n':>5}{'R@1':>7}{'R@5':>7}{f'R@{args.k}':>7}{'MRR':>7}{'p50 ms':>9}{'p95 ms':>9}")
+    for method, groups in results["methods"].items():
+        for group, r in groups.items():
+            print(f"{method + '/' + group:<32}{r['questions']:>5}{r['recall@1']:>7.3f}{r['recall@5']:>7.3f}"
+                  f"{r['recall@k']:>7.3f}{r['mrr']:>7.3f}{r['latency_ms']['p50']:>9.3f}{r['latency_ms']['p95']:>9.3f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}).get("embeddings") != embeddings:
+            print(f"\nNote: baseline used {baseline.get('config', {}).get('embeddings')} embeddings, this run {embeddings}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Benchmark: FAISS index backends (flat, fp16, sq8, ivfpq) by memory, build time, latency and recall.
+
+Runs on the real knowledge base and on synthetic corpora scaled from it: each
+synthetic vector is a knowledge base vector plus Gaussian noise, renormalized, so
+the corpus keeps the real clustering. Queries are templated questions about
+knowledge base documents. Recall@k is measured against the exact flat index, and
+the list-of-lists copy the vector store used to keep is reported for comparison.
+Embeddings come from mock_openai.FakeOpenAIClient.
+
+    python benchmarks/bench_index.py --scales 10,100
+    python benchmarks/bench_index.py --scales 1000 --types flat,ivfpq   # ~6 GB of float32 vectors
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from index_backends import DEFAULT_NPROBE, INDEX_TYPES, create_index, index_nbytes
+from mock_openai import FakeOpenAIClient
+from vector_store import TFTVectorStore
+
+CHUNK = 50_000
+
+
+def synthetic_corpus(base: np.ndarray, scale: int, noise: float, seed: int = 15) -> np.ndarray:
+    """`scale` noisy copies of every base vector, L2-normalized"""
+    rng = np.random.default_rng(seed)
+    count, dimension = base.shape
+    vectors = np.empty((count * scale, dimension), dtype=np.float32)
+    for start in range(0, len(vectors), CHUNK):
+        rows = np.arange(start, min(start + CHUNK, len(vectors)))
+        chunk = base[rows % count] + rng.standard_normal((len(rows), dimension), dtype=np.float32) * np.float32(
+            noise / np.sqrt(dimension))
+        faiss.normalize_L2(chunk)
+        vectors[rows] = chunk
+    return vectors
+
+
+def legacy_copy_nbytes(embeddings) -> int:
+    """Size of the Python list-of-lists of floats formerly kept in TFTVectorStore.embeddings"""
+    return sys.getsizeof(embeddings) + sum(sys.getsizeof(row) + len(row) * sys.getsizeof(0.0) for row in embeddings)
+
+
+def measure(vectors, queries, index_type, k, nprobe, truth):
+    start = time.perf_counter()
+    index = create_index(vectors, np.arange(len(vectors), dtype=np.int64), index_type, nprobe)
+    build_s = time.perf_counter() - start
+
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        found.append(ids[0])
+
+    recall = None
+    if truth is not None:
+        recall = statistics.mean(len(set(row) & set(expected)) / k for row, expected in zip(found, truth))
+    result = {
+        "memory_mb": round(index_nbytes(index) / 2 ** 20, 2),
+        "build_s": round(build_s, 3),
+        "query_p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "query_p95_ms": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1000, 3),
+        "recall": round(recall, 4) if recall is not None else None,
+    }
+    return result, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", default="tft15_knowledge_base.json")
+    parser.add_argument("--scales", default="10,100", help="Comma-separated synthetic corpus sizes, as multiples of the KB")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="Comma-separated index types to compare")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+    parser.add_argument("--noise", type=float, default=0.5, help="Norm of the noise added to synthetic vectors")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    with open(args.kb, 'r', encoding='utf-8') as f:
+        documents = json.load(f)["documents"]
+    store = TFTVectorStore("fake-key", client=FakeOpenAIClient(latency=0.0, per_input_latency=0.0))
+    embeddings = store.create_embeddings(documents)
+    base = np.array(embeddings, dtype=np.float32)
+    faiss.normalize_L2(base)
+
+    named = [doc for doc in documents if doc['metadata'].get('name')]
+    questions = [f"Tell me about {doc['metadata']['name']}" for doc in named[:: max(1, len(named) // args.queries)]]
+    queries = store.embed_queries(questions[:args.queries])
+
+    types = [t for t in args.types.split(",") if t]
+    corpora = [("kb", 1)] + [(f"kb x{scale}", int(scale)) for scale in args.scales.split(",") if scale]
+    results = {"legacy_python_copy_mb": round(legacy_copy_nbytes(embeddings) / 2 ** 20, 2), "corpora": {}}
+    del embeddings
+
+    for name, scale in corpora:
+        vectors = base if scale == 1 else synthetic_corpus(base, scale, args.noise)
+        corpus = results["corpora"][name] = {"vectors": len(vectors)}
+        truth = None
+        for index_type in ["flat"] + [t for t in types if t != "flat"]:
+            result, found = measure(vectors, queries, index_type, args.k, args.nprobe, truth)
+            if truth is None:
+                truth = found  # The first (flat) run is the exact baseline
+                result["recall"] = 1.0
+            if index_type in types:
+                corpus[index_type] = result
+        del vectors
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"Python list-of-lists copy of the KB embeddings (removed): {results['legacy_python_copy_mb']:.1f} MB\n")
+    print(f"{'corpus':<12}{'vectors':>10}{'index':>8}{'memory MB':>11}{'build s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{f'recall@{args.k}':>11}")
+    for name, corpus in results["corpora"].items():
+        for index_type in types:
+            r = corpus[index_type]
+            print(f"{name:<12}{corpus['vectors']:>10}{index_type:>8}{r['memory_mb']:>11.2f}{r['build_s']:>9.3f}"
+                  f"{r['query_p50_ms']:>9.3f}{r['query_p95_ms']:>9.3f}{r['recall']:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
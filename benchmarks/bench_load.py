@@ -0,0 +1,206 @@
+"""Load test: throughput and p50/p95/p99 latency of /api/chat under concurrent clients.
+
+Serves the chat API in-process, either with the Flask server from backend_server.py
+or the asyncio server from async_server.py, against mock_openai.py running as a
+separate process (OpenAI-compatible HTTP, simulated completion latency). Each
+request uses its own session so answers come from the full retrieval + completion path.
+With --hot every request asks the same question, as after a patch, which shows how
+many requests were coalesced into one upstream call.
+
+    python benchmarks/bench_load.py --mode both --requests 400 --concurrency 50
+    python benchmarks/bench_load.py --hot
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import aiohttp
+from aiohttp import web
+from openai import OpenAI
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import async_server
+import backend_server
+from chatbot import TFTChatbot, TFTChatbotManager
+from vector_store import TFTVectorStore
+
+QUESTIONS = [
+    "What does the Bastion Crest augment do?",
+    "Tell me about the Bloodthirster item",
+    "What does the Battle Academia trait do?",
+    "What tier is Ahri?",
+    "List all 2-cost champions",
+    "What is the Soul Fighter trait?",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Nothing listening on port {port}")
+
+
+def start_mock_openai(ttft: float, token_delay: float):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "mock_openai.py"), "--port", str(port),
+                                "--embedding-latency", "0.02", "--ttft", str(ttft), "--token-delay", str(token_delay)],
+                               stdout=subprocess.DEVNULL)
+    wait_for_port(port)
+    return process, f"http://127.0.0.1:{port}/v1"
+
+
+def build_manager(documents) -> TFTChatbotManager:
+    """Chatbot manager wired to the mock OpenAI server named by OPENAI_BASE_URL"""
+    manager = TFTChatbotManager("mock-key")
+    manager.vector_store = TFTVectorStore("mock-key", client=OpenAI(api_key="mock-key"))
+    manager.vector_store.build_index(documents, manager.vector_store.create_embeddings(documents))
+    manager.chatbot = TFTChatbot("mock-key", manager.vector_store, async_client=manager.create_async_client())
+    return manager
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve_flask(manager, port: int):
+    backend_server.chatbot_manager = manager
+    server = make_server("127.0.0.1", port, backend_server.app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+
+def serve_async(manager, port: int, max_concurrency: int):
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(async_server.create_app(manager, max_concurrency=max_concurrency))
+
+    async def start():
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    loop.run_until_complete(start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+    return stop
+
+
+async def generate_load(url: str, requests: int, concurrency: int, hot: bool = False):
+    latencies, errors = [], 0
+    limiter = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=120)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def one(i):
+            nonlocal errors
+            question = QUESTIONS[0] if hot else QUESTIONS[i % len(QUESTIONS)]
+            payload = {"message": question, "session_id": f"load-{i}"}
+            async with limiter:
+                start = time.perf_counter()
+                try:
+                    async with session.post(url, json=payload) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                            return
+                except aiohttp.ClientError:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies) or [0.0]
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1)
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 1),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", default=os.path.join(ROOT, "tft15_knowledge_base.json"))
+    parser.add_argument("--mode", choices=["flask", "async", "both"], default="both")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Simulated seconds before a completion starts")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Simulated seconds per completion token")
+    parser.add_argument("--hot", action="store_true", help="Every request asks the same question")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    with open(args.kb, 'r', encoding='utf-8') as f:
+        documents = json.load(f)["documents"]
+
+    mock, base_url = start_mock_openai(args.ttft, args.token_delay)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    results = {}
+    try:
+        for mode in (["flask", "async"] if args.mode == "both" else [args.mode]):
+            manager = build_manager(documents)
+            port = free_port()
+            stop = serve_flask(manager, port) if mode == "flask" else serve_async(manager, port, args.concurrency)
+            wait_for_port(port)
+            try:
+                url = f"http://127.0.0.1:{port}/api/chat"
+                asyncio.run(generate_load(url, min(args.concurrency, args.requests), args.concurrency))  # Warm up
+                coalescing = manager.single_flight.get_stats()
+                results[mode] = asyncio.run(generate_load(url, args.requests, args.concurrency, args.hot))
+                after = manager.single_flight.get_stats()
+                results[mode]["upstream_calls"] = after["executions"] - coalescing["executions"]
+                results[mode]["coalesced"] = after["coalesced"] - coalescing["coalesced"]
+            finally:
+                stop()
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<8}{'reqs':>6}{'conc':>6}{'errors':>8}{'req/s':>8}{'mean ms':>10}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'p99 ms':>9}{'upstream':>10}{'coalesced':>11}")
+    for mode, r in results.items():
+        print(f"{mode:<8}{r['requests']:>6}{r['concurrency']:>6}{r['errors']:>8}{r['throughput_rps']:>8.1f}"
+              f"{r['mean_ms']:>10.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}"
+              f"{r['upstream_calls']:>10}{r['coalesced']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark: dense-only retrieval (today's get_relevant_context(k=20)) vs BM25 + dense hybrid.
+
+Questions are generated from the knowledge base: one templated question per named
+document ("What does the Bastion Crest augment do?") plus description-only
+questions for augments and portals, each with its expected document id. Embeddings
+come from mock_openai.FakeOpenAIClient with a simulated per-request latency.
+
+    python benchmarks/bench_retrieval.py --per-type 40 --latency 0.1
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_providers import OpenAIEmbeddingProvider
+from mock_openai import FakeOpenAIClient
+from vector_store import TFTVectorStore
+
+TEMPLATES = {
+    "champion": "What tier is {name}?",
+    "trait": "What does the {name} trait do?",
+    "item": "Tell me about the {name} item",
+    "augment": "What does the {name} augment do?",
+    "region_portal": "What is the {name} portal?",
+}
+
+
+def generate_questions(documents, per_type, seed=15):
+    """Templated name questions plus description-only questions, each with an expected id"""
+    rng = random.Random(seed)
+    questions = []
+    for doc_type, template in TEMPLATES.items():
+        docs = [doc for doc in documents if doc['metadata'].get('type') == doc_type]
+        for doc in rng.sample(docs, min(per_type, len(docs))):
+            questions.append((template.format(name=doc['metadata']['name']), doc['metadata']['id'], "name"))
+            if "Description:" in doc['content']:
+                description = doc['content'].split("Description:", 1)[1].split()
+                if len(description) >= 6:
+                    questions.append((" ".join(description[:12]), doc['metadata']['id'], "description"))
+    return questions
+
+
+def run(store, client, questions, k, mode):
+    latencies = []
+    hits = {1: 0, 5: 0, k: 0}
+    calls_before = client.embedding_calls
+    for question, expected_id, _ in questions:
+        start = time.perf_counter()
+        results = store.hybrid_search(question, k) if mode == "hybrid" else store.search(question, k)
+        latencies.append(time.perf_counter() - start)
+        ids = [doc['metadata'].get('id') for doc, _ in results]
+        for cutoff in hits:
+            if expected_id in ids[:cutoff]:
+                hits[cutoff] += 1
+    n = len(questions)
+    return {
+        "recall": {f"@{cutoff}": round(count / n, 3) for cutoff, count in sorted(hits.items())},
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p95_ms": round(sorted(latencies)[int(0.95 * (n - 1))] * 1000, 2),
+        "embedding_calls": client.embedding_calls - calls_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", default="tft15_knowledge_base.json")
+    parser.add_argument("--per-type", type=int, default=40)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1, help="Simulated seconds per embeddings request")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    with open(args.kb, 'r', encoding='utf-8') as f:
+        documents = json.load(f)["documents"]
+
+    build_client = FakeOpenAIClient(latency=0.0, per_input_latency=0.0)
+    store = TFTVectorStore("fake-key", client=build_client)
+    store.build_index(documents, store.create_embeddings(documents))
+
+    # Fresh questions every time: no query cache, simulated network latency on each embedding
+    client = FakeOpenAIClient(latency=args.latency, per_input_latency=0.0)
+    store.embedding_provider = OpenAIEmbeddingProvider(client)
+    questions = generate_questions(documents, args.per_type)
+
+    results = {}
+    for kind in ("name", "description", "all"):
+        subset = [q for q in questions if kind == "all" or q[2] == kind]
+        for mode in ("dense", "hybrid"):
+            results[f"{mode}/{kind}"] = dict(run(store, client, subset, args.k, mode), questions=len(subset))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode/questions':<22}{'n':>5}{'R@1':>7}{'R@5':>7}{f'R@{args.k}':>7}{'mean ms':>10}{'p95 ms':>9}{'embeds':>8}")
+    for name, r in results.items():
+        recall = list(r["recall"].values())
+        print(f"{name:<22}{r['questions']:>5}{recall[0]:>7.3f}{recall[1]:>7.3f}{recall[2]:>7.3f}"
+              f"{r['mean_ms']:>10.2f}{r['p95_ms']:>9.2f}{r['embedding_calls']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark: vector store startup time by index source.
+
+Compares a cold rebuild (embedding every document through the simulated API),
+loading the legacy FAISS + pickle pair, and loading the single-file `.tftidx`
+format with and without checksum verification. Each load is followed by one
+search so the lazily built FAISS index is included in the timing.
+
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import json
+import os
+import pickle
+import statistics
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openai import FakeOpenAIClient
+from vector_store import TFTVectorStore
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", default="tft15_knowledge_base.json")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per embeddings request")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.kb, 'r', encoding='utf-8') as f:
+        documents = json.load(f)["documents"]
+    client = FakeOpenAIClient(latency=0.0, per_input_latency=0.0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, "index")
+
+        def rebuild():
+            store = TFTVectorStore("fake-key", client=FakeOpenAIClient(latency=args.latency))
+            store.build_index(documents, store.create_embeddings(documents))
+            return store
+
+        store = rebuild()
+        store.save_index(base)
+        # Legacy pair as written by earlier versions: FAISS index plus pickled document list
+        vectors = np.array(store.create_embeddings(documents), dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        legacy_index = faiss.IndexFlatIP(vectors.shape[1])
+        legacy_index.add(vectors)
+        faiss.write_index(legacy_index, f"{base}_legacy.faiss")
+        with open(f"{base}_legacy.pkl", 'wb') as f:
+            pickle.dump(store.documents, f)
+
+        def load(path, verify=True):
+            def run():
+                loaded = TFTVectorStore("fake-key", client=client)
+                loaded.load_index(path, verify=verify)
+                loaded.search("What does the Bastion trait do?", 5)
+            return run
+
+        results = {
+            "cold rebuild (simulated API)": timed(rebuild, 1),
+            "legacy .faiss + .pkl": timed(load(f"{base}_legacy"), args.repeat),
+            ".tftidx (verified)": timed(load(base), args.repeat),
+            ".tftidx (no verify)": timed(load(base, verify=False), args.repeat),
+        }
+
+    print(f"Documents: {len(documents)}")
+    print(f"{'source':<32}{'median ms':>12}")
+    for name, seconds in results.items():
+        print(f"{name:<32}{seconds * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
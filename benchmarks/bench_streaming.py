@@ -0,0 +1,95 @@
+"""Benchmark: time-to-first-token of streamed responses vs waiting for the full completion.
+
+Runs the real OpenAI client against mock_openai.MockOpenAIServer over HTTP, so the
+numbers include request serialization and SSE parsing. The server waits --ttft
+seconds before the first token and --token-delay seconds between tokens.
+
+    python benchmarks/bench_streaming.py --questions 10 --ttft 0.3 --token-delay 0.02
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI
+
+from chatbot import TFTChatbot
+from mock_openai import MockOpenAIServer
+from vector_store import TFTVectorStore
+
+QUESTIONS = [
+    "What does the Bastion Crest augment do?",
+    "Tell me about the Bloodthirster item",
+    "What does the Battle Academia trait do?",
+    "What tier is Ahri?",
+    "What is the Soul Fighter trait?",
+]
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        "mean_ms": round(statistics.mean(ordered) * 1000, 1),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", default="tft15_knowledge_base.json")
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Simulated seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Simulated seconds between tokens")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    with open(args.kb, 'r', encoding='utf-8') as f:
+        documents = json.load(f)["documents"]
+
+    server = MockOpenAIServer(embedding_latency=0.0, ttft=args.ttft, token_delay=args.token_delay).start()
+    try:
+        client = OpenAI(api_key="mock-key", base_url=server.base_url)
+        store = TFTVectorStore("mock-key", client=client)
+        store.build_index(documents, store.create_embeddings(documents))
+        chatbot = TFTChatbot("mock-key", store, client=client)
+        questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.questions)]
+
+        blocking = []
+        for question in questions:
+            start = time.perf_counter()
+            chatbot.get_response(question)
+            blocking.append(time.perf_counter() - start)
+            chatbot.clear_history()
+
+        first_chunk, streamed = [], []
+        for question in questions:
+            start = time.perf_counter()
+            first = None
+            for _ in chatbot.stream_response(question):
+                if first is None:
+                    first = time.perf_counter() - start
+            first_chunk.append(first)
+            streamed.append(time.perf_counter() - start)
+            chatbot.clear_history()
+    finally:
+        server.stop()
+
+    results = {
+        "blocking/full_response": summarize(blocking),
+        "streaming/first_chunk": summarize(first_chunk),
+        "streaming/full_response": summarize(streamed),
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'measurement':<28}{'mean ms':>10}{'p95 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<28}{r['mean_ms']:>10.1f}{r['p95_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
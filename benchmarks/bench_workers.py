@@ -0,0 +1,169 @@
+"""Benchmark: retrieval throughput and memory by number of worker processes.
+
+Builds an index of the knowledge base repeated --copies times and saves it. Then,
+for each worker count, forks that many processes that each run retrieval
+(hybrid search, k=20) for --duration seconds. By default the index is loaded
+once before the fork, as with gunicorn.conf.py. With --no-preload each worker
+loads its own copy, as separate `python backend_server.py` processes would.
+Reports requests/s, speedup over one worker and each worker's private memory
+(USS, from /proc/<pid>/smaps_rollup; Linux only).
+
+    python benchmarks/bench_workers.py --workers 1,2,4,8 --copies 20
+    python benchmarks/bench_workers.py --no-preload
+"""
+import argparse
+import copy
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import QueryEmbeddingCache
+from mock_openai import FakeOpenAIClient
+from vector_store import TFTVectorStore
+
+QUESTIONS = [
+    "What does the Bastion Crest augment do?",
+    "Tell me about the Bloodthirster item",
+    "What does the Battle Academia trait do?",
+    "Which items give attack speed?",
+    "How do region portals work?",
+    "What augments help Luchador comps?",
+    "mana on hit items for casters",
+    "What champions synergize with Star Guardian?",
+]
+
+# Set in the parent before forking; preloaded workers inherit it
+_preloaded = None
+
+
+def replicate(documents, copies):
+    """The knowledge base repeated `copies` times, each copy with distinct ids"""
+    replicated = []
+    for number in range(copies):
+        for doc in documents:
+            doc = copy.deepcopy(doc)
+            if number:
+                doc['metadata']['id'] = f"{doc['metadata'].get('id', doc['metadata'].get('name'))}#{number}"
+            replicated.append(doc)
+    return replicated
+
+
+def open_store(base):
+    store = TFTVectorStore("fake-key", client=FakeOpenAIClient(latency=0.0, per_input_latency=0.0),
+                           query_cache=QueryEmbeddingCache(max_size=len(QUESTIONS)))
+    store.load_index(base, verify=False)
+    store.load_all_shards()
+    for question in QUESTIONS:
+        store.hybrid_search(question, 20)  # Builds the lexical index and caches the query embeddings
+    return store
+
+
+def private_memory_mb():
+    """Memory only this process holds (USS): its private clean and dirty pages"""
+    kilobytes = 0
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                kilobytes += int(line.split()[1])
+    return kilobytes / 1024
+
+
+def worker(base, k, duration, barrier, results):
+    faiss.omp_set_num_threads(1)
+    store = _preloaded if _preloaded is not None else open_store(base)
+    barrier.wait()
+    count = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        store.hybrid_search(QUESTIONS[count % len(QUESTIONS)], k)
+        count += 1
+    results.put((count, private_memory_mb()))
+
+
+def run(base, workers, k, duration):
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(base, k, duration, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    barrier.wait()  # Every worker has its index; start the clock together
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {
+        "workers": workers,
+        "requests_per_second": round(sum(count for count, _ in samples) / duration, 1),
+        "worker_private_mb": round(sum(memory for _, memory in samples) / workers, 1),
+    }
+
+
+def main():
+    global _preloaded
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", default="tft15_knowledge_base.json")
+    parser.add_argument("--copies", type=int, default=20, help="Times the knowledge base is repeated in the index")
+    parser.add_argument("--workers", default=None,
+                        help="Comma-separated worker counts (default: powers of two up to the core count)")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds each worker count is measured")
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--no-preload", action="store_true", help="Each worker loads its own copy of the index")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        counts = [int(count) for count in args.workers.split(",")]
+    else:
+        counts = [1]
+        while counts[-1] * 2 <= cores:
+            counts.append(counts[-1] * 2)
+
+    with open(args.kb, 'r', encoding='utf-8') as f:
+        documents = json.load(f)["documents"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, "index")
+        store = TFTVectorStore("fake-key", client=FakeOpenAIClient(latency=0.0, per_input_latency=0.0))
+        embeddings = store.create_embeddings(documents)
+        store.build_index(replicate(documents, args.copies), np.tile(embeddings, (args.copies, 1)))
+        store.save_index(base)
+        index_mb = os.path.getsize(f"{base}.tftidx") / 2**20
+        del store
+        gc.collect()
+
+        if not args.no_preload:
+            _preloaded = open_store(base)
+            gc.freeze()  # As gunicorn.conf.py does before forking
+        results = [run(base, workers, args.k, args.duration) for workers in counts]
+
+    baseline = results[0]["requests_per_second"] / results[0]["workers"]
+    for result in results:
+        result["speedup"] = round(result["requests_per_second"] / baseline, 2)
+        result["efficiency"] = round(result["speedup"] / result["workers"], 2)
+
+    if args.json:
+        print(json.dumps({"cores": cores, "documents": len(documents) * args.copies,
+                          "index_mb": round(index_mb, 1), "preload": not args.no_preload,
+                          "results": results}, indent=2))
+        return
+
+    print(f"{len(documents) * args.copies} documents, {index_mb:.1f} MB index file, {cores} cores, "
+          f"{'preloaded before fork' if not args.no_preload else 'loaded by every worker'}")
+    print(f"{'workers':>7} {'req/s':>10} {'speedup':>8} {'efficiency':>10} {'private MB/worker':>18}")
+    for result in results:
+        print(f"{result['workers']:>7} {result['requests_per_second']:>10.1f} {result['speedup']:>8.2f} "
+              f"{result['efficiency']:>10.2f} {result['worker_private_mb']:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
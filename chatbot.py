@@ -1,19 +1,117 @@
 import os
-from typing import List, Dict, Any
-from openai import OpenAI
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple
+import faiss
+import httpx
+import numpy as np
+from openai import AsyncOpenAI, OpenAI
 import logging
-from vector_store import TFTVectorStore
+from vector_store import Filters, TFTVectorStore, EMBEDDING_MODEL, shard_key, shard_matches
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from embedding_providers import DEFAULT_LOCAL_MODEL, EmbeddingProvider, LocalEmbeddingProvider, OpenAIEmbeddingProvider
+from response_cache import SemanticResponseCache
+from index_format import INDEX_FILE_SUFFIX, IndexFormatError
+from index_backends import DEFAULT_NPROBE
+from context_builder import COUNT, ContextBuilder, context_fingerprint
+from history_compactor import HistoryCompactor
+from session_store import DEFAULT_SESSION, SessionStore, SQLiteSessionBackend
+from single_flight import SingleFlight
+from intent_router import IntentRouter, parse_tier
+from kb_compiler import read_delta
+from resilience import CLOSED, HALF_OPEN, OPEN, AdmissionController, CircuitBreaker, CircuitOpenError, Overloaded
+from telemetry import (DEGRADED_ANSWERS, HISTORY_TOKENS_SAVED, PROMPT_TOKENS, REGISTRY, TRACER, MetricFamily,
+                       create_span_exporter, record_tokens, stage, track_request)
+import atexit
 import json
 
 logger = logging.getLogger(__name__)
 
+# Document type requested by a question ("augments for Battle Academia", "list all traits")
+TYPE_WORDS = {
+    "champion": "champion",
+    "champions": "champion",
+    "trait": "trait",
+    "traits": "trait",
+    "item": "item",
+    "items": "item",
+    "augment": "augment",
+    "augments": "augment",
+    "portal": "region_portal",
+    "portals": "region_portal",
+}
+TYPE_WORD_RE = re.compile(r"\b(" + "|".join(TYPE_WORDS) + r")\b")
+LIST_ALL_RE = re.compile(r"\b(list|all|every)\b")
+
+# Knowledge base files, in order of preference
+KNOWLEDGE_BASE_FILES = ("tft15_knowledge_base.json", "tft15_enhanced_knowledge_base.json")
+
+# Conversation history sent with each question
+HISTORY_MESSAGES = 6  # At most the last 3 exchanges verbatim; older ones are compacted
+
+# Answers when no completion can be had: the top retrieved documents, introduced by DEGRADED_NOTICE
+DEGRADED_DOCUMENTS = 3
+DEGRADED_NOTICE = ("The answer service is temporarily unavailable, so here are the knowledge base entries "
+                   "most relevant to your question:")
+ERROR_RESPONSE = "I apologize, but I encountered an error while processing your question. Please try again."
+
+# tft_circuit_open value of each circuit breaker state
+CIRCUIT_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 0.5, OPEN: 1}
+
+
+def history_digest(history: List[Dict[str, str]]) -> str:
+    """Identity of a conversation history; empty for a conversation that hasn't started"""
+    return hashlib.sha256(json.dumps(history).encode('utf-8')).hexdigest() if history else ""
+
+
 class TFTChatbot:
     """TFT Set 15 Q&A Chatbot"""
     
-    def __init__(self, openai_api_key: str, vector_store: TFTVectorStore):
-        self.client = OpenAI(api_key=openai_api_key)
+    def __init__(self, openai_api_key: str, vector_store: TFTVectorStore,
+                 response_cache: Optional[SemanticResponseCache] = None, client=None,
+                 sessions: Optional[SessionStore] = None, async_client=None, filters: Optional[Filters] = None,
+                 completion_breaker: Optional[CircuitBreaker] = None):
+        self.client = client or OpenAI(api_key=openai_api_key)
+        # Used by the asyncio serving mode (aget_response / astream_response)
+        self.async_client = async_client or AsyncOpenAI(api_key=openai_api_key)
+        # While it is open, questions are answered from retrieval alone (see _degraded_response)
+        self.completion_breaker = completion_breaker
         self.vector_store = vector_store
-        self.conversation_history = []
+        self.response_cache = response_cache
+        # Conversation history per client session, so concurrent users never see each other's turns
+        self.sessions = sessions or SessionStore()
+        # Shard filters applied to every retrieval, e.g. {"set": "TFT Set 15"} when several sets are indexed
+        self.filters = filters or {}
+        
+        # Retrieved context is assembled under a token budget instead of a fixed document count
+        self.context_builder = ContextBuilder(
+            vector_store.encoding,
+            max_tokens=int(os.getenv("TFT_CONTEXT_TOKENS", "1500")),
+            min_score=float(os.getenv("TFT_CONTEXT_MIN_SCORE", "0.0"))
+        )
+        self.context_candidates = int(os.getenv("TFT_CONTEXT_CANDIDATES", "20"))
+        self.last_context_stats: Dict[str, int] = {}
+        self.context_tokens_total = 0
+        self.context_requests = 0
+        
+        # History is fitted into a token budget; turns that don't fit are reduced to the entities they mention
+        self.history_compactor = HistoryCompactor(
+            vector_store.encoding,
+            max_tokens=int(os.getenv("TFT_HISTORY_TOKENS", "600")),
+            max_messages=HISTORY_MESSAGES,
+            entity_names=self._entity_names
+        )
+        self.last_prompt_tokens: Dict[str, int] = {}
+        self.history_tokens_saved = 0
+        
+        # Structured questions ("list all 2-cost champions") are answered from templates, skipping the LLM
+        self.intent_router = (IntentRouter(vector_store, self._in_scope)
+                              if os.getenv("TFT_INTENT_ROUTER", "true").lower() == "true" else None)
         
         # System prompt for TFT-specific responses
         self.system_prompt = """You are a helpful assistant for Teamfight Tactics (TFT) Set 15. You have access to specific information about champions, traits, items, augments, and mechanics from TFT Set 15.
@@ -44,130 +142,538 @@ Example responses:
 - If asked about trait effects and only the trait name is in context: "I can see that Bastion exists as a trait, but I don't have information about what it does in the knowledge base"
 
 Keep responses concise and only include information that is directly supported by the provided context."""
+        self.system_prompt_tokens = len(vector_store.encoding.encode(self.system_prompt))
     
-    def get_response(self, user_message: str) -> str:
+    def get_response(self, user_message: str, session_id: str = DEFAULT_SESSION) -> str:
         """Get a response to the user's message"""
         try:
-            # Enhanced search for tier-based queries
-            context = self._get_enhanced_context(user_message)
-            
-            # Build messages array - start with system prompt
-            messages = [{"role": "system", "content": self.system_prompt}]
-            
-            # Add conversation history FIRST (if any)
-            if self.conversation_history:
-                messages.extend(self.conversation_history[-6:])  # Last 3 exchanges
-            
-            # Add current user message LAST
-            messages.append({
-                "role": "user", 
-                "content": f"Context information:\n{context}\n\nUser question: {user_message}"
-            })
-            
-            # Get response from OpenAI
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=500,
-                temperature=0.1
-            )
-            
-            assistant_response = response.choices[0].message.content
-            
-            # Update conversation history AFTER getting response
-            self.conversation_history.append({"role": "user", "content": user_message})
-            self.conversation_history.append({"role": "assistant", "content": assistant_response})
+            with track_request("sync") as request_span:
+                turn = self._prepare_turn(user_message, session_id)
+                ready_response = self._ready_response(turn, request_span)
+                if ready_response is not None:
+                    return ready_response
+                
+                # Get response from OpenAI
+                start = time.perf_counter()
+                try:
+                    with self._completion_call(), stage("completion", upstream="chat_completions"):
+                        response = self.client.chat.completions.create(**self._completion_args(turn))
+                except Exception as e:
+                    return self._degraded_response(user_message, request_span, e)
+                
+                assistant_response = response.choices[0].message.content
+                self._finish_turn(turn, assistant_response, latency=time.perf_counter() - start,
+                                  usage=getattr(response, "usage", None))
+                
+                return assistant_response
             
-            # Keep conversation history manageable
-            if len(self.conversation_history) > 20:
-                self.conversation_history = self.conversation_history[-20:]
+        except Exception as e:
+            logger.error(f"Error getting response: {e}")
+            return ERROR_RESPONSE
+    
+    def stream_response(self, user_message: str, session_id: str = DEFAULT_SESSION) -> Iterator[str]:
+        """Yield the response to the user's message in chunks as the completion streams in"""
+        try:
+            with track_request("stream") as request_span:
+                turn = self._prepare_turn(user_message, session_id)
+                ready_response = self._ready_response(turn, request_span)
+                if ready_response is not None:
+                    yield ready_response
+                    return
+                
+                start = time.perf_counter()
+                chunks = []
+                try:
+                    with self._completion_call(), stage("completion", upstream="chat_completions"):
+                        stream = self.client.chat.completions.create(**self._completion_args(turn), stream=True)
+                        for chunk in stream:
+                            if not chunk.choices:
+                                continue
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                chunks.append(delta)
+                                yield delta
+                except Exception as e:
+                    if chunks:
+                        raise  # Part of the answer is out; it can't be replaced any more
+                    yield self._degraded_response(user_message, request_span, e)
+                    return
+                
+                self._finish_turn(turn, "".join(chunks), latency=time.perf_counter() - start)
             
-            return assistant_response
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            yield ERROR_RESPONSE
+    
+    async def aget_response(self, user_message: str, session_id: str = DEFAULT_SESSION) -> str:
+        """Async get_response: retrieval and session I/O run in worker threads, the completion on the async client"""
+        try:
+            with track_request("async") as request_span:
+                turn = await asyncio.to_thread(self._prepare_turn, user_message, session_id)
+                ready_response = await asyncio.to_thread(self._ready_response, turn, request_span)
+                if ready_response is not None:
+                    return ready_response
+                
+                start = time.perf_counter()
+                try:
+                    with self._completion_call(), stage("completion", upstream="chat_completions"):
+                        response = await self.async_client.chat.completions.create(**self._completion_args(turn))
+                except Exception as e:
+                    return await asyncio.to_thread(self._degraded_response, user_message, request_span, e)
+                
+                assistant_response = response.choices[0].message.content
+                await asyncio.to_thread(self._finish_turn, turn, assistant_response,
+                                        latency=time.perf_counter() - start, usage=getattr(response, "usage", None))
+                
+                return assistant_response
             
         except Exception as e:
             logger.error(f"Error getting response: {e}")
-            return f"I apologize, but I encountered an error while processing your question. Please try again. Error: {str(e)}"
+            return ERROR_RESPONSE
+    
+    async def astream_response(self, user_message: str, session_id: str = DEFAULT_SESSION) -> AsyncIterator[str]:
+        """Async stream_response: yields chunks as the completion streams in on the async client"""
+        try:
+            with track_request("async_stream") as request_span:
+                turn = await asyncio.to_thread(self._prepare_turn, user_message, session_id)
+                ready_response = await asyncio.to_thread(self._ready_response, turn, request_span)
+                if ready_response is not None:
+                    yield ready_response
+                    return
+                
+                start = time.perf_counter()
+                chunks = []
+                try:
+                    with self._completion_call(), stage("completion", upstream="chat_completions"):
+                        stream = await self.async_client.chat.completions.create(**self._completion_args(turn),
+                                                                                 stream=True)
+                        async for chunk in stream:
+                            if not chunk.choices:
+                                continue
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                chunks.append(delta)
+                                yield delta
+                except Exception as e:
+                    if chunks:
+                        raise
+                    yield await asyncio.to_thread(self._degraded_response, user_message, request_span, e)
+                    return
+                
+                await asyncio.to_thread(self._finish_turn, turn, "".join(chunks), latency=time.perf_counter() - start)
+            
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            yield ERROR_RESPONSE
+    
+    @staticmethod
+    def _completion_args(turn: Dict[str, Any]) -> Dict[str, Any]:
+        """Chat completion request parameters for a prepared turn"""
+        return {
+            "model": "gpt-3.5-turbo",
+            "messages": turn["messages"],
+            "max_tokens": 500,
+            "temperature": 0.1
+        }
+    
+    def _completion_call(self):
+        """Context guarding one chat completion with the completion circuit breaker, if any"""
+        return self.completion_breaker.call() if self.completion_breaker is not None else nullcontext()
+    
+    def _degraded_response(self, user_message: str, request_span, error: Exception) -> str:
+        """Answer from retrieval alone when the completion failed or its circuit breaker is open.
+        
+        The top BM25 documents for the question are returned as they are; ranking them
+        makes no embedding call, so a failing embedding upstream isn't called (and
+        counted against its circuit breaker) a second time. The exchange is neither
+        cached nor added to the conversation history.
+        """
+        reason = "circuit_open" if isinstance(error, CircuitOpenError) else "upstream_error"
+        logger.warning(f"Answering from retrieval only ({reason}): {error}")
+        DEGRADED_ANSWERS.inc(reason=reason)
+        request_span.set("degraded", reason)
+        with stage("degraded_retrieval"):
+            context = self.vector_store.get_relevant_context(user_message, k=DEGRADED_DOCUMENTS,
+                                                             filters=self._retrieval_filters(user_message),
+                                                             lexical_only=True)
+        if not context:
+            return ERROR_RESPONSE
+        return f"{DEGRADED_NOTICE}\n\n{context}"
+    
+    def _prepare_turn(self, user_message: str, session_id: Optional[str] = DEFAULT_SESSION,
+                      context: Optional[str] = None, context_fingerprint: Optional[str] = None,
+                      query_vector=None) -> Dict[str, Any]:
+        """Retrieve context, consult the answer cache and build the completion messages for a question.
+        
+        A session_id of None answers statelessly (no history). Batch callers pass the
+        context, its fingerprint and the query embedding they already retrieved. Questions
+        the intent router answers skip retrieval and the cache, and carry their answer
+        in `routed_response`.
+        """
+        retrieved = context is not None
+        if not retrieved and self.intent_router is not None:
+            with stage("intent_routing"):
+                route = self.intent_router.route(user_message)
+            if route is not None:
+                return {"user_message": user_message, "session_id": session_id, "intent": route[0],
+                        "routed_response": route[1], "cached_response": None, "query_vector": None, "messages": [],
+                        "prompt_tokens": None}
+        if not retrieved:
+            # Enhanced search for tier-based queries
+            with stage("retrieval"):
+                context, context_fingerprint = self._retrieve_context(user_message)
+        history = self.sessions.history(session_id) if session_id is not None else []
+        if history:
+            # An answer written for one conversation is only reused in the same conversation
+            context_fingerprint = hashlib.sha256(f"{context_fingerprint}:{history_digest(history)}".encode('utf-8')).hexdigest()
+        turn = {
+            "user_message": user_message,
+            "session_id": session_id,
+            "context": context,
+            "context_fingerprint": context_fingerprint,
+            "intent": None,
+            "routed_response": None,
+            "query_vector": None,
+            "cached_response": None,
+            "messages": [],
+            "prompt_tokens": None
+        }
+        
+        # Serve near-paraphrases of answered questions grounded in the same context (and history) from the cache.
+        # Only reuse a query embedding retrieval already paid for; exact-lookup contexts match by text.
+        if self.response_cache is not None:
+            with stage("response_cache_lookup"):
+                turn["query_vector"] = query_vector if retrieved else self._retrieval_query_vector(user_message)
+                turn["cached_response"] = self.response_cache.lookup(user_message, turn["context_fingerprint"],
+                                                                     self.vector_store.fingerprint, turn["query_vector"])
+            if turn["cached_response"] is not None:
+                return turn
+        
+        # Build messages array - start with system prompt
+        messages = [{"role": "system", "content": self.system_prompt}]
+        
+        # Add conversation history FIRST (if any), compacted to its token budget.
+        # It holds earlier questions and answers only, never their retrieved context.
+        history_stats = {"tokens": 0, "raw_tokens": 0}
+        if history:
+            compacted, history_stats = self.history_compactor.compact(history)
+            messages.extend(compacted)
+        
+        # Add current user message LAST
+        messages.append({
+            "role": "user", 
+            "content": f"Context information:\n{context}\n\nUser question: {user_message}"
+        })
+        turn["messages"] = messages
+        turn["prompt_tokens"] = {
+            "system": self.system_prompt_tokens,
+            "history": history_stats["tokens"],
+            "history_saved": history_stats["raw_tokens"] - history_stats["tokens"],
+            "user": self.history_compactor.count_tokens(messages[-1])
+        }
+        return turn
+    
+    def _ready_response(self, turn: Dict[str, Any], request_span) -> Optional[str]:
+        """The answer of a turn that needs no completion (routed intent or cache hit), recorded like any other"""
+        if turn["routed_response"] is not None:
+            request_span.set("intent", turn["intent"])
+            response = turn["routed_response"]
+        elif turn["cached_response"] is not None:
+            request_span.set("cached", True)
+            response = turn["cached_response"]
+        else:
+            return None
+        self._finish_turn(turn, response)
+        return response
+    
+    def _finish_turn(self, turn: Dict[str, Any], assistant_response: str, latency: Optional[float] = None,
+                     usage=None):
+        """Cache a freshly generated answer, account its tokens and record the exchange in the conversation history"""
+        if latency is not None:
+            self._record_tokens(turn, assistant_response, usage)
+        if latency is not None and self.response_cache is not None and assistant_response:
+            self.response_cache.put(turn["user_message"], assistant_response, turn["context_fingerprint"],
+                                    self.vector_store.fingerprint, latency=latency,
+                                    query_vector=turn["query_vector"])
+        
+        # Update conversation history AFTER getting response
+        if turn["session_id"] is not None:
+            self._add_to_history(turn["session_id"], turn["user_message"], assistant_response)
+    
+    def _record_tokens(self, turn: Dict[str, Any], assistant_response: str, usage=None):
+        """Tokens in and out of a generated answer: the API's usage, or counted locally for streamed answers.
+        
+        Also records the prompt's breakdown by part and the history tokens compaction saved.
+        """
+        prompt_tokens = turn["prompt_tokens"]
+        for part in ("system", "history", "user"):
+            PROMPT_TOKENS.observe(prompt_tokens[part], part=part)
+        HISTORY_TOKENS_SAVED.inc(prompt_tokens["history_saved"])
+        self.last_prompt_tokens = prompt_tokens
+        self.history_tokens_saved += prompt_tokens["history_saved"]
+        
+        if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+            record_tokens(usage.prompt_tokens, usage.completion_tokens or 0)
+            return
+        record_tokens(prompt_tokens["system"] + prompt_tokens["history"] + prompt_tokens["user"],
+                      len(self.vector_store.encoding.encode(assistant_response or "")))
+    
+    def _retrieval_query_vector(self, user_message: str):
+        """The query embedding computed during retrieval, read back from the query cache.
+        
+        None when retrieval embedded nothing (exact lookups, a decisive BM25 match, no
+        query cache); the answer cache then matches by question text alone, and the
+        question is never embedded just for the cache.
+        """
+        query_cache = self.vector_store.query_cache
+        return query_cache.peek(user_message) if query_cache is not None else None
+    
+    def set_vector_store(self, vector_store: TFTVectorStore):
+        """Answer from another (fully loaded) vector store from the next question on"""
+        self.vector_store = vector_store
+        if self.intent_router is not None:
+            self.intent_router.vector_store = vector_store
+    
+    def _entity_names(self, text: str) -> List[str]:
+        """Knowledge base entities mentioned in a text, as named in the knowledge base"""
+        structured = self.vector_store.structured
+        return [structured.find_by_name(name)[0]['metadata']['name'] for name in structured.names_in(text)]
+    
+    def _add_to_history(self, session_id: str, user_message: str, assistant_response: str):
+        """Record a completed exchange in the session's conversation history (bounded by the store)"""
+        self.sessions.append(session_id, user_message, assistant_response)
     
     def _get_enhanced_context(self, user_message: str) -> str:
         """Get enhanced context for tier-based queries"""
+        return self._retrieve_context(user_message)[0]
+    
+    def _retrieve_context(self, user_message: str) -> Tuple[str, str]:
+        """The context for a question and its fingerprint (see context_builder.context_fingerprint)"""
+        context = self._get_exact_context(user_message)
+        if context is not None:
+            return context
+        
+        # For other queries, fill the token budget from the ranked retrieval results
+        filters = self._retrieval_filters(user_message)
+        if self.vector_store.hybrid:
+            results = self.vector_store.hybrid_search(user_message, k=self.context_candidates, filters=filters)
+        else:
+            results = self.vector_store.search(user_message, k=self.context_candidates, filters=filters)
+        return self._build_context(results)
+    
+    def _retrieval_filters(self, user_message: str) -> Optional[Filters]:
+        """Shard filters for a question: the configured set/patch, plus the document type it asks about"""
+        filters = dict(self.filters)
         message_lower = user_message.lower()
-
-        # Check if this is a tier-based query
-        tier_pattern = None
-
-        # Robust parsing of tier number from message (supports "2 cost", "2-cost", "tier 2", "two cost", etc.)
-        try:
-            import re
-
-            word_to_num = {
-                "one": 1,
-                "two": 2,
-                "three": 3,
-                "four": 4,
-                "five": 5,
+        types = {TYPE_WORDS[word] for word in TYPE_WORD_RE.findall(message_lower)}
+        if len(types) == 1:
+            # Entities named in the question stay reachable ("best items for Ahri" still finds Ahri)
+            structured = self.vector_store.structured
+            types.update(doc.get('metadata', {}).get('type', '')
+                         for name in structured.names_in(message_lower) for doc in structured.find_by_name(name))
+            filters["type"] = sorted(types)
+        return filters or None
+    
+    def _get_contexts(self, user_messages: List[str]
+                      ) -> Tuple[List[Tuple[str, str]], List[Optional[np.ndarray]]]:
+        """`_retrieve_context` for many questions, with the query embeddings used.
+        
+        Questions that need retrieval are embedded in batched calls and searched with
+        one FAISS search per shard.
+        """
+        contexts = [self._get_exact_context(message) for message in user_messages]
+        query_vectors: List[Optional[np.ndarray]] = [None] * len(user_messages)
+        pending = [i for i, context in enumerate(contexts) if context is None]
+        if pending:
+            questions = [user_messages[i] for i in pending]
+            search_many = self.vector_store.hybrid_search_many if self.vector_store.hybrid else self.vector_store.search_many
+            results, vectors = search_many(questions, k=self.context_candidates,
+                                           filters=[self._retrieval_filters(question) for question in questions])
+            for i, question_results, query_vector in zip(pending, results, vectors):
+                contexts[i] = self._build_context(question_results)
+                query_vectors[i] = query_vector
+        return contexts, query_vectors
+    
+    def answer_batch(self, questions: List[str], max_concurrency: int = 8,
+                     admission: Optional[AdmissionController] = None) -> Iterator[Dict[str, Any]]:
+        """Answer many independent questions, yielding results as they complete.
+        
+        Questions the intent router answers skip retrieval and completion. Retrieval
+        runs once for the rest of the batch (see `_get_contexts`); completions run
+        with at most `max_concurrency` in flight. Questions are answered without
+        conversation history. Each result carries its position in `questions`.
+        
+        With `admission`, the caller already holds one slot for the batch; every
+        further completion in flight takes a slot of its own, and a question shed
+        for lack of one gets an error result with `retry_after`.
+        """
+        start = time.perf_counter()
+        routes = [self.intent_router.route(question) if self.intent_router is not None else None
+                  for question in questions]
+        pending = [i for i, route in enumerate(routes) if route is None]
+        contexts: List[Optional[Tuple[str, str]]] = [None] * len(questions)
+        query_vectors: List[Optional[np.ndarray]] = [None] * len(questions)
+        with stage("retrieval", questions=len(pending)):
+            pending_contexts, pending_vectors = self._get_contexts([questions[i] for i in pending])
+        for i, context, query_vector in zip(pending, pending_contexts, pending_vectors):
+            contexts[i] = context
+            query_vectors[i] = query_vector
+        retrieval_ms = (time.perf_counter() - start) * 1000
+        batch_slot = threading.Semaphore(1)
+        
+        @contextmanager
+        def completion_slot() -> Iterator[None]:
+            """Admission slot for one completion: the batch's own if free, else a new one"""
+            if admission is None:
+                yield
+            elif batch_slot.acquire(blocking=False):
+                try:
+                    yield
+                finally:
+                    batch_slot.release()
+            else:
+                with admission.admit():
+                    yield
+        
+        def answer(index: int) -> Dict[str, Any]:
+            item_start = time.perf_counter()
+            with track_request("batch") as request_span:
+                if routes[index] is not None:
+                    request_span.set("intent", routes[index][0])
+                    return {
+                        "answer": routes[index][1],
+                        "cached": False,
+                        "intent": routes[index][0],
+                        "degraded": False,
+                        "timings": {
+                            "retrieval_ms": round(retrieval_ms, 1),
+                            "completion_ms": 0.0,
+                            "total_ms": round((time.perf_counter() - start) * 1000, 1)
+                        }
+                    }
+                context, context_fingerprint = contexts[index]
+                turn = self._prepare_turn(questions[index], None, context=context,
+                                          context_fingerprint=context_fingerprint, query_vector=query_vectors[index])
+                cached = turn["cached_response"] is not None
+                degraded = False
+                if cached:
+                    request_span.set("cached", True)
+                    assistant_response = turn["cached_response"]
+                else:
+                    try:
+                        with completion_slot():
+                            try:
+                                with self._completion_call(), stage("completion", upstream="chat_completions"):
+                                    response = self.client.chat.completions.create(**self._completion_args(turn))
+                            except Exception as e:
+                                assistant_response = self._degraded_response(questions[index], request_span, e)
+                                degraded = True
+                            else:
+                                assistant_response = response.choices[0].message.content
+                                self._finish_turn(turn, assistant_response, latency=time.perf_counter() - item_start,
+                                                  usage=getattr(response, "usage", None))
+                    except Overloaded as e:
+                        request_span.set("shed", True)
+                        return {"error": "Server overloaded, please retry shortly", "retry_after": e.retry_after,
+                                "timings": {"retrieval_ms": round(retrieval_ms, 1),
+                                            "total_ms": round((time.perf_counter() - start) * 1000, 1)}}
+            return {
+                "answer": assistant_response,
+                "cached": cached,
+                "intent": None,
+                "degraded": degraded,
+                "timings": {
+                    "retrieval_ms": round(retrieval_ms, 1),  # Shared by the whole batch
+                    "completion_ms": round((time.perf_counter() - item_start) * 1000, 1),
+                    "total_ms": round((time.perf_counter() - start) * 1000, 1)
+                }
             }
+        
+        executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency))
+        futures = {executor.submit(answer, i): i for i in range(len(questions))}
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Error answering batch question {index}: {e}")
+                    result = {"error": "Failed to generate an answer",
+                              "timings": {"retrieval_ms": round(retrieval_ms, 1),
+                                          "total_ms": round((time.perf_counter() - start) * 1000, 1)}}
+                yield {"index": index, "question": questions[index], **result}
+        finally:
+            # Stop queued completions if the consumer goes away early
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def _get_exact_context(self, user_message: str) -> Optional[Tuple[str, str]]:
+        """Context (and its fingerprint) for tier and type-scoped questions answered by exact lookup, or None if
+        retrieval is needed"""
+        message_lower = user_message.lower()
 
-            # Patterns capture numeric or word-based tier references
-            regex_patterns = [
-                r"\b([1-5])\s*-?\s*costs?\b",
-                r"\bcosts?\s*-?\s*([1-5])\b",
-                r"\btier\s*-?\s*([1-5])\b",
-                r"\b(one|two|three|four|five)\s*-?\s*costs?\b",
-                r"\btier\s*-?\s*(one|two|three|four|five)\b",
-            ]
-
-            detected_tier_number = None
-            for pattern in regex_patterns:
-                match = re.search(pattern, message_lower)
-                if match:
-                    value = match.group(1)
-                    if value.isdigit():
-                        detected_tier_number = int(value)
-                    else:
-                        detected_tier_number = word_to_num.get(value)
-                    break
-
-            if detected_tier_number in {1, 2, 3, 4, 5}:
-                tier_pattern = f"Tier: {detected_tier_number}"
-        except Exception:
-            # Fall back to simple phrase checks if regex parsing fails for any reason
-            if any(phrase in message_lower for phrase in ["1-cost", "tier 1", "cost 1", "1 cost"]):
-                tier_pattern = "Tier: 1"
-            elif any(phrase in message_lower for phrase in ["2-cost", "tier 2", "cost 2", "2 cost"]):
-                tier_pattern = "Tier: 2"
-            elif any(phrase in message_lower for phrase in ["3-cost", "tier 3", "cost 3", "3 cost"]):
-                tier_pattern = "Tier: 3"
-            elif any(phrase in message_lower for phrase in ["4-cost", "tier 4", "cost 4", "4 cost"]):
-                tier_pattern = "Tier: 4"
-            elif any(phrase in message_lower for phrase in ["5-cost", "tier 5", "cost 5", "5 cost"]):
-                tier_pattern = "Tier: 5"
+        # Tier-based query? ("2 cost", "2-cost", "tier 2", "two cost", ...)
+        tier = parse_tier(message_lower)
+        tier_pattern = f"Tier: {tier}" if tier is not None else None
         
         if tier_pattern:
-            # For tier-based queries, use pattern search to find ALL champions of that tier
+            # For tier-based queries, use the structured index to find ALL champions of that tier
             try:
-                matching_docs = self.vector_store.search_by_pattern(tier_pattern)
-                
-                # Filter to only include champion documents (not summary documents)
-                champion_docs = []
-                for doc in matching_docs:
-                    content = doc.get('content', '')
-                    if 'Name:' in content and tier_pattern in content and 'champions' not in content.lower():
-                        champion_docs.append(doc)
-                
-                # Create context from all matching champion documents
-                context = f"Found {len(champion_docs)} {tier_pattern} champions:\n\n"
-                for i, doc in enumerate(champion_docs, 1):
-                    context += f"Document {i}:\n{doc['content']}\n\n"
-                
-                return context.strip()
+                champion_docs = self._in_scope(self.vector_store.structured.champions_with_tier(int(tier_pattern[-1])))
+                return self._build_context([(doc, None) for doc in champion_docs],
+                                           header=f"Found {COUNT} {tier_pattern} champions:")
                 
             except Exception as e:
                 logger.error(f"Error in pattern search: {e}")
                 # Fallback to vector search
-                return self.vector_store.get_relevant_context(tier_pattern, k=20)
-        else:
-            # For non-tier queries, use the original approach
-            return self.vector_store.get_relevant_context(user_message, k=20)
+                return self._build_context(self.vector_store.hybrid_search(tier_pattern, k=self.context_candidates))
+        
+        return self._get_structured_context(message_lower)
+    
+    def _build_context(self, results, header: str = "") -> Tuple[str, str]:
+        """Assemble context within the token budget and record its token accounting.
+        
+        Returns the context and the fingerprint of the documents in it.
+        """
+        with stage("context_assembly"):
+            context, stats, keys = self.context_builder.build(results, header=header)
+        self.last_context_stats = stats
+        self.context_tokens_total += stats["tokens"]
+        self.context_requests += 1
+        logger.info(f"Context: {stats['documents']}/{stats['candidates']} documents, {stats['tokens']} tokens")
+        return context, context_fingerprint(keys)
+    
+    def _get_structured_context(self, message_lower: str) -> Optional[Tuple[str, str]]:
+        """Resolve type-scoped questions ("augments for Battle Academia", "list all traits") by exact lookup"""
+        type_match = TYPE_WORD_RE.search(message_lower)
+        if not type_match:
+            return None
+        doc_type = TYPE_WORDS[type_match.group(1)]
+        structured = self.vector_store.structured
+        
+        docs = []
+        description = ""
+        names = structured.names_in(message_lower)
+        if names:
+            # A named entity of the requested type is the answer itself; otherwise list what mentions it
+            docs = self._in_scope(structured.find_by_name(names[0], doc_type))
+            description = f"{doc_type} named {names[0]}"
+            if not docs:
+                docs = self._in_scope(structured.documents_mentioning(names[0], doc_type))
+                description = f"{doc_type} documents mentioning {names[0]}"
+        elif LIST_ALL_RE.search(message_lower):
+            docs = self._in_scope(structured.documents_of_type(doc_type))
+            description = f"{doc_type} documents"
+        
+        if not docs:
+            return None
+        
+        return self._build_context([(doc, None) for doc in docs], header=f"Found {COUNT} {description}:")
+    
+    def _in_scope(self, docs: List[Dict]) -> List[Dict]:
+        """Structured lookups cover every indexed set and patch; keep the configured ones"""
+        if not self.filters:
+            return docs
+        return [doc for doc in docs if shard_matches(shard_key(doc), self.filters)]
     
     def get_suggested_questions(self) -> List[str]:
         """Get a list of suggested questions for the user"""
@@ -184,16 +690,23 @@ Keep responses concise and only include information that is directly supported b
             "What tier is Aatrox in Set 15?"
         ]
     
-    def clear_history(self):
-        """Clear conversation history"""
-        self.conversation_history = []
+    def clear_history(self, session_id: Optional[str] = None):
+        """Clear one session's conversation history, or every session's when no id is given"""
+        self.sessions.clear(session_id)
         logger.info("Conversation history cleared")
     
     def get_stats(self) -> Dict[str, Any]:
         """Get chatbot statistics"""
         return {
-            "conversation_length": len(self.conversation_history),
-            "vector_store_documents": len(self.vector_store.documents) if self.vector_store.documents else 0
+            "sessions": self.sessions.get_stats(),
+            "vector_store_documents": len(self.vector_store.documents) if self.vector_store.documents else 0,
+            "query_cache": self.vector_store.query_cache.get_stats() if self.vector_store.query_cache else None,
+            "response_cache": self.response_cache.get_stats() if self.response_cache else None,
+            "intent_router": self.intent_router.get_stats() if self.intent_router else None,
+            "last_context": self.last_context_stats,
+            "last_prompt_tokens": self.last_prompt_tokens,
+            "history_tokens_saved": self.history_tokens_saved,
+            "avg_context_tokens": self.context_tokens_total / self.context_requests if self.context_requests else 0.0
         }
 
 class TFTChatbotManager:
@@ -201,20 +714,55 @@ class TFTChatbotManager:
     
     def __init__(self, openai_api_key: str):
         self.openai_api_key = openai_api_key
+        self.index_path = "tft15_index"
         self.vector_store = None
+        self.embedding_cache = None
+        self.query_cache = None
         self.chatbot = None
+        # Identical questions in flight at the same time share one retrieval + completion
+        self.single_flight = SingleFlight()
+        # Calls to each upstream stop for a while after repeated failures instead of waiting out its timeout
+        self.breakers = {name: self.create_breaker(name) for name in ("embeddings", "chat_completions")}
+        # (stats it was built from, JSON body, ETag) of /api/knowledge-base-info
+        self._knowledge_base_info: Optional[Tuple[Dict, bytes, str]] = None
+        
+    def initialize(self, force_rebuild: bool = False, sync: bool = False):
+        """Initialize the chatbot and vector store.
         
-    def initialize(self, force_rebuild: bool = False):
-        """Initialize the chatbot and vector store"""
+        With `sync`, an existing index is diffed against the knowledge base and only
+        added, removed or changed documents are re-embedded.
+        """
         try:
-            # Initialize vector store
-            self.vector_store = TFTVectorStore(self.openai_api_key)
+            # Initialize vector store; the embedding cache makes rebuilds re-embed only changed documents
+            self.embedding_cache = EmbeddingCache(os.getenv("TFT_EMBEDDING_CACHE_DIR", "embedding_cache"))
+            embedding_provider = self.create_embedding_provider()
+            self.query_cache = self.create_query_cache(embedding_provider.model)
+            index_type = os.getenv("TFT_INDEX_TYPE", "flat")
+            self.vector_store = self.create_vector_store(embedding_provider, index_type)
             
             # Check if index exists
-            index_path = "tft15_index"
-            if not force_rebuild and self.vector_store.index_exists(index_path):
+            loaded = False
+            if not force_rebuild and self.vector_store.index_exists(self.index_path):
                 logger.info("Loading existing index...")
-                self.vector_store.load_index(index_path)
+                try:
+                    self.vector_store.load_index(self.index_path, verify=self.verify_index)
+                    loaded = True
+                except IndexFormatError as e:
+                    logger.warning(f"Cannot use the existing index ({e}); rebuilding it")
+            
+            if loaded:
+                if self.vector_store.index_type != index_type:
+                    # Re-index with the configured backend; the embedding cache supplies the vectors
+                    logger.info(f"Index is {self.vector_store.index_type}, rebuilding it as {index_type}...")
+                    documents = self.vector_store.documents
+                    self.vector_store.index_type = index_type
+                    self.vector_store.build_index(documents, self.vector_store.create_embeddings(documents))
+                    self.vector_store.save_index(self.index_path)
+                elif not os.path.exists(f"{self.index_path}{INDEX_FILE_SUFFIX}"):
+                    # Migrate a legacy FAISS + pickle pair to the single-file format
+                    self.vector_store.save_index(self.index_path)
+                if sync:
+                    self.sync_knowledge_base()
             else:
                 logger.info("Building new index with placeholder data...")
                 
@@ -226,10 +774,21 @@ class TFTChatbotManager:
                 self.vector_store.build_index(documents, embeddings)
                 
                 # Save index
-                self.vector_store.save_index(index_path)
+                self.vector_store.save_index(self.index_path)
+                self._compact_embedding_cache(documents)
+            
+            if TRACER.exporter is None:
+                TRACER.exporter = create_span_exporter()
+            REGISTRY.register_collector("chatbot", self.collect_metrics)
             
             # Initialize chatbot
-            self.chatbot = TFTChatbot(self.openai_api_key, self.vector_store)
+            self.chatbot = TFTChatbot(self.openai_api_key, self.vector_store,
+                                      response_cache=self.create_response_cache(),
+                                      client=self.create_client(),
+                                      sessions=self.create_session_store(),
+                                      async_client=self.create_async_client(),
+                                      filters=self.create_filters(),
+                                      completion_breaker=self.breakers["chat_completions"])
             
             logger.info("Chatbot initialized successfully")
             return True
@@ -238,28 +797,185 @@ class TFTChatbotManager:
             logger.error(f"Failed to initialize chatbot: {e}")
             return False
     
+    @property
+    def verify_index(self) -> bool:
+        return os.getenv("TFT_INDEX_VERIFY", "true").lower() == "true"
+    
+    def create_vector_store(self, embedding_provider: EmbeddingProvider, index_type: str) -> TFTVectorStore:
+        vector_store = TFTVectorStore(self.openai_api_key, embedding_cache=self.embedding_cache,
+                                      query_cache=self.query_cache, index_type=index_type,
+                                      nprobe=int(os.getenv("TFT_INDEX_NPROBE", str(DEFAULT_NPROBE))),
+                                      embedding_provider=embedding_provider)
+        vector_store.embedding_breaker = self.breakers["embeddings"]
+        return vector_store
+    
+    def reload_index(self) -> bool:
+        """Load the saved index into a new vector store and swap it in whole.
+        
+        For picking up an index rebuilt or synced by another process. The new store is
+        fully loaded (every shard) before the swap, so each request sees either the old
+        index or the new one; requests already running finish on the old one.
+        """
+        try:
+            vector_store = self.create_vector_store(self.vector_store.embedding_provider, self.vector_store.index_type)
+            vector_store.load_index(self.index_path, verify=self.verify_index)
+            vector_store.load_all_shards()
+        except Exception as e:
+            logger.error(f"Failed to reload the index, still serving the previous one: {e}")
+            return False
+        
+        self.vector_store = vector_store
+        self.chatbot.set_vector_store(vector_store)
+        if self.chatbot.response_cache:
+            self.chatbot.response_cache.invalidate()
+        logger.info(f"Reloaded index {self.index_path} (fingerprint {vector_store.fingerprint})")
+        return True
+    
+    def after_fork(self):
+        """Prepare a worker process forked from a preloaded manager (see gunicorn.conf.py).
+        
+        The index, documents and caches are inherited and shared with the parent; the
+        OpenAI HTTP connection pools are not safe to share and are replaced.
+        """
+        if isinstance(self.chatbot.client, OpenAI):
+            self.chatbot.client = self.create_client()
+        provider = self.vector_store.embedding_provider
+        if isinstance(provider, OpenAIEmbeddingProvider) and isinstance(provider.client, OpenAI):
+            provider.client = self.create_embedding_client()
+        # Workers are the parallelism; a single search thread each avoids oversubscribing the cores
+        faiss.omp_set_num_threads(int(os.getenv("TFT_FAISS_THREADS", "1")))
+    
+    def create_embedding_provider(self) -> EmbeddingProvider:
+        """Create the embedding provider from environment settings: OpenAI, or a local CPU model"""
+        provider = os.getenv("TFT_EMBEDDING_PROVIDER", "openai").lower()
+        model = os.getenv("TFT_EMBEDDING_MODEL")
+        if provider == "local":
+            return LocalEmbeddingProvider(
+                model=model or DEFAULT_LOCAL_MODEL,
+                batch_size=int(os.getenv("TFT_LOCAL_EMBEDDING_BATCH_SIZE", "64")),
+                backend=os.getenv("TFT_LOCAL_EMBEDDING_BACKEND", "torch")
+            )
+        if provider != "openai":
+            raise ValueError(f"Unknown TFT_EMBEDDING_PROVIDER {provider!r}, expected 'openai' or 'local'")
+        return OpenAIEmbeddingProvider(client=self.create_embedding_client(), model=model or EMBEDDING_MODEL)
+    
+    def create_query_cache(self, model: str = EMBEDDING_MODEL) -> QueryEmbeddingCache:
+        """Create the query embedding cache from environment settings"""
+        ttl = os.getenv("TFT_QUERY_CACHE_TTL")
+        persist_path = os.getenv("TFT_QUERY_CACHE_PATH") or None
+        query_cache = QueryEmbeddingCache(
+            max_size=int(os.getenv("TFT_QUERY_CACHE_SIZE", "1024")),
+            ttl_seconds=float(ttl) if ttl else None,
+            persist_path=persist_path,
+            model=model
+        )
+        if persist_path:
+            atexit.register(query_cache.save)
+        return query_cache
+    
+    def create_filters(self) -> Filters:
+        """Set and patch every question is answered from, when several are indexed"""
+        return {field: os.getenv(variable) for field, variable in (("set", "TFT_SET"), ("patch", "TFT_PATCH"))
+                if os.getenv(variable)}
+    
+    def create_response_cache(self) -> Optional[SemanticResponseCache]:
+        """Create the semantic answer cache from environment settings (TFT_RESPONSE_CACHE=false disables it)"""
+        if os.getenv("TFT_RESPONSE_CACHE", "true").lower() != "true":
+            return None
+        ttl = os.getenv("TFT_RESPONSE_CACHE_TTL")
+        return SemanticResponseCache(
+            threshold=float(os.getenv("TFT_RESPONSE_CACHE_THRESHOLD", "0.95")),
+            max_entries=int(os.getenv("TFT_RESPONSE_CACHE_SIZE", "512")),
+            ttl_seconds=float(ttl) if ttl else None
+        )
+    
+    def create_session_store(self) -> SessionStore:
+        """Create the per-session conversation store from environment settings"""
+        ttl = os.getenv("TFT_SESSION_TTL", "3600")
+        db_path = os.getenv("TFT_SESSION_DB")
+        return SessionStore(
+            max_turns=int(os.getenv("TFT_SESSION_TURNS", "10")),
+            ttl_seconds=float(ttl) if ttl else None,
+            max_bytes=int(os.getenv("TFT_SESSION_MAX_BYTES", str(64 * 1024 * 1024))),
+            backend=SQLiteSessionBackend(db_path) if db_path else None
+        )
+    
+    def create_async_client(self) -> AsyncOpenAI:
+        """Create the shared AsyncOpenAI client, pooling keep-alive connections up to TFT_OPENAI_MAX_CONNECTIONS"""
+        max_connections = int(os.getenv("TFT_OPENAI_MAX_CONNECTIONS", "100"))
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=self.completion_timeout()
+        )
+        return AsyncOpenAI(api_key=self.openai_api_key, http_client=http_client,
+                           max_retries=int(os.getenv("TFT_OPENAI_MAX_RETRIES", "1")))
+    
+    def create_client(self) -> OpenAI:
+        """Create the chat completion client, bounded by TFT_OPENAI_TIMEOUT per attempt and TFT_OPENAI_MAX_RETRIES"""
+        return OpenAI(api_key=self.openai_api_key, timeout=self.completion_timeout(),
+                      max_retries=int(os.getenv("TFT_OPENAI_MAX_RETRIES", "1")))
+    
+    def create_embedding_client(self) -> OpenAI:
+        """Create the embeddings client, bounded by TFT_EMBEDDING_TIMEOUT per attempt.
+        
+        The client doesn't retry: the vector store retries document batches with
+        backoff, and a question whose embedding fails is ranked by BM25 alone.
+        """
+        return OpenAI(api_key=self.openai_api_key, max_retries=0,
+                      timeout=httpx.Timeout(float(os.getenv("TFT_EMBEDDING_TIMEOUT", "10")), connect=5.0))
+    
+    @staticmethod
+    def completion_timeout() -> httpx.Timeout:
+        return httpx.Timeout(float(os.getenv("TFT_OPENAI_TIMEOUT", "30")), connect=5.0)
+    
+    @staticmethod
+    def create_breaker(name: str) -> CircuitBreaker:
+        """Circuit breaker for an upstream: opens after TFT_BREAKER_FAILURES failures in a row, for TFT_BREAKER_RESET seconds"""
+        return CircuitBreaker(name, failure_threshold=int(os.getenv("TFT_BREAKER_FAILURES", "5")),
+                              reset_timeout=float(os.getenv("TFT_BREAKER_RESET", "30")))
+    
+    def sync_knowledge_base(self, delta_path: Optional[str] = None) -> Dict[str, int]:
+        """Apply knowledge base edits to the loaded index incrementally and save it.
+        
+        With a delta file from kb_compiler.py (`delta_path`, or TFT_KNOWLEDGE_BASE_DELTA)
+        only the records in it are applied; otherwise the whole knowledge base is diffed.
+        """
+        delta_path = delta_path or os.getenv("TFT_KNOWLEDGE_BASE_DELTA")
+        if delta_path and os.path.exists(delta_path):
+            logger.info(f"Applying knowledge base delta {delta_path}")
+            changes = self.vector_store.apply_delta(*read_delta(delta_path))
+        else:
+            changes = self.vector_store.sync(self.create_placeholder_documents())
+        if changes["added"] or changes["removed"] or changes["changed"]:
+            if self.chatbot and self.chatbot.response_cache:
+                self.chatbot.response_cache.invalidate()
+            self.vector_store.save_index(self.index_path)
+            self._compact_embedding_cache(self.vector_store.documents)
+        return changes
+    
+    def _compact_embedding_cache(self, documents: List[Dict]):
+        """Evict cache entries for documents that no longer exist"""
+        if self.embedding_cache is not None:
+            self.embedding_cache.compact(
+                EmbeddingCache.key(self.vector_store.embedding_model, doc.get('content', '')) for doc in documents
+            )
+    
     def create_placeholder_documents(self):
         """Create comprehensive TFT Set 15 documents from the knowledge base"""
         try:
             # Load the main TFT15 knowledge base
             knowledge_base_path = "tft15_knowledge_base.json"
             if os.path.exists(knowledge_base_path):
-                with open(knowledge_base_path, 'r', encoding='utf-8') as f:
-                    knowledge_base = json.load(f)
-                
-                documents = knowledge_base.get("documents", [])
+                documents = self._load_knowledge_base(knowledge_base_path)
                 logger.info(f"Loaded {len(documents)} documents from TFT15 knowledge base")
-                return documents
+                return documents + self._load_extra_knowledge_bases()
             
             # Fallback to enhanced knowledge base if main one doesn't exist
             enhanced_kb_path = "tft15_enhanced_knowledge_base.json"
             if os.path.exists(enhanced_kb_path):
-                with open(enhanced_kb_path, 'r', encoding='utf-8') as f:
-                    knowledge_base = json.load(f)
-                
-                documents = knowledge_base.get("documents", [])
+                documents = self._load_knowledge_base(enhanced_kb_path)
                 logger.info(f"Loaded {len(documents)} documents from enhanced TFT15 knowledge base")
-                return documents
+                return documents + self._load_extra_knowledge_bases()
             else:
                 logger.warning(f"Knowledge base files not found, using fallback data")
                 return self.create_fallback_documents()
@@ -268,6 +984,29 @@ class TFTChatbotManager:
             logger.error(f"Error loading TFT15 knowledge base: {e}")
             return self.create_fallback_documents()
     
+    @staticmethod
+    def _load_knowledge_base(path: str) -> List[Dict]:
+        """Documents of a knowledge base file, tagged with its set and patch for the sharded index"""
+        with open(path, 'r', encoding='utf-8') as f:
+            knowledge_base = json.load(f)
+        
+        documents = knowledge_base.get("documents", [])
+        for doc in documents:
+            metadata = doc.setdefault('metadata', {})
+            for field in ("set", "patch"):
+                if knowledge_base.get(field) and not metadata.get(field):
+                    metadata[field] = knowledge_base[field]
+        return documents
+    
+    def _load_extra_knowledge_bases(self) -> List[Dict]:
+        """Knowledge bases of other sets or patches listed in TFT_EXTRA_KNOWLEDGE_BASES (comma-separated)"""
+        documents = []
+        for path in filter(None, (p.strip() for p in os.getenv("TFT_EXTRA_KNOWLEDGE_BASES", "").split(","))):
+            extra = self._load_knowledge_base(path)
+            logger.info(f"Loaded {len(extra)} documents from {path}")
+            documents.extend(extra)
+        return documents
+    
     def create_fallback_documents(self):
         """Create fallback documents if knowledge base is not available"""
         return [
@@ -281,12 +1020,77 @@ class TFTChatbotManager:
             }
         ]
     
-    def get_response(self, message: str) -> str:
-        """Get a response from the chatbot"""
+    def _coalescing_key(self, message: str, session_id: str):
+        """Requests are coalesced when the normalized question and the history sent with it match.
+        
+        Only reads the session: an unknown session id is not created.
+        """
+        return QueryEmbeddingCache.normalize(message), history_digest(self.chatbot.sessions.history(session_id))
+    
+    def _answer(self, message: str, session_id: str) -> Tuple[str, str]:
+        """The chatbot's response and the session it recorded the exchange in"""
+        return self.chatbot.get_response(message, session_id), session_id
+    
+    async def _aanswer(self, message: str, session_id: str) -> Tuple[str, str]:
+        return await self.chatbot.aget_response(message, session_id), session_id
+    
+    def _share_answer(self, message: str, session_id: str, response: str, leader_session_id: str):
+        """Record a coalesced request's exchange, which the leading request only recorded in its own session"""
+        if session_id != leader_session_id and self._is_answer(response):
+            self.chatbot._add_to_history(session_id, message, response)
+    
+    def get_response(self, message: str, session_id: str = DEFAULT_SESSION) -> str:
+        """Get a response from the chatbot, sharing the work of identical concurrent questions"""
+        if not self.chatbot:
+            return "Chatbot not initialized. Please try again."
+        
+        (response, leader_session_id), shared = self.single_flight.do(self._coalescing_key(message, session_id),
+                                                                      self._answer, message, session_id)
+        if shared:
+            self._share_answer(message, session_id, response, leader_session_id)
+        return response
+    
+    def stream_response(self, message: str, session_id: str = DEFAULT_SESSION) -> Iterator[str]:
+        """Stream a response from the chatbot in chunks"""
+        if not self.chatbot:
+            yield "Chatbot not initialized. Please try again."
+            return
+        
+        yield from self.chatbot.stream_response(message, session_id)
+    
+    async def aget_response(self, message: str, session_id: str = DEFAULT_SESSION) -> str:
+        """Get a response from the chatbot without blocking the event loop"""
         if not self.chatbot:
             return "Chatbot not initialized. Please try again."
         
-        return self.chatbot.get_response(message)
+        # Session reads and writes may hit SQLite, so they run in worker threads too
+        key = await asyncio.to_thread(self._coalescing_key, message, session_id)
+        (response, leader_session_id), shared = await self.single_flight.ado(key, self._aanswer, message, session_id)
+        if shared:
+            await asyncio.to_thread(self._share_answer, message, session_id, response, leader_session_id)
+        return response
+    
+    @staticmethod
+    def _is_answer(response: str) -> bool:
+        """Whether a response belongs in the conversation history (not an error or a degraded answer)"""
+        return response != ERROR_RESPONSE and not response.startswith(DEGRADED_NOTICE)
+    
+    async def astream_response(self, message: str, session_id: str = DEFAULT_SESSION) -> AsyncIterator[str]:
+        """Stream a response from the chatbot in chunks without blocking the event loop"""
+        if not self.chatbot:
+            yield "Chatbot not initialized. Please try again."
+            return
+        
+        async for delta in self.chatbot.astream_response(message, session_id):
+            yield delta
+    
+    def answer_batch(self, questions: List[str], max_concurrency: int = 8,
+                     admission: Optional[AdmissionController] = None) -> Iterator[Dict[str, Any]]:
+        """Answer many independent questions, yielding results as they complete"""
+        if not self.chatbot:
+            raise RuntimeError("Chatbot not initialized")
+        
+        yield from self.chatbot.answer_batch(questions, max_concurrency, admission)
     
     def get_suggestions(self) -> List[str]:
         """Get suggested questions"""
@@ -295,10 +1099,88 @@ class TFTChatbotManager:
         
         return self.chatbot.get_suggested_questions()
     
-    def clear_history(self):
+    def clear_history(self, session_id: Optional[str] = None):
         """Clear conversation history"""
         if self.chatbot:
-            self.chatbot.clear_history()
+            self.chatbot.clear_history(session_id)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get chatbot and request coalescing statistics"""
+        stats = self.chatbot.get_stats() if self.chatbot else {}
+        stats["coalescing"] = self.single_flight.get_stats()
+        stats["circuit_breakers"] = {name: breaker.get_stats() for name, breaker in self.breakers.items()}
+        return stats
+    
+    def knowledge_base_info(self) -> Tuple[bytes, str]:
+        """JSON body and ETag of the knowledge base statistics.
+        
+        Built from the counts the vector store keeps up to date on index load and
+        sync, and only re-serialized when those change.
+        """
+        stats = self.vector_store.document_stats
+        if self._knowledge_base_info is None or self._knowledge_base_info[0] is not stats:
+            knowledge_base_file = next((path for path in KNOWLEDGE_BASE_FILES if os.path.exists(path)), None)
+            document_types = {"champions": 0, "traits": 0, "items": 0, "augments": 0, "region_portals": 0,
+                              "power_ups": 0, "general": 0}
+            for doc_type, count in stats["types"].items():
+                document_types[doc_type if doc_type == "general" else f"{doc_type}s"] = count
+            body = json.dumps({
+                "knowledge_base_file": knowledge_base_file,
+                "total_documents": stats["total_documents"],
+                "document_types": document_types,
+                "sets": stats["sets"],
+                "index_fingerprint": stats["fingerprint"]
+            }).encode('utf-8')
+            self._knowledge_base_info = (stats, body, hashlib.sha256(body).hexdigest()[:16])
+        return self._knowledge_base_info[1], self._knowledge_base_info[2]
+    
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Scrape-time metrics read from the live caches, index and session store"""
+        caches = {"query_embedding": self.query_cache, "document_embedding": self.embedding_cache}
+        if self.chatbot and self.chatbot.response_cache:
+            caches["response"] = self.chatbot.response_cache
+        hits, misses, entries = [], [], []
+        for name, cache in caches.items():
+            if cache is None:
+                continue
+            cache_stats = cache.get_stats()
+            cache_misses = cache_stats.get("misses", cache_stats.get("lookups", 0) - cache_stats["hits"])
+            hits.append(({"cache": name}, cache_stats["hits"]))
+            misses.append(({"cache": name}, cache_misses))
+            entries.append(({"cache": name}, cache_stats["entries"]))
+        families = [
+            ("tft_cache_hits_total", "counter", "Cache lookups answered from the cache", hits),
+            ("tft_cache_misses_total", "counter", "Cache lookups that missed", misses),
+            ("tft_cache_entries", "gauge", "Entries held by each cache", entries),
+            ("tft_coalesced_requests_total", "counter", "Requests that shared an identical in-flight request's answer",
+             [({}, self.single_flight.coalesced)])
+        ]
+        
+        store = self.vector_store
+        if store is not None and store.is_built:
+            index_file = f"{self.index_path}{INDEX_FILE_SUFFIX}"
+            families += [
+                ("tft_index_documents", "gauge", "Documents in the vector index", [({}, len(store.documents))]),
+                ("tft_index_shards", "gauge", "Index shards, in total and loaded into memory",
+                 [({"state": "total"}, len(store.shard_keys)), ({"state": "loaded"}, len(store._shards))]),
+                ("tft_index_file_bytes", "gauge", "Size of the index file on disk",
+                 [({}, os.path.getsize(index_file) if os.path.exists(index_file) else 0)])
+            ]
+        if self.chatbot:
+            families.append(("tft_sessions", "gauge", "Conversation sessions held",
+                             [({}, len(self.chatbot.sessions))]))
+        
+        breakers = {name: breaker.get_stats() for name, breaker in self.breakers.items()}
+        families += [
+            ("tft_circuit_open", "gauge", "Whether calls to an upstream are stopped: 0 closed, 0.5 half-open "
+             "(one trial call allowed), 1 open", [({"upstream": name}, CIRCUIT_STATE_VALUES[stats["state"]])
+                                                  for name, stats in breakers.items()]),
+            ("tft_circuit_opened_total", "counter", "Times an upstream's circuit breaker opened",
+             [({"upstream": name}, stats["opened"]) for name, stats in breakers.items()]),
+            ("tft_circuit_rejected_total", "counter", "Calls not made because the upstream's circuit breaker was open",
+             [({"upstream": name}, stats["rejected"]) for name, stats in breakers.items()])
+        ]
+        return families
 
 if __name__ == "__main__":
     # Test the chatbot
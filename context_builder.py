@@ -0,0 +1,89 @@
+import hashlib
+import json
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DocumentKey = Tuple[str, str, str, str]
+
+# Placeholder in a context header for the number of documents included
+COUNT = "{count}"
+
+
+def document_key(doc: Dict) -> DocumentKey:
+    """(set, patch, type, id) of a document; the content stands in for a missing id"""
+    metadata = doc.get('metadata', {})
+    return (str(metadata.get('set', '')), str(metadata.get('patch', '')), str(metadata.get('type', '')),
+            str(metadata.get('id') or doc.get('content', '')))
+
+
+def context_fingerprint(keys: Sequence[DocumentKey]) -> str:
+    """Identity of a context: the documents it holds, in order, regardless of how they were scored"""
+    return hashlib.sha256(json.dumps(list(keys)).encode('utf-8')).hexdigest()
+
+
+class ContextBuilder:
+    """Assembles retrieved documents into prompt context under a token budget.
+
+    Documents are taken in the order given (most relevant first), duplicates (by
+    set, patch, type and id) and results below `min_score` are skipped, and
+    documents are added until the next one would exceed `max_tokens` as counted by
+    the tiktoken encoder. A `{count}` in the header becomes the number of documents
+    that made it into the context.
+    """
+
+    def __init__(self, encoding, max_tokens: int = 1500, min_score: float = 0.0):
+        self.encoding = encoding
+        self.max_tokens = max_tokens
+        self.min_score = min_score
+
+    def count_tokens(self, text: str) -> int:
+        """Number of tokens in a text"""
+        return len(self.encoding.encode(text))
+
+    def build(self, results: Sequence[Tuple[Dict, Optional[float]]], header: str = ""
+              ) -> Tuple[str, Dict[str, int], List[DocumentKey]]:
+        """Build the context string, per-request stats and the keys of the included documents
+        from (document, score) pairs.
+
+        A score of None marks exact-lookup results, which are never dropped by score.
+        """
+        parts: List[str] = []
+        keys: List[DocumentKey] = []
+        seen = set()
+        stats = {"candidates": len(results), "documents": 0, "duplicates": 0,
+                 "below_threshold": 0, "over_budget": 0, "tokens": 0}
+
+        # The header is budgeted with the count it could reach at most
+        used_tokens = self.count_tokens(header.replace(COUNT, str(len(results)))) if header else 0
+        for doc, score in results:
+            key = document_key(doc)
+            if key in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(key)
+            if score is not None and score < self.min_score:
+                stats["below_threshold"] += 1
+                continue
+
+            number = len(parts) + 1
+            label = f"Document {number}:" if score is None else f"Document {number} (Relevance: {score:.3f}):"
+            part = f"{label}\n{doc.get('content', '')}"
+            part_tokens = self.count_tokens(part) + 2  # Separator between documents
+            if used_tokens + part_tokens > self.max_tokens:
+                stats["over_budget"] += 1
+                continue
+            parts.append(part)
+            keys.append(key)
+            used_tokens += part_tokens
+
+        stats["documents"] = len(parts)
+        stats["tokens"] = used_tokens
+        if stats["over_budget"]:
+            logger.info(f"Context budget of {self.max_tokens} tokens left out {stats['over_budget']} documents")
+
+        header = header.replace(COUNT, str(len(parts)))
+        body = "\n\n".join(parts)
+        context = f"{header}\n\n{body}" if header and body else (header or body)
+        return context, stats, keys
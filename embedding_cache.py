@@ -0,0 +1,297 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+
+
+class EmbeddingCache:
+    """Content-addressed on-disk cache of document embeddings.
+
+    Vectors are appended to a raw float32 matrix (`vectors.f32`) that is read through
+    a numpy memmap; `keys.json` maps each key (a hash of model name and content) to
+    its row and last-use time. Stale rows are reclaimed by `compact`.
+    """
+
+    def __init__(self, directory: str = "embedding_cache", max_entries: Optional[int] = None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.keys_path = os.path.join(directory, "keys.json")
+        self.dimension: Optional[int] = None
+        self.entries: Dict[str, List[float]] = {}  # key -> [row, last_used]
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def key(model: str, content: str) -> str:
+        """Cache key for a document's content under an embedding model"""
+        return hashlib.sha256(f"{model}\0{content}".encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _load(self):
+        if not os.path.exists(self.keys_path):
+            return
+        try:
+            with open(self.keys_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != CACHE_FORMAT_VERSION:
+                logger.warning("Embedding cache format changed, starting empty")
+                return
+            self.dimension = data.get("dimension")
+            self.entries = data.get("entries", {})
+            self._open_vectors()
+            logger.info(f"Loaded embedding cache with {len(self.entries)} entries from {self.directory}")
+        except Exception as e:
+            logger.error(f"Could not read embedding cache, starting empty: {e}")
+            self.dimension = None
+            self.entries = {}
+            self._vectors = None
+
+    def _row_count(self) -> int:
+        if not self.dimension or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (4 * self.dimension)
+
+    def _open_vectors(self):
+        rows = self._row_count()
+        if rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dimension))
+        else:
+            self._vectors = None
+
+    def _save_keys(self):
+        tmp_path = f"{self.keys_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": CACHE_FORMAT_VERSION, "dimension": self.dimension, "entries": self.entries}, f)
+        os.replace(tmp_path, self.keys_path)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for the keys that are present"""
+        found = {}
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None or self._vectors is None or entry[0] >= len(self._vectors):
+                    self.misses += 1
+                    continue
+                found[key] = np.array(self._vectors[entry[0]])
+                entry[1] = now
+                self.hits += 1
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """Append new vectors to the cache"""
+        if not items:
+            return
+        with self._lock:
+            matrix = np.asarray(list(items.values()), dtype=np.float32)
+            if self.dimension is not None and matrix.shape[1] != self.dimension:
+                logger.warning(f"Embedding dimension changed ({self.dimension} -> {matrix.shape[1]}), clearing cache")
+                self._clear()
+            self.dimension = matrix.shape[1]
+
+            # Rows past the end of the index (e.g. from an interrupted write) are simply never referenced
+            start_row = self._row_count()
+            self._vectors = None  # Release the map before growing the file
+            with open(self.vectors_path, 'ab') as f:
+                f.write(matrix.tobytes())
+            now = time.time()
+            for offset, key in enumerate(items):
+                self.entries[key] = [start_row + offset, now]
+
+            if self.max_entries and len(self.entries) > self.max_entries:
+                self._compact(self._most_recent(self.max_entries))
+            else:
+                self._save_keys()
+                self._open_vectors()
+
+    def _most_recent(self, n: int) -> List[str]:
+        return sorted(self.entries, key=lambda key: self.entries[key][1], reverse=True)[:n]
+
+    def _clear(self):
+        self.entries = {}
+        self._vectors = None
+        if os.path.exists(self.vectors_path):
+            os.remove(self.vectors_path)
+
+    def _compact(self, keep_keys: Iterable[str]):
+        keep = [key for key in keep_keys if key in self.entries]
+        rows = [self.entries[key][0] for key in keep]
+        current = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                            shape=(self._row_count(), self.dimension)) if rows else None
+        tmp_path = f"{self.vectors_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            if rows:
+                f.write(np.ascontiguousarray(current[rows]).tobytes())
+        del current
+        self._vectors = None
+        os.replace(tmp_path, self.vectors_path)
+        self.entries = {key: [row, self.entries[key][1]] for row, key in enumerate(keep)}
+        self._save_keys()
+        self._open_vectors()
+
+    def compact(self, live_keys: Iterable[str]) -> int:
+        """Drop every entry not in `live_keys` and rewrite the matrix; returns the number evicted"""
+        live = set(live_keys)
+        with self._lock:
+            stale = len(self.entries) - len(live & self.entries.keys())
+            total_rows = self._row_count()
+            if stale == 0 and total_rows == len(self.entries):
+                return 0
+            self._compact([key for key in self.entries if key in live])
+        logger.info(f"Compacted embedding cache: evicted {stale} stale entries, {len(self.entries)} remain")
+        return stale
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get cache statistics"""
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query embeddings with optional TTL and persistence.
+
+    Queries are normalized (case, whitespace, trailing punctuation) so trivially
+    different phrasings of a repeated question share one entry.
+    """
+
+    _WHITESPACE_RE = re.compile(r"\s+")
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[float] = None,
+                 persist_path: Optional[str] = None, model: str = ""):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if persist_path:
+            self._load()
+
+    @classmethod
+    def normalize(cls, query: str) -> str:
+        """Normalize a query for cache lookup"""
+        return cls._WHITESPACE_RE.sub(" ", query.strip().lower()).rstrip("?!. ")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for a query, or None"""
+        key = self.normalize(query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[1], now):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, query: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for a query without touching counters or LRU order"""
+        entry = self._entries.get(self.normalize(query))
+        if entry is None or self._expired(entry[1], time.time()):
+            return None
+        return entry[0]
+
+    def put(self, query: str, vector: np.ndarray):
+        """Store a query embedding, evicting the least recently used entries beyond max_size"""
+        key = self.normalize(query)
+        with self._lock:
+            self._entries[key] = (np.asarray(vector, dtype=np.float32), time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached query embedding"""
+        with self._lock:
+            self._entries.clear()
+
+    def save(self):
+        """Persist the cache (LRU order preserved) to persist_path"""
+        if not self.persist_path:
+            return
+        with self._lock:
+            now = time.time()
+            live = [(key, vector, created) for key, (vector, created) in self._entries.items()
+                    if not self._expired(created, now)]
+        if not live:
+            return
+        # Every worker saves on shutdown, so each writes its own temp file before the atomic replace
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(self.persist_path)}.",
+                                        suffix=".tmp.npz", dir=os.path.dirname(os.path.abspath(self.persist_path)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    model=np.array(self.model),
+                    keys=np.array([key for key, _, _ in live]),
+                    vectors=np.stack([vector for _, vector, _ in live]),
+                    created=np.array([created for _, _, created in live], dtype=np.float64)
+                )
+            os.replace(tmp_path, self.persist_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        logger.info(f"Saved {len(live)} query embeddings to {self.persist_path}")
+
+    def _load(self):
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with np.load(self.persist_path, allow_pickle=False) as data:
+                if str(data["model"]) != self.model:
+                    logger.warning("Query embedding cache was written for another model, ignoring it")
+                    return
+                now = time.time()
+                for key, vector, created in zip(data["keys"], data["vectors"], data["created"]):
+                    if not self._expired(float(created), now):
+                        self._entries[str(key)] = (np.array(vector, dtype=np.float32), float(created))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            logger.info(f"Loaded {len(self._entries)} query embeddings from {self.persist_path}")
+        except Exception as e:
+            logger.error(f"Could not read query embedding cache: {e}")
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
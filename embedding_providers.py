@@ -0,0 +1,98 @@
+import logging
+from typing import List, Optional
+
+from openai import OpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+logger = logging.getLogger(__name__)
+
+OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
+OPENAI_EMBEDDING_DIMENSION = 1536  # OpenAI ada-002 embedding dimension
+OPENAI_MAX_INPUT_TOKENS = 8191  # Per-input token limit of the embeddings endpoint
+
+DEFAULT_LOCAL_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class EmbeddingProvider:
+    """Turns batches of texts into embedding vectors for the vector store.
+
+    The store takes care of caching, batching and running batches on a thread
+    pool; these attributes tell it how a provider wants that done.
+    """
+
+    model: str = ""
+    dimension: Optional[int] = None  # None until known, e.g. from the first embedding
+    max_input_tokens: Optional[int] = None  # Texts are truncated to this many cl100k tokens first
+    max_batch_tokens: int = 8000
+    max_batch_size: int = 256
+    max_concurrency: int = 4  # Batches embedded at once
+    max_retries: int = 5
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch of texts, in order"""
+        raise NotImplementedError
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Whether a failed batch is worth retrying"""
+        return False
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Embeddings from the OpenAI API, one request per batch"""
+
+    max_input_tokens = OPENAI_MAX_INPUT_TOKENS
+
+    def __init__(self, client=None, api_key: Optional[str] = None, model: str = OPENAI_EMBEDDING_MODEL,
+                 dimension: Optional[int] = None):
+        # `client` lets callers inject any object exposing `embeddings.create` (e.g. mock_openai.FakeOpenAIClient)
+        self.client = client or OpenAI(api_key=api_key)
+        self.model = model
+        self.dimension = dimension or (OPENAI_EMBEDDING_DIMENSION if model == OPENAI_EMBEDDING_MODEL else None)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(model=self.model, input=texts)
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        if self.dimension is None and embeddings:
+            self.dimension = len(embeddings[0])
+        return embeddings
+
+    def is_retryable(self, error: Exception) -> bool:
+        """Rate limits and transient failures"""
+        if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)):
+            return True
+        return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """A sentence-transformers model run on the CPU, so no embedding needs a network call.
+
+    The model is downloaded from the Hugging Face hub on first use and cached; with
+    it cached (or `model` pointing at a local directory) index builds run offline.
+    `backend="onnx"` runs the ONNX export of the model instead of PyTorch.
+    Requires `pip install sentence-transformers`.
+    """
+
+    max_batch_tokens = 1_000_000  # No request size limit; batches are bounded by max_batch_size
+    max_retries = 0
+
+    def __init__(self, model: str = DEFAULT_LOCAL_MODEL, batch_size: int = 64, max_concurrency: int = 2,
+                 backend: str = "torch"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("The local embedding provider needs sentence-transformers: "
+                              "pip install sentence-transformers") from e
+
+        self.model = model
+        self.max_batch_size = batch_size
+        # The model already spreads each batch over the CPU cores; a second batch in
+        # flight overlaps tokenization with the previous batch's forward pass
+        self.max_concurrency = max_concurrency
+        self._model = SentenceTransformer(model, device="cpu", backend=backend)
+        self.dimension = self._model.get_sentence_embedding_dimension()
+        logger.info(f"Loaded local embedding model {model} ({self.dimension} dimensions, {backend})")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self._model.encode(texts, batch_size=self.max_batch_size, convert_to_numpy=True,
+                                  normalize_embeddings=True, show_progress_bar=False).tolist()
@@ -0,0 +1,46 @@
+"""Gunicorn settings for serving backend_server.py from several worker processes.
+
+    gunicorn -c gunicorn.conf.py
+
+The chatbot and its whole index are loaded once in the master process, before
+the workers are forked, so every worker shares the same index pages instead of
+loading its own copy; an extra worker costs only its own request handling.
+
+Metrics are per worker: a scrape of /metrics reaches one worker and reports
+its own counts under a `worker="<pid>"` label. Sum over `worker` for totals.
+
+`kill -HUP <master pid>` reloads the index from disk in the master, then replaces
+every worker with one forked from it; old workers finish their requests first.
+"""
+import gc
+import os
+
+wsgi_app = "backend_server:create_app()"
+preload_app = True
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+# Threads keep streaming responses from tying up a whole worker
+worker_class = "gthread"
+threads = int(os.getenv("TFT_WORKER_THREADS", "8"))
+timeout = 120
+
+
+def on_reload(server):
+    import backend_server
+    # Let the previous index be collected once the old workers are gone
+    gc.unfreeze()
+    backend_server.reload_index()
+
+
+def pre_fork(server, worker):
+    # Keep the garbage collector from touching (and so copying) the preloaded objects in workers
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import backend_server
+    from telemetry import REGISTRY
+    backend_server.chatbot_manager.after_fork()
+    # Each worker serves /metrics from its own counters; label them so Prometheus can sum them
+    REGISTRY.label_worker()
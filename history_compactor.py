@@ -0,0 +1,77 @@
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators the chat format adds to every message
+MAX_SUMMARY_ENTITIES = 20
+
+
+class HistoryCompactor:
+    """Fits conversation history into a token budget before it is sent with a question.
+
+    The most recent exchanges are kept verbatim (at most `max_messages` messages)
+    while they fit in `max_tokens`, as counted by the tiktoken encoder. Older
+    exchanges are replaced by one message naming the entities they mentioned, so
+    follow-ups like "what about her items?" still resolve without replaying the
+    turns. History only ever holds questions and answers, never their retrieved
+    context.
+    """
+
+    def __init__(self, encoding, max_tokens: int = 600, max_messages: int = 6,
+                 entity_names: Optional[Callable[[str], List[str]]] = None):
+        self.encoding = encoding
+        self.max_tokens = max_tokens
+        self.max_messages = max_messages
+        self.entity_names = entity_names
+
+    def count_tokens(self, message: Dict[str, str]) -> int:
+        """Tokens a chat message adds to the prompt"""
+        return len(self.encoding.encode(message["content"])) + MESSAGE_OVERHEAD_TOKENS
+
+    def compact(self, history: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+        """Messages to send for a session's history (oldest first), and stats on what was compacted"""
+        sizes = [self.count_tokens(message) for message in history]
+        stats = {"messages": len(history), "kept": 0, "compacted": 0, "entities": 0,
+                 "raw_tokens": sum(sizes), "tokens": 0}
+
+        # Keep whole exchanges (user + assistant) from the newest back while they fit
+        start = len(history)
+        used = 0
+        while start > 0:
+            exchange_start = start - 2 if start >= 2 and history[start - 2]["role"] == "user" else start - 1
+            exchange_tokens = sum(sizes[exchange_start:start])
+            if len(history) - exchange_start > self.max_messages or used + exchange_tokens > self.max_tokens:
+                break
+            start = exchange_start
+            used += exchange_tokens
+
+        messages = history[start:]
+        summary, stats["entities"] = self._summarize(history[:start], self.max_tokens - used)
+        if summary is not None:
+            messages = [summary] + messages
+            used += self.count_tokens(summary)
+
+        stats["kept"] = len(history) - start
+        stats["compacted"] = start
+        stats["tokens"] = used
+        return messages, stats
+
+    def _summarize(self, older: List[Dict[str, str]], budget: int) -> Tuple[Optional[Dict[str, str]], int]:
+        """One message naming the entities the compacted turns mentioned, most recent first, within the budget"""
+        if not older or self.entity_names is None:
+            return None, 0
+        entities: List[str] = []
+        for message in reversed(older):
+            for name in self.entity_names(message["content"]):
+                if name not in entities:
+                    entities.append(name)
+        entities = entities[:MAX_SUMMARY_ENTITIES]
+
+        while entities:
+            summary = {"role": "system",
+                       "content": f"Earlier in this conversation the user discussed: {', '.join(entities)}"}
+            if self.count_tokens(summary) <= budget:
+                return summary, len(entities)
+            entities.pop()
+        return None, 0
@@ -0,0 +1,127 @@
+import logging
+import math
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# FAISS index backends for the vector store. Vectors are L2-normalized, so every
+# backend searches by inner product (= cosine similarity).
+#
+#   flat   exact search over float32 vectors (4 bytes per dimension)
+#   fp16   exact search over float16 vectors (2 bytes per dimension)
+#   sq8    8-bit scalar quantization, trained per dimension (1 byte per dimension)
+#   ivfpq  inverted file + product quantization: searches only `nprobe` of the
+#          clusters, each vector stored as one byte per 16 dimensions. Meant for
+#          corpora of tens of thousands of documents and more.
+INDEX_TYPES = ("flat", "fp16", "sq8", "ivfpq")
+DEFAULT_NPROBE = 16
+
+PQ_DIMENSIONS_PER_CODE = 16
+PQ_BITS = 8
+MIN_POINTS_PER_CENTROID = 39  # Below this FAISS k-means warns that clusters are poorly trained
+MIN_SQ8_TRAINING = 64  # Smaller indexes (e.g. little shards) use fp16, which needs no training
+
+
+def _ivf_lists(count: int) -> int:
+    """Number of IVF clusters: ~4 * sqrt(n), with enough training points per cluster"""
+    return max(1, min(int(4 * math.sqrt(count)), count // MIN_POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Largest sub-quantizer count dividing the dimension with at least 16 dimensions each"""
+    for m in range(max(1, dimension // PQ_DIMENSIONS_PER_CODE), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def create_index(vectors: np.ndarray, ids: np.ndarray, index_type: str = "flat",
+                 nprobe: int = DEFAULT_NPROBE) -> faiss.Index:
+    """Build an inner-product index of the given type keyed by `ids`, trained on and filled with `vectors`.
+
+    IVF indexes keep the ids in their inverted lists themselves. The others are
+    wrapped in an IndexIDMap2, whose id map is only valid for indexes that renumber
+    their vectors on removal the way flat storage does, so an IVF index must not be
+    wrapped: removing from it would leave the id map pointing at the wrong vectors.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {', '.join(INDEX_TYPES)}")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dimension = vectors.shape
+
+    if index_type == "ivfpq" and count < 2 ** PQ_BITS:
+        # The PQ codebooks need at least one training vector per centroid
+        logger.info(f"Too few vectors ({count}) to train an IVF-PQ index; using sq8 instead")
+        index_type = "sq8"
+    if index_type == "sq8" and count < MIN_SQ8_TRAINING:
+        logger.info(f"Too few vectors ({count}) to train an sq8 index; using fp16 instead")
+        index_type = "fp16"
+
+    if index_type == "flat":
+        inner = faiss.IndexFlatIP(dimension)
+    elif index_type == "fp16":
+        inner = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "sq8":
+        inner = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    else:
+        quantizer = faiss.IndexFlatIP(dimension)
+        inner = faiss.IndexIVFPQ(quantizer, dimension, _ivf_lists(count), _pq_subquantizers(dimension), PQ_BITS,
+                                 faiss.METRIC_INNER_PRODUCT)
+        if count < MIN_POINTS_PER_CENTROID * 2 ** PQ_BITS:
+            # Warn once here rather than once per sub-quantizer from FAISS
+            logger.warning(f"IVF-PQ codebooks trained on only {count} vectors; expect lower recall than sq8")
+            inner.pq.cp.min_points_per_centroid = 1
+
+    if not inner.is_trained:
+        inner.train(vectors)
+    index = inner if isinstance(inner, faiss.IndexIVF) else faiss.IndexIDMap2(inner)
+    index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype=np.int64))
+    set_nprobe(index, nprobe)
+    return index
+
+
+def unwrap_ivf(index: faiss.Index) -> faiss.Index:
+    """An IVF index saved inside an IndexIDMap2 by older versions, with the ids moved into its inverted lists"""
+    if not isinstance(index, faiss.IndexIDMap):
+        return index
+    if not isinstance(faiss.downcast_index(index.index), faiss.IndexIVF):
+        return index
+    # A copy owned by Python, so it doesn't depend on the wrapper's lifetime
+    ivf = faiss.clone_index(index.index)
+    id_map = faiss.vector_to_array(index.id_map)
+    invlists = ivf.invlists
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if size == 0:
+            continue
+        positions = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+        codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size).copy()
+        ids = np.ascontiguousarray(id_map[positions], dtype=np.int64)
+        invlists.update_entries(list_no, 0, size, faiss.swig_ptr(ids), faiss.swig_ptr(codes))
+    return ivf
+
+
+def index_ids(index: faiss.Index) -> np.ndarray:
+    """Ids of every vector in an index built by `create_index`"""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.vector_to_array(index.id_map)
+    ivf = faiss.extract_index_ivf(index)
+    invlists = ivf.invlists
+    return np.concatenate([faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+                           for list_no in range(ivf.nlist)] + [np.empty(0, dtype=np.int64)])
+
+
+def set_nprobe(index: faiss.Index, nprobe: int):
+    """Set how many clusters an IVF index searches; other indexes are left unchanged"""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return
+    ivf.nprobe = min(nprobe, ivf.nlist)
+
+
+def index_nbytes(index: faiss.Index) -> int:
+    """Approximate in-memory size of an index: its serialized size"""
+    return int(faiss.serialize_index(index).nbytes)
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import struct
+from typing import Any, Dict, Tuple, Union
+
+import numpy as np
+
+# Single-file, pickle-free on-disk format for the vector store.
+#
+#   magic (8 bytes) | header length (uint64 LE) | header JSON | padding | sections...
+#
+# The header records the format version, free-form metadata (model, dimension, ...)
+# and for every section its offset, length, sha256 and, for arrays, dtype and shape.
+# Sections start on 64-byte boundaries so array sections can be memory-mapped in place.
+
+MAGIC = b"TFTIDX\x00\x01"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+INDEX_FILE_SUFFIX = ".tftidx"
+
+
+class IndexFormatError(ValueError):
+    """Raised when an index file is malformed, from another format version or fails its checksum"""
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_index_file(path: str, metadata: Dict[str, Any], sections: Dict[str, Union[np.ndarray, bytes]]):
+    """Write sections (numpy arrays or raw bytes) and metadata to `path` atomically"""
+    payloads = {}
+    table = {}
+    for name, value in sections.items():
+        if isinstance(value, np.ndarray):
+            array = np.ascontiguousarray(value)
+            data = array.tobytes()
+            table[name] = {"dtype": array.dtype.str, "shape": list(array.shape)}
+        else:
+            data = bytes(value)
+            table[name] = {}
+        table[name].update({"length": len(data), "sha256": hashlib.sha256(data).hexdigest()})
+        payloads[name] = data
+
+    # Offsets depend on the header size, so size the header with placeholder offsets first
+    header = {"format_version": FORMAT_VERSION, "metadata": metadata, "sections": table}
+    for entry in table.values():
+        entry["offset"] = 0
+    header_size = len(json.dumps(header).encode("utf-8")) + 32 * len(table)
+    offset = _align(len(MAGIC) + 8 + header_size)
+    for name in table:
+        table[name]["offset"] = offset
+        offset = _align(offset + table[name]["length"])
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (header_size - len(header_bytes))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name, data in payloads.items():
+            f.seek(table[name]["offset"])
+            f.write(data)
+        f.truncate(offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_index_file(path: str, verify: bool = True) -> Tuple[Dict[str, Any], Dict[str, Union[np.ndarray, bytes]]]:
+    """Read an index file; array sections are returned as read-only memory maps"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise IndexFormatError(f"{path} is not a TFT index file")
+        (header_length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_length).decode("utf-8"))
+        if header.get("format_version") != FORMAT_VERSION:
+            raise IndexFormatError(f"Unsupported index format version {header.get('format_version')}")
+
+        sections = {}
+        for name, entry in header["sections"].items():
+            if "dtype" in entry:
+                shape = tuple(entry["shape"])
+                if entry["length"] == 0:
+                    # memmap cannot map zero bytes, and a view of a zero-size array cannot be cast
+                    value = np.empty(shape, dtype=entry["dtype"])
+                    data = b""
+                else:
+                    value = np.memmap(path, dtype=entry["dtype"], mode="r", offset=entry["offset"], shape=shape)
+                    data = memoryview(value).cast("B")
+            else:
+                f.seek(entry["offset"])
+                value = data = f.read(entry["length"])
+            if verify and hashlib.sha256(data).hexdigest() != entry["sha256"]:
+                raise IndexFormatError(f"Checksum mismatch in section '{name}' of {path}")
+            sections[name] = value
+    return header["metadata"], sections
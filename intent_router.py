@@ -0,0 +1,203 @@
+import re
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from telemetry import INTENT_ROUTES
+
+# Questions whose answer is a fact in the knowledge base ("list all 2-cost champions",
+# "what tier is Aatrox?", "what does Bastion Crest do?") are answered from templates
+# instead of a chat completion. Every pattern is anchored to the whole question, so
+# anything beyond the plain lookup ("best 2-cost champions for Luchador") goes to the LLM.
+
+TIER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5}
+_TIER_VALUE = r"[1-5]|one|two|three|four|five"
+# "2 cost", "2-cost", "cost 2", "tier 2", "two cost", "tier two"
+_TIER = (rf"(?:(?P<cost>{_TIER_VALUE})\s*-?\s*costs?|costs?\s*-?\s*(?P<cost_after>[1-5])"
+         rf"|tier\s*-?\s*(?P<tier>{_TIER_VALUE}))")
+TIER_RE = re.compile(rf"\b{_TIER}\b")
+
+# Trailing filler that doesn't change what is asked
+_SUFFIX = r"(?:\s+(?:in\s+)?(?:tft\s+)?set\s*15)?\s*[?.!]*"
+
+# Type of document listed by the subject of a list question
+LIST_TYPES = {
+    "champions": "champion",
+    "units": "champion",
+    "traits": "trait",
+    "items": "item",
+    "augments": "augment",
+    "portals": "region_portal",
+    "region portals": "region_portal",
+}
+TYPE_NAMES = {"champion": "champions", "trait": "traits", "item": "items", "augment": "augments",
+              "region_portal": "region portals"}
+
+# "List all 2-cost champions", "what are the traits in set 15?", "show me every augment"
+LIST_RE = re.compile(
+    rf"^(?:please\s+)?(?:(?:can\s+you\s+)?(?:list|show|name|give)(?:\s+me)?|what|which|who)\s+"
+    rf"(?:are\s+)?(?:all\s+|every\s+)?(?:of\s+)?(?:the\s+)?"
+    rf"(?:{_TIER}\s+)?(?P<subject>{'|'.join(LIST_TYPES)}|champion|trait|item|augment|portal|region portal)"
+    rf"(?:\s+(?:are\s+)?(?:there|available))?{_SUFFIX}$"
+)
+# "Which champions are 2 cost?", "what units cost 3?"
+CHAMPIONS_OF_TIER_RE = re.compile(
+    rf"^(?:what|which|who)\s+(?:champions|units)\s+(?:are|cost)\s+(?:in\s+)?{_TIER}{_SUFFIX}$"
+)
+# "What tier is Aatrox?", "how much does Aatrox cost?"
+CHAMPION_TIER_RE = re.compile(
+    rf"^(?:(?:what|which)\s+(?:tier|cost)\s+is\s+(?P<name>.+?)(?:\s+in)?"
+    rf"|how\s+much\s+does\s+(?P<name_cost>.+?)\s+cost){_SUFFIX}$"
+)
+# "What does the Bastion Crest augment do?", "tell me about Golden Prelude"; answered only for
+# documents whose description is the whole answer, so never for champions
+DESCRIBE_RE = re.compile(
+    rf"^(?:what\s+(?:does|do)\s+(?:the\s+)?(?P<name_do>.+?)\s+do"
+    rf"|(?:what\s+is|what's|tell\s+me\s+about|describe|explain)\s+(?:the\s+)?(?P<name>.+?)){_SUFFIX}$"
+)
+NAME_TYPE_SUFFIX_RE = re.compile(r"\s+(?P<type>champion|trait|item|augment|region portal|portal)$")
+NAME_TYPES = {"champion": "champion", "trait": "trait", "item": "item", "augment": "augment",
+              "portal": "region_portal", "region portal": "region_portal"}
+NAME_LABELS = {"trait": "trait", "item": "item", "augment": "augment", "region_portal": "region portal"}
+
+_TIER_LINE_RE = re.compile(r"^Tier:\s*(\d+)", re.MULTILINE)
+_DESCRIPTION_RE = re.compile(r"^Description:\s*(.*)", re.MULTILINE | re.DOTALL)
+# Live counters of the game client ("(Wins: <placeholder>)") have no value outside a game
+_PLACEHOLDER_NOTE_RE = re.compile(r"\s*\([^()]*<placeholder>[^()]*\)")
+_BREAK_RE = re.compile(r"\s*<br\s*/?>\s*")
+
+Route = Tuple[str, str]  # (intent, answer)
+
+
+def parse_tier(message_lower: str) -> Optional[int]:
+    """Cost tier a question refers to ("2 cost", "2-cost", "tier 2", "two cost", ...), if any"""
+    match = TIER_RE.search(message_lower)
+    return _tier_value(match) if match else None
+
+
+def _tier_value(match: re.Match) -> Optional[int]:
+    value = match.group("cost") or match.group("cost_after") or match.group("tier")
+    if value is None:
+        return None
+    return int(value) if value.isdigit() else TIER_WORDS[value]
+
+
+def _champion_tier(doc: Dict) -> Optional[int]:
+    match = _TIER_LINE_RE.search(doc.get('content', ''))
+    return int(match.group(1)) if match else None
+
+
+def _description(doc: Dict) -> Optional[str]:
+    """A document's description as plain text, or None if it has none or still holds template markup"""
+    match = _DESCRIPTION_RE.search(doc.get('content', ''))
+    if not match:
+        return None
+    description = _BREAK_RE.sub(" ", _PLACEHOLDER_NOTE_RE.sub("", match.group(1))).strip()
+    if not description or "<" in description or "@" in description:
+        return None
+    return description
+
+
+def _names(docs: List[Dict]) -> List[str]:
+    """Sorted distinct names of documents, leaving out unrendered template names ("@ItemsToGive@ ...")"""
+    names = {doc.get('metadata', {}).get('name') or "" for doc in docs}
+    return sorted(name for name in names if name and "@" not in name and "<" not in name)
+
+
+class IntentRouter:
+    """Answers structured questions straight from the knowledge base, or returns None for the LLM.
+
+    Lookups go through the vector store's structured index (rebuilt whenever the
+    index syncs) and `in_scope`, which keeps documents of the configured sets and
+    patches. A question is only answered when it resolves unambiguously.
+    """
+
+    def __init__(self, vector_store, in_scope: Callable[[List[Dict]], List[Dict]]):
+        self.vector_store = vector_store
+        self.in_scope = in_scope
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = defaultdict(int)
+
+    def route(self, user_message: str) -> Optional[Route]:
+        """(intent, templated answer) for a structured question, or None if it needs the LLM"""
+        message_lower = " ".join(user_message.lower().split())
+        route = (self._list_answer(message_lower) or self._champion_tier_answer(message_lower)
+                 or self._describe_answer(message_lower))
+        intent = route[0] if route else "none"
+        INTENT_ROUTES.inc(intent=intent)
+        with self._lock:
+            self._counts[intent] += 1
+        return route
+
+    def _list_answer(self, message_lower: str) -> Optional[Route]:
+        match = LIST_RE.match(message_lower) or CHAMPIONS_OF_TIER_RE.match(message_lower)
+        if not match:
+            return None
+        tier = _tier_value(match)
+        subject = match.groupdict().get("subject")
+        doc_type = LIST_TYPES.get(subject, NAME_TYPES.get(subject)) if subject else "champion"
+        structured = self.vector_store.structured
+
+        if tier is not None:
+            if doc_type != "champion":
+                return None
+            names = _names(self.in_scope(structured.champions_with_tier(tier)))
+            if not names:
+                return None
+            return "tier_list", f"There are {len(names)} Tier {tier} champions: {', '.join(names)}."
+
+        names = _names(self.in_scope(structured.documents_of_type(doc_type)))
+        if not names:
+            return None
+        return "type_list", f"There are {len(names)} {TYPE_NAMES[doc_type]}: {', '.join(names)}."
+
+    def _champion_tier_answer(self, message_lower: str) -> Optional[Route]:
+        match = CHAMPION_TIER_RE.match(message_lower)
+        if not match:
+            return None
+        docs = self._named(match.group("name") or match.group("name_cost"), "champion")
+        return self._tier_route(docs)
+
+    def _describe_answer(self, message_lower: str) -> Optional[Route]:
+        match = DESCRIBE_RE.match(message_lower)
+        if not match:
+            return None
+        docs = self._named(match.group("name_do") or match.group("name"))
+        if any(doc['metadata'].get('type') == "champion" for doc in docs):
+            # A champion's tier alone doesn't answer "tell me about <champion>"; its traits and ability do
+            return None
+
+        descriptions = {_description(doc) for doc in docs}
+        types = {doc['metadata'].get('type') for doc in docs}
+        if len(descriptions) != 1 or len(types) != 1 or None in descriptions:
+            return None
+        name = docs[0]['metadata']['name']
+        kind = NAME_LABELS.get(types.pop())
+        label = f"{name} ({kind})" if kind else name
+        return "description", f"{label}: {descriptions.pop()}"
+
+    def _tier_route(self, docs: List[Dict]) -> Optional[Route]:
+        tiers = {_champion_tier(doc) for doc in docs}
+        if len(tiers) != 1 or None in tiers:
+            return None
+        return "champion_tier", f"{docs[0]['metadata']['name']} is a Tier {tiers.pop()} champion."
+
+    def _named(self, name: str, doc_type: Optional[str] = None) -> List[Dict]:
+        """In-scope documents whose name is exactly `name`, optionally followed by its type ("luchador trait")"""
+        suffix = NAME_TYPE_SUFFIX_RE.search(name)
+        if suffix:
+            suffix_type = NAME_TYPES[suffix.group("type")]
+            if doc_type is not None and suffix_type != doc_type:
+                return []
+            doc_type = suffix_type
+            name = name[:suffix.start()]
+        return self.in_scope(self.vector_store.structured.find_by_name(name, doc_type))
+
+    def get_stats(self) -> Dict[str, float]:
+        """Questions answered per intent, and the share that skipped the LLM"""
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        routed = total - counts.get("none", 0)
+        return {"routed": routed, "total": total, "bypass_rate": routed / total if total else 0.0,
+                "intents": {intent: count for intent, count in counts.items() if intent != "none"}}
@@ -0,0 +1,333 @@
+"""Compile the knowledge base from the raw Data Dragon files.
+
+Reads tft-champion.json, tft-trait.json, tft-item.json, tft-augments.json and
+tft-region-portals.json one entry at a time, drops tutorial entries and champions
+and traits of other sets, and writes tft15_knowledge_base.json. Every document
+keeps its Data Dragon id as `metadata.id` and carries a `metadata.content_hash`.
+Documents the compiler does not produce (the hand-written `general` entries) are
+carried over from the previous output.
+
+The delta file lists only what changed since the previous output, one JSON object
+per line after a header line: {"op": "upsert", "document": {...}} or
+{"op": "delete", "id": ...}. TFTChatbotManager.sync_knowledge_base applies it to
+the loaded index without reading the whole knowledge base.
+
+    python kb_compiler.py --data-dir . --set 15 --delta tft15_knowledge_base.delta.jsonl
+"""
+import argparse
+import filecmp
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from itertools import chain
+from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_BASE_VERSION = "1.0"
+DELTA_VERSION = 1
+CHUNK_SIZE = 64 * 1024
+
+# Document type -> Data Dragon file, in output order
+SOURCES = (
+    ("champion", "tft-champion.json"),
+    ("trait", "tft-trait.json"),
+    ("item", "tft-item.json"),
+    ("augment", "tft-augments.json"),
+    ("region_portal", "tft-region-portals.json"),
+)
+# Champions and traits belong to one set. Items and augments of older sets that are
+# still in the game keep their old TFT<n>_ ids, so those are not filtered by set.
+SET_SCOPED_TYPES = {"champion", "trait"}
+COMPILED_TYPES = {doc_type for doc_type, _ in SOURCES}
+
+_SET_PREFIX = re.compile(r"TFT(\d+)_")
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = "0123456789.eE+-"
+_DECODER = json.JSONDecoder()
+
+
+class KnowledgeBaseSourceError(ValueError):
+    """A Data Dragon file or previous knowledge base could not be parsed"""
+
+
+class _JSONStream:
+    """Reads a JSON file in chunks and decodes one value at a time"""
+
+    def __init__(self, f: IO[str], path: str):
+        self.file = f
+        self.path = path
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.file.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise KnowledgeBaseSourceError(f"{self.path}: unexpected end of file")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise KnowledgeBaseSourceError(f"{self.path}: expected {char!r}, found {self.buffer[self.pos]!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise KnowledgeBaseSourceError(f"{self.path}: {e.msg}") from None
+            if (isinstance(value, (int, float)) and not self.buffer[end:].strip(_NUMBER_CHARS)
+                    and self._fill()):
+                continue  # A number can continue in the next chunk, even after a partial "1." or "1e"
+            self.pos = end
+            return value
+
+    def separator(self, close: str) -> bool:
+        """Consume a ',' (True: more to come) or the closing bracket (False)"""
+        char = self.peek()
+        self.pos += 1
+        if char == close:
+            return False
+        if char != ",":
+            raise KnowledgeBaseSourceError(f"{self.path}: expected ',' or {close!r}, found {char!r}")
+        return True
+
+
+def stream_section(path: str, section: str,
+                   header: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[Optional[str], Any]]:
+    """Yield the entries of one top-level member of a JSON file without loading the whole file.
+
+    An object member yields (key, value) pairs, an array member (None, value).
+    Every other top-level member is decoded into `header`; members after the
+    section are only there once iteration finishes.
+    """
+    header = header if header is not None else {}
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JSONStream(f, path)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        more = True
+        while more:
+            name = stream.value()
+            stream.expect(":")
+            if name != section or stream.peek() not in "{[":
+                header[name] = stream.value()
+            else:
+                close = "}" if stream.peek() == "{" else "]"
+                stream.pos += 1
+                if stream.peek() == close:
+                    stream.pos += 1
+                else:
+                    has_next = True
+                    while has_next:
+                        key = None
+                        if close == "}":
+                            key = stream.value()
+                            stream.expect(":")
+                        yield key, stream.value()
+                        has_next = stream.separator(close)
+            more = stream.separator("}")
+
+
+def content_hash(doc: Dict) -> str:
+    """Hash of a document's content and metadata (other than the hash itself)"""
+    metadata = {k: v for k, v in doc.get('metadata', {}).items() if k != 'content_hash'}
+    payload = json.dumps({"content": doc.get('content', ''), "metadata": metadata}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _skip_reason(key: str, entry_id: str, entry: Dict, doc_type: str, set_number: int) -> Optional[str]:
+    if "tutorial" in key.lower() or "tutorial" in entry_id.lower():
+        return "tutorial"
+    if not entry.get('name'):
+        return "unnamed"
+    if doc_type in SET_SCOPED_TYPES:
+        match = _SET_PREFIX.match(entry_id)
+        if not match or int(match.group(1)) != set_number:
+            return "other set"
+    return None
+
+
+def build_document(doc_type: str, entry_id: str, entry: Dict) -> Dict:
+    """Knowledge base document for one Data Dragon entry"""
+    lines = [f"Name: {entry['name']}"]
+    if doc_type == "champion" and entry.get('tier') is not None:
+        lines.append(f"Tier: {entry['tier']}")
+    description = entry.get('description') or entry.get('shortDescription')
+    if description:
+        lines.append(f"Description: {description}")
+    doc = {"content": "\n".join(lines), "metadata": {"type": doc_type, "id": entry_id, "name": entry['name']}}
+    doc['metadata']['content_hash'] = content_hash(doc)
+    return doc
+
+
+def iter_source_documents(data_dir: str, set_number: int, skipped: Counter,
+                          versions: Dict[str, str]) -> Iterator[Dict]:
+    """Documents from every Data Dragon file, streamed in SOURCES order"""
+    for doc_type, filename in SOURCES:
+        path = os.path.join(data_dir, filename)
+        if not os.path.exists(path):
+            logger.warning(f"{path} not found; no {doc_type} documents compiled")
+            continue
+        header: Dict[str, Any] = {}
+        for key, entry in stream_section(path, "data", header):
+            entry_id = entry.get('id') or key
+            reason = _skip_reason(key, entry_id, entry, doc_type, set_number)
+            if reason:
+                skipped[reason] += 1
+                continue
+            yield build_document(doc_type, entry_id, entry)
+        if header.get('version'):
+            versions[filename] = header['version']
+
+
+def _previous_documents(path: str) -> Tuple[Dict[str, str], List[Dict]]:
+    """Content hashes by id of a previous output, and its documents the compiler does not produce"""
+    hashes: Dict[str, str] = {}
+    carried: List[Dict] = []
+    if not os.path.exists(path):
+        return hashes, carried
+    for _, doc in stream_section(path, "documents"):
+        metadata = doc.get('metadata', {})
+        if metadata.get('type') not in COMPILED_TYPES:
+            carried.append(doc)
+        elif metadata.get('id'):
+            hashes[metadata['id']] = metadata.get('content_hash') or content_hash(doc)
+    return hashes, carried
+
+
+def compile_knowledge_base(data_dir: str, output: str, set_number: int = 15,
+                           delta_path: Optional[str] = None) -> Dict[str, Any]:
+    """Compile the Data Dragon files in `data_dir` into `output`, writing the changes to `delta_path`.
+
+    Both files are written to a temporary path and replaced atomically; `output`
+    is left untouched when nothing in it changed.
+    """
+    previous, carried = _previous_documents(output)
+    set_name = f"TFT Set {set_number}"
+    skipped: Counter = Counter()
+    versions: Dict[str, str] = {}
+    seen = set()
+    stats = Counter()
+
+    tmp_output = f"{output}.tmp"
+    tmp_delta = f"{delta_path}.tmp" if delta_path else None
+    with open(tmp_output, 'w', encoding='utf-8') as out, \
+            (open(tmp_delta, 'w', encoding='utf-8') if tmp_delta else open(os.devnull, 'w')) as delta:
+        # Same layout as json.dump(..., indent=2), written one document at a time
+        out.write(f'{{\n  "version": {json.dumps(KNOWLEDGE_BASE_VERSION)},\n  "set": {json.dumps(set_name)},\n'
+                  f'  "documents": [')
+        delta.write(json.dumps({"delta_version": DELTA_VERSION, "set": set_name}) + "\n")
+
+        documents = iter_source_documents(data_dir, set_number, skipped, versions)
+        for doc in chain(documents, carried):
+            metadata = doc['metadata']
+            key = metadata.get('id') or content_hash(doc)
+            if key in seen:
+                logger.warning(f"Duplicate id {key}; keeping the first entry")
+                skipped["duplicate"] += 1
+                continue
+            out.write(("\n    " if not seen else ",\n    ") + json.dumps(doc, indent=2).replace("\n", "\n    "))
+            seen.add(key)
+
+            if metadata.get('type') not in COMPILED_TYPES:
+                continue
+            old_hash = previous.get(key)
+            if old_hash == metadata['content_hash']:
+                stats["unchanged"] += 1
+                continue
+            stats["changed" if old_hash else "added"] += 1
+            delta.write(json.dumps({"op": "upsert", "document": doc}) + "\n")
+
+        for key in previous:
+            if key not in seen:
+                stats["removed"] += 1
+                delta.write(json.dumps({"op": "delete", "id": key}) + "\n")
+
+        if len(set(versions.values())) > 1:
+            logger.warning(f"Data Dragon files are from different versions: {versions}")
+        version = next(iter(versions.values()), None)
+        out.write(f'\n  ],\n  "data_dragon_version": {json.dumps(version)},\n  "total_documents": {len(seen)}\n}}\n')
+
+    if os.path.exists(output) and filecmp.cmp(tmp_output, output, shallow=False):
+        os.remove(tmp_output)
+    else:
+        os.replace(tmp_output, output)
+    if tmp_delta:
+        os.replace(tmp_delta, delta_path)
+
+    summary = {"documents": len(seen), "added": stats["added"], "changed": stats["changed"],
+               "removed": stats["removed"], "unchanged": stats["unchanged"], "skipped": dict(skipped),
+               "data_dragon_version": version}
+    logger.info(f"Compiled {output}: {summary}")
+    return summary
+
+
+def read_delta(path: str) -> Tuple[List[Dict], List[Dict]]:
+    """Upserted documents and removed-document stubs of a delta file, tagged with its set and patch"""
+    upserts, removed = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("delta_version") != DELTA_VERSION:
+            raise KnowledgeBaseSourceError(f"{path} is not a knowledge base delta (version {DELTA_VERSION})")
+        for number, line in enumerate(f, 2):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("op") == "upsert":
+                doc = record["document"]
+            elif record.get("op") == "delete":
+                doc = {"metadata": {"id": record["id"]}}
+            else:
+                raise KnowledgeBaseSourceError(f"{path}:{number}: unknown op {record.get('op')!r}")
+            metadata = doc.setdefault('metadata', {})
+            for field in ("set", "patch"):
+                if header.get(field) and not metadata.get(field):
+                    metadata[field] = header[field]
+            (upserts if record["op"] == "upsert" else removed).append(doc)
+    return upserts, removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=".", help="Directory with the Data Dragon tft-*.json files")
+    parser.add_argument("--set", type=int, default=15, dest="set_number", help="Set number to keep")
+    parser.add_argument("-o", "--output", default="tft15_knowledge_base.json")
+    parser.add_argument("--delta", help="JSONL file for the records that changed since the previous output")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        summary = compile_knowledge_base(args.data_dir, args.output, args.set_number, args.delta)
+    except (OSError, KnowledgeBaseSourceError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
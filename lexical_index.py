@@ -0,0 +1,69 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Container, Dict, List, Optional, Sequence, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# Question words carry no signal about which document is wanted
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "for", "to", "is", "are", "do", "does", "what",
+    "which", "who", "how", "me", "about", "tell", "with", "it", "its", "i", "my", "can", "be", "that",
+    "this", "there", "set", "tft", "15", "name", "description"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """In-memory BM25 inverted index over document contents.
+
+    Positions returned by `search` refer to the document list the index was built from.
+    """
+
+    def __init__(self, documents: List[Dict], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_lengths: List[int] = []
+
+        for position, doc in enumerate(documents):
+            tokens = tokenize(doc.get('content', ''))
+            self.doc_lengths.append(len(tokens))
+            for token, count in Counter(tokens).items():
+                self.postings[token].append((position, count))
+
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+        self._length_norms = [k1 * (1 - b + b * length / (self.avg_length or 1.0)) for length in self.doc_lengths]
+        n = len(self.doc_lengths)
+        self.idf = {
+            token: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for token, postings in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 20, positions: Optional[Container[int]] = None) -> List[Tuple[int, float]]:
+        """Top-k (position, score) pairs for a query, only among `positions` when given"""
+        scores: Dict[int, float] = defaultdict(float)
+        for token in set(tokenize(query)):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for position, count in self.postings[token]:
+                if positions is not None and position not in positions:
+                    continue
+                scores[position] += idf * count * (self.k1 + 1) / (count + self._length_norms[position])
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked position lists; scores are normalized so 1.0 means ranked first everywhere"""
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, position in enumerate(ranking):
+            fused[position] += 1.0 / (k + rank + 1)
+    best = len(rankings) / (k + 1)
+    return sorted(((position, score / best) for position, score in fused.items()),
+                  key=lambda item: item[1], reverse=True)
@@ -0,0 +1,337 @@
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import List, Optional, Union
+
+import numpy as np
+
+# Stand-ins for the OpenAI API used by the benchmarks and for running the bot offline.
+# Embeddings are deterministic hashed bag-of-words vectors, so texts sharing words
+# land close together and retrieval quality is meaningful without network access.
+# Both can inject faults: a share of calls failing (error_rate) and a share taking
+# slow_latency seconds longer (slow_rate), to exercise timeouts and circuit breakers.
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def fake_embedding(text: str, dimension: int = 1536) -> List[float]:
+    """Deterministic hashed bag-of-words embedding for a text"""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for token in _TOKEN_RE.findall(text.lower()):
+        digest = hashlib.md5(token.encode("utf-8")).digest()
+        index = int.from_bytes(digest[:4], "little") % dimension
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vector[index] += sign
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+    else:
+        vector /= norm
+    return vector.tolist()
+
+
+class FakeRateLimitError(Exception):
+    """Mimics the 429 error raised by the OpenAI client"""
+    status_code = 429
+
+
+class FakeServerError(Exception):
+    """Mimics the 500 error raised by the OpenAI client"""
+    status_code = 500
+
+
+class FakeTimeoutError(Exception):
+    """Mimics the OpenAI client giving up on a call that took longer than its timeout"""
+
+
+class _FakeEmbeddings:
+    def __init__(self, owner: "FakeOpenAIClient"):
+        self._owner = owner
+
+    def create(self, model: str, input: Union[str, List[str]], **kwargs):
+        owner = self._owner
+        texts = [input] if isinstance(input, str) else list(input)
+        with owner._lock:
+            owner.embedding_calls += 1
+            owner.embedded_inputs += len(texts)
+            call_number = owner.embedding_calls
+        if owner.rate_limit_every and call_number % owner.rate_limit_every == 0:
+            raise FakeRateLimitError("Rate limit reached (simulated)")
+        owner._call(owner.latency + owner.per_input_latency * len(texts))
+        return SimpleNamespace(
+            model=model,
+            data=[
+                SimpleNamespace(index=i, embedding=fake_embedding(text, owner.dimension))
+                for i, text in enumerate(texts)
+            ],
+        )
+
+
+def fake_completion_text(messages: List[dict]) -> str:
+    """Deterministic answer for a chat request: echoes the first line of context it was given"""
+    question = messages[-1]["content"] if messages else ""
+    context = question.split("User question:")[0]
+    lines = [line for line in context.splitlines() if line.strip() and not line.startswith("Context information")]
+    first = lines[1] if len(lines) > 1 else (lines[0] if lines else "")
+    return f"Based on the knowledge base: {first.strip()}"
+
+
+class _FakeChatCompletions:
+    def __init__(self, owner: "FakeOpenAIClient"):
+        self._owner = owner
+
+    def create(self, model: str, messages: List[dict], stream: bool = False, **kwargs):
+        owner = self._owner
+        with owner._lock:
+            owner.completion_calls += 1
+        owner._call(owner.completion_latency)
+        text = fake_completion_text(messages)
+        if stream:
+            return self._stream(model, text)
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in messages)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, finish_reason="stop",
+                                     message=SimpleNamespace(role="assistant", content=text))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(text.split()),
+                                  total_tokens=prompt_tokens + len(text.split())),
+        )
+
+    @staticmethod
+    def _stream(model: str, text: str):
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = SimpleNamespace(role="assistant" if i == 0 else None,
+                                    content=word if i == len(words) - 1 else word + " ")
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)])
+        yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=SimpleNamespace(role=None, content=None),
+                                                                    finish_reason="stop")])
+
+
+class FakeOpenAIClient:
+    """In-process fake of the OpenAI client exposing `embeddings.create` and `chat.completions.create`.
+
+    With `timeout`, a call slower than that sleeps `timeout` seconds and raises
+    FakeTimeoutError, as the real client would.
+    """
+
+    def __init__(self, latency: float = 0.05, per_input_latency: float = 0.0005,
+                 dimension: int = 1536, rate_limit_every: int = 0, completion_latency: float = 0.5,
+                 error_rate: float = 0.0, slow_rate: float = 0.0, slow_latency: float = 0.0,
+                 timeout: Optional[float] = None, seed: Optional[int] = None):
+        self.latency = latency
+        self.per_input_latency = per_input_latency
+        self.dimension = dimension
+        self.rate_limit_every = rate_limit_every
+        self.completion_latency = completion_latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.timeout = timeout
+        self.embedding_calls = 0
+        self.embedded_inputs = 0
+        self.completion_calls = 0
+        self.failed_calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.embeddings = _FakeEmbeddings(self)
+        self.chat = SimpleNamespace(completions=_FakeChatCompletions(self))
+
+    def _call(self, latency: float):
+        """Wait out one call's latency, injecting the configured faults"""
+        with self._lock:
+            fail = self._random.random() < self.error_rate
+            slow = self._random.random() < self.slow_rate
+        if slow:
+            latency += self.slow_latency
+        if self.timeout is not None and latency > self.timeout:
+            time.sleep(self.timeout)
+            with self._lock:
+                self.failed_calls += 1
+            raise FakeTimeoutError(f"Request timed out after {self.timeout}s (simulated)")
+        time.sleep(latency)
+        if fail:
+            with self._lock:
+                self.failed_calls += 1
+            raise FakeServerError("The server had an error while processing your request (simulated)")
+
+
+class _MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so clients can pool connections
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self._inject_faults():
+            return
+        if self.path.endswith("/embeddings"):
+            self._embeddings(request)
+        elif self.path.endswith("/chat/completions"):
+            self._chat_completions(request)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def _inject_faults(self) -> bool:
+        """Delay a share of requests by slow_latency and fail a share with a 500; True if the request failed"""
+        config = self.server.config
+        rng = self.server.random
+        if rng.random() < config["slow_rate"]:
+            time.sleep(config["slow_latency"])
+        if rng.random() < config["error_rate"]:
+            self._send_json(500, {"error": {"message": "The server had an error while processing your request "
+                                                       "(simulated)", "type": "server_error"}})
+            return True
+        return False
+
+    def _embeddings(self, request: dict):
+        config = self.server.config
+        texts = request.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        time.sleep(config["embedding_latency"])
+        data = []
+        for i, text in enumerate(texts):
+            vector = fake_embedding(text, config["dimension"])
+            if request.get("encoding_format") == "base64":
+                vector = base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(len(text.split()) for text in texts)
+        self._send_json(200, {"object": "list", "data": data, "model": request.get("model"),
+                              "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def _chat_completions(self, request: dict):
+        config = self.server.config
+        text = fake_completion_text(request.get("messages", []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = request.get("model")
+        time.sleep(config["ttft"])
+
+        if not request.get("stream"):
+            time.sleep(config["token_delay"] * len(text.split()))
+            prompt_tokens = sum(len(m.get("content", "").split()) for m in request.get("messages", []))
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text.split()),
+                          "total_tokens": prompt_tokens + len(text.split())}
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta: dict, finish_reason=None) -> bytes:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        self._write_chunk(event({"role": "assistant", "content": ""}))
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            self._write_chunk(event({"content": word if i == len(words) - 1 else word + " "}))
+            time.sleep(config["token_delay"])
+        self._write_chunk(event({}, finish_reason="stop"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # The default listen backlog of 5 drops connections under load
+
+    def handle_error(self, request, client_address):
+        # Clients dropping pooled keep-alive connections is routine, not an error
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class MockOpenAIServer:
+    """Local HTTP server speaking the subset of the OpenAI REST API the bot uses.
+
+    Point the bot at it with OPENAI_BASE_URL=<server.base_url> (any OPENAI_API_KEY works).
+    Faults can be changed while it serves with `set_faults`, e.g. to start a brownout.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, embedding_latency: float = 0.05,
+                 ttft: float = 0.3, token_delay: float = 0.02, dimension: int = 1536,
+                 error_rate: float = 0.0, slow_rate: float = 0.0, slow_latency: float = 0.0):
+        self.httpd = _QuietHTTPServer((host, port), _MockOpenAIHandler)
+        self.httpd.config = {
+            "embedding_latency": embedding_latency,
+            "ttft": ttft,
+            "token_delay": token_delay,
+            "dimension": dimension,
+            "error_rate": error_rate,
+            "slow_rate": slow_rate,
+            "slow_latency": slow_latency,
+        }
+        self.httpd.random = random.Random()
+        self._thread = None
+
+    def set_faults(self, error_rate: float = 0.0, slow_rate: float = 0.0, slow_latency: float = 0.0):
+        """Fail `error_rate` of the requests from now on and delay `slow_rate` of them by `slow_latency` seconds"""
+        self.httpd.config.update(error_rate=error_rate, slow_rate=slow_rate, slow_latency=slow_latency)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local mock of the OpenAI API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Seconds before the first completion token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=0.0,
+                        help="Extra seconds a slow request takes (a large value simulates a hang)")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.host, args.port, args.embedding_latency, args.ttft, args.token_delay,
+                              error_rate=args.error_rate, slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    print(f"Mock OpenAI API listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,223 @@
+import asyncio
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, List
+
+from telemetry import MetricFamily
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class Overloaded(RuntimeError):
+    """Raised when a request is shed because every slot and queue place is taken"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server overloaded, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Stops calling an upstream that keeps failing, so requests fail fast instead of waiting on it.
+
+    After `failure_threshold` consecutive failed calls the circuit opens and calls
+    raise CircuitOpenError without reaching the upstream. After `reset_timeout`
+    seconds one trial call is let through (half-open): success closes the circuit,
+    failure opens it again for another `reset_timeout`.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until the next trial call is allowed (0 when the circuit is closed)"""
+        with self._lock:
+            if self._state == CLOSED:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may go to the upstream now; a True in half-open state claims the trial call"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opened += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    @contextmanager
+    def call(self) -> Iterator[None]:
+        """Guard one upstream call: raises CircuitOpenError when open, records the call's outcome otherwise"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+        try:
+            yield
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancelled or abandoned (e.g. a client leaving mid-stream): no verdict on the upstream
+            with self._lock:
+                self._probing = False
+            raise
+        else:
+            self.record_success()
+
+    def get_stats(self) -> Dict[str, object]:
+        return {"state": self.state, "opened": self.opened, "rejected": self.rejected}
+
+
+class AdmissionController:
+    """Bounds the requests served at once and sheds load beyond a bounded queue.
+
+    Up to `max_concurrency` requests run; up to `max_queue` more wait at most
+    `queue_timeout` seconds for a slot. Anything beyond that raises Overloaded at
+    once, so a slow upstream can't pile up requests without limit. Threaded callers
+    use `admit` (or `acquire`/`release`), event-loop callers `aadmit`.
+    """
+
+    def __init__(self, max_concurrency: int = 16, max_queue: int = 32, queue_timeout: float = 2.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = max(1, math.ceil(queue_timeout))
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots = None  # Created on first use, on the serving event loop
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+
+    def _enqueue(self):
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.shed += 1
+                raise Overloaded(self.retry_after)
+            self.waiting += 1
+
+    def _dequeue(self, admitted: bool):
+        with self._lock:
+            self.waiting -= 1
+            if admitted:
+                self.running += 1
+                self.admitted += 1
+            else:
+                self.shed += 1
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed; raises Overloaded when shed"""
+        if self._slots.acquire(blocking=False):
+            with self._lock:
+                self.running += 1
+                self.admitted += 1
+            return
+        self._enqueue()
+        admitted = self._slots.acquire(timeout=self.queue_timeout)
+        self._dequeue(admitted)
+        if not admitted:
+            raise Overloaded(self.retry_after)
+
+    def release(self):
+        with self._lock:
+            self.running -= 1
+        self._slots.release()
+
+    @contextmanager
+    def admit(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aadmit(self) -> AsyncIterator[None]:
+        """Async `admit` for requests on one event loop"""
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        if self._async_slots.locked():
+            self._enqueue()
+            try:
+                await asyncio.wait_for(self._async_slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._dequeue(False)
+                raise Overloaded(self.retry_after)
+            except BaseException:
+                with self._lock:
+                    self.waiting -= 1
+                raise
+            self._dequeue(True)
+        else:
+            await self._async_slots.acquire()
+            with self._lock:
+                self.running += 1
+                self.admitted += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.running -= 1
+            self._async_slots.release()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"running": self.running, "waiting": self.waiting, "admitted": self.admitted, "shed": self.shed}
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Scrape-time metrics of the admission limits"""
+        stats = self.get_stats()
+        return [
+            ("tft_requests_running", "gauge", "Chat requests being answered", [({}, stats["running"])]),
+            ("tft_requests_queued", "gauge", "Chat requests waiting for a slot", [({}, stats["waiting"])]),
+            ("tft_shed_requests_total", "counter", "Chat requests turned away with 503 because every slot and "
+             "queue place was taken, or no slot freed up in time", [({}, stats["shed"])])
+        ]
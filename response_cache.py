@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from embedding_cache import QueryEmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticResponseCache:
+    """Answer cache keyed by question similarity and the context the answer was grounded in.
+
+    Question embeddings live in a small ID-mapped FAISS index of their own. A lookup
+    hits when a stored question is at least `threshold` cosine-similar to the new
+    one *and* the retrieved context fingerprint is identical, so an answer is only
+    reused when it was generated from exactly the same knowledge-base documents.
+
+    Every entry is also reachable by its normalized question text. Answers whose
+    context came from an exact lookup (no query embedding) are cached by text only,
+    so the cache never forces an embedding call the retrieval path avoided.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 512, ttl_seconds: Optional[float] = None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.index = None
+        self.kb_fingerprint: Optional[str] = None
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()  # LRU order
+        self._exact: Dict[Tuple[str, str], int] = {}  # (normalized question, context fingerprint) -> entry id
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.invalidations = 0
+        self.latency_saved = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _check_kb(self, kb_fingerprint: Optional[str]):
+        """Drop everything when the knowledge base the answers came from has changed"""
+        if kb_fingerprint != self.kb_fingerprint:
+            if self._entries:
+                logger.info("Knowledge base changed, invalidating response cache")
+                self._invalidate()
+            self.kb_fingerprint = kb_fingerprint
+
+    def _invalidate(self):
+        self._entries.clear()
+        self._exact.clear()
+        if self.index is not None:
+            self.index.reset()
+        self.invalidations += 1
+
+    def invalidate(self):
+        """Drop every cached answer"""
+        with self._lock:
+            self._invalidate()
+
+    def _remove(self, entry_ids):
+        for entry_id in entry_ids:
+            entry = self._entries.pop(entry_id, None)
+            if entry is not None:
+                self._exact.pop(entry["exact_key"], None)
+        if self.index is not None:
+            self.index.remove_ids(np.array(entry_ids, dtype=np.int64))
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry["created"] > self.ttl_seconds
+
+    def _hit(self, entry_id: int) -> str:
+        entry = self._entries[entry_id]
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        self.latency_saved += entry["latency"]
+        return entry["answer"]
+
+    def lookup(self, question: str, context_fingerprint: str, kb_fingerprint: Optional[str] = None,
+               query_vector: Optional[np.ndarray] = None) -> Optional[str]:
+        """Return a cached answer for the same or a near-identical question grounded in the same context"""
+        with self._lock:
+            self.lookups += 1
+            self._check_kb(kb_fingerprint)
+            now = time.time()
+
+            exact_key = (QueryEmbeddingCache.normalize(question), context_fingerprint)
+            entry_id = self._exact.get(exact_key)
+            if entry_id is not None:
+                if not self._expired(self._entries[entry_id], now):
+                    return self._hit(entry_id)
+                self._remove([entry_id])
+
+            if query_vector is None or self.index is None or self.index.ntotal == 0:
+                return None
+
+            query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+            scores, ids = self.index.search(query, min(8, self.index.ntotal))
+            expired = []
+            answer = None
+            for score, entry_id in zip(scores[0], ids[0]):
+                entry = self._entries.get(int(entry_id))
+                if entry is None or score < self.threshold:
+                    continue
+                if self._expired(entry, now):
+                    expired.append(int(entry_id))
+                    continue
+                if entry["context_fingerprint"] == context_fingerprint:
+                    answer = self._hit(int(entry_id))
+                    break
+            if expired:
+                self._remove(expired)
+            return answer
+
+    def put(self, question: str, answer: str, context_fingerprint: str, kb_fingerprint: Optional[str] = None,
+            latency: float = 0.0, query_vector: Optional[np.ndarray] = None):
+        """Cache an answer, evicting the least recently used entries beyond max_entries"""
+        with self._lock:
+            self._check_kb(kb_fingerprint)
+            entry_id = self._next_id
+            self._next_id += 1
+
+            if query_vector is not None:
+                query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+                if self.index is None or self.index.d != query.shape[1]:
+                    self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(query.shape[1]))
+                self.index.add_with_ids(query, np.array([entry_id], dtype=np.int64))
+
+            exact_key = (QueryEmbeddingCache.normalize(question), context_fingerprint)
+            if exact_key in self._exact:
+                self._remove([self._exact[exact_key]])
+            self._exact[exact_key] = entry_id
+            self._entries[entry_id] = {
+                "question": question,
+                "answer": answer,
+                "context_fingerprint": context_fingerprint,
+                "exact_key": exact_key,
+                "created": time.time(),
+                "latency": latency
+            }
+
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                self._remove(list(self._entries)[:overflow])
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get cache statistics"""
+        return {
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "invalidations": self.invalidations,
+            "latency_saved_seconds": round(self.latency_saved, 3)
+        }
@@ -0,0 +1,299 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION = "default"
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def resolve_session_id(session_id) -> str:
+    """The client's session id if well-formed, otherwise a newly issued one"""
+    if isinstance(session_id, str) and SESSION_ID_RE.match(session_id):
+        return session_id
+    return uuid.uuid4().hex
+
+
+class SQLiteSessionBackend:
+    """Persists session histories in a local SQLite file so conversations survive restarts.
+
+    Each session is one row holding its messages as JSON, rewritten on every turn
+    (a session holds at most a few dozen short messages).
+    """
+
+    def __init__(self, path: str = "sessions.db"):
+        self.path = path
+        self._local = threading.local()  # sqlite3 connections are per thread
+        if hasattr(os, "register_at_fork"):
+            # A connection must not be used across fork(); forked workers open their own
+            os.register_at_fork(after_in_child=self._forget_connections)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _forget_connections(self):
+        self._local = threading.local()
+    
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, session_id: str, ttl_seconds: Optional[float] = None) -> Optional[List[Dict[str, str]]]:
+        """Stored messages of a session, or None if it is unknown or idle longer than the TTL"""
+        row = self._connection().execute(
+            "SELECT messages, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if ttl_seconds is not None and time.time() - row[1] > ttl_seconds:
+            self.delete(session_id)
+            return None
+        return json.loads(row[0])
+
+    def save(self, session_id: str, messages: List[Dict[str, str]]):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, messages, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(messages), time.time())
+            )
+
+    def delete(self, session_id: str):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def delete_all(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM sessions")
+
+    def purge_expired(self, ttl_seconds: float) -> int:
+        """Delete sessions idle longer than the TTL, returning how many were removed"""
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - ttl_seconds,))
+        return cursor.rowcount
+
+
+class _Session:
+    __slots__ = ("messages", "size", "last_access")
+
+    def __init__(self, max_messages: int):
+        self.messages = deque(maxlen=max_messages)  # Ring buffer: oldest turns fall off
+        self.size = 0
+        self.last_access = time.time()
+
+
+class _Shard:
+    __slots__ = ("sessions", "size", "lock")
+
+    def __init__(self):
+        self.sessions: "OrderedDict[str, _Session]" = OrderedDict()  # Least recently used first
+        self.size = 0
+        self.lock = threading.Lock()
+
+
+class SessionStore:
+    """Conversation histories keyed by session id, bounded in turns, idle time and total memory.
+
+    Sessions are spread over independently locked shards, so concurrent clients
+    only contend when their ids hash to the same shard, and each session's history
+    is a fixed-size ring buffer. Idle sessions expire after `ttl_seconds`; when the
+    message text held in memory across all shards exceeds `max_bytes` the least
+    recently used sessions are evicted. With a backend, every turn is written through
+    and evicted or restarted sessions are reloaded on their next request. Reading
+    the history of an unknown session creates nothing.
+    """
+
+    def __init__(self, max_turns: int = 10, ttl_seconds: Optional[float] = 3600.0,
+                 max_bytes: int = 64 * 1024 * 1024, shards: int = 16,
+                 backend: Optional[SQLiteSessionBackend] = None):
+        self.max_messages = max_turns * 2
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self._shards = [_Shard() for _ in range(shards)]
+        self.evictions = 0
+        self.expirations = 0
+        self._next_sweep = time.time() + (ttl_seconds or 0)
+
+    def __len__(self) -> int:
+        return sum(len(shard.sessions) for shard in self._shards)
+
+    def _shard(self, session_id: str) -> _Shard:
+        return self._shards[zlib.crc32(session_id.encode("utf-8")) % len(self._shards)]
+
+    @staticmethod
+    def _message_size(message: Dict[str, str]) -> int:
+        return len(message["content"]) + len(message["role"])
+
+    def _expired(self, session: _Session, now: float) -> bool:
+        return self.ttl_seconds is not None and now - session.last_access > self.ttl_seconds
+
+    def _drop(self, shard: _Shard, session_id: str):
+        session = shard.sessions.pop(session_id)
+        shard.size -= session.size
+
+    def _expire_idle(self, shard: _Shard, now: float):
+        # Sessions are in access order, so idle ones are at the front
+        while shard.sessions:
+            session_id, session = next(iter(shard.sessions.items()))
+            if not self._expired(session, now):
+                break
+            self._drop(shard, session_id)
+            self.expirations += 1
+
+    @property
+    def size(self) -> int:
+        """Bytes of message text held in memory"""
+        return sum(shard.size for shard in self._shards)
+
+    def _evict_over_cap(self, keep: str):
+        """Evict the least recently used sessions of any shard until the memory cap holds.
+
+        Never evicts `keep`, the session just written to. Takes one shard lock at a
+        time, so the caller must not hold any.
+        """
+        while self.size > self.max_bytes:
+            oldest = None
+            for shard in self._shards:
+                with shard.lock:
+                    # Sessions are in access order: the first one other than `keep` is the shard's least recent
+                    candidate = next(((session_id, session.last_access) for session_id, session in
+                                      shard.sessions.items() if session_id != keep), None)
+                if candidate is not None and (oldest is None or candidate[1] < oldest[2]):
+                    oldest = (shard, *candidate)
+            if oldest is None:
+                return
+            shard, session_id, _ = oldest
+            with shard.lock:
+                if session_id in shard.sessions:
+                    self._drop(shard, session_id)
+                    self.evictions += 1
+
+    def _add(self, shard: _Shard, session: _Session, messages):
+        for message in messages:
+            if len(session.messages) == session.messages.maxlen:
+                removed = self._message_size(session.messages[0])
+                session.size -= removed
+                shard.size -= removed
+            session.messages.append(message)
+            added = self._message_size(message)
+            session.size += added
+            shard.size += added
+
+    def _session(self, shard: _Shard, session_id: str, now: float) -> Optional[_Session]:
+        """The in-memory session, marked as used (caller holds the shard lock)"""
+        self._expire_idle(shard, now)
+        session = shard.sessions.get(session_id)
+        if session is not None:
+            shard.sessions.move_to_end(session_id)
+            session.last_access = now
+        return session
+
+    def purge_expired(self):
+        """Drop idle sessions from every shard (and the backend)"""
+        if self.ttl_seconds is None:
+            return
+        now = time.time()
+        self._next_sweep = now + self.ttl_seconds
+        for shard in self._shards:
+            with shard.lock:
+                self._expire_idle(shard, now)
+        if self.backend is not None:
+            self.backend.purge_expired(self.ttl_seconds)
+
+    def _restore(self, shard: _Shard, session_id: str, create: bool = True) -> Optional[_Session]:
+        """Get a session, reloading it from the backend when it is not in memory.
+
+        An unknown session is created, or with `create=False` None is returned.
+        """
+        now = time.time()
+        if self.ttl_seconds is not None and now >= self._next_sweep:
+            # Shards only expire their own sessions on access; sweep all of them once per TTL
+            self.purge_expired()
+        with shard.lock:
+            session = self._session(shard, session_id, now)
+        if session is not None:
+            return session
+
+        stored = self.backend.load(session_id, self.ttl_seconds) if self.backend is not None else None
+        with shard.lock:
+            session = self._session(shard, session_id, now)  # Another request may have restored it meanwhile
+            if session is None:
+                if not stored and not create:
+                    return None
+                session = _Session(self.max_messages)
+                shard.sessions[session_id] = session
+                if stored:
+                    self._add(shard, session, stored[-self.max_messages:])
+        if stored:
+            self._evict_over_cap(session_id)
+        return session
+
+    def history(self, session_id: str = DEFAULT_SESSION, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """The most recent messages of a session (all of them when limit is None), oldest first"""
+        shard = self._shard(session_id)
+        session = self._restore(shard, session_id, create=False)
+        if session is None:
+            return []
+        with shard.lock:
+            start = max(0, len(session.messages) - limit) if limit is not None else 0
+            return list(islice(session.messages, start, None))
+
+    def append(self, session_id: str, user_message: str, assistant_response: str):
+        """Record a completed exchange in a session"""
+        shard = self._shard(session_id)
+        session = self._restore(shard, session_id)
+        turn = ({"role": "user", "content": user_message}, {"role": "assistant", "content": assistant_response})
+        with shard.lock:
+            if shard.sessions.get(session_id) is not session:
+                # Evicted since it was restored: put it back as the most recent session
+                shard.sessions[session_id] = session
+                shard.size += session.size
+            self._add(shard, session, turn)
+            snapshot = list(session.messages) if self.backend is not None else None
+        self._evict_over_cap(session_id)
+        if snapshot is not None:
+            self.backend.save(session_id, snapshot)
+
+    def clear(self, session_id: Optional[str] = None):
+        """Forget one session, or every session when no id is given"""
+        if session_id is None:
+            for shard in self._shards:
+                with shard.lock:
+                    shard.sessions.clear()
+                    shard.size = 0
+            if self.backend is not None:
+                self.backend.delete_all()
+            return
+
+        shard = self._shard(session_id)
+        with shard.lock:
+            if session_id in shard.sessions:
+                self._drop(shard, session_id)
+        if self.backend is not None:
+            self.backend.delete(session_id)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get session store statistics"""
+        return {
+            "sessions": len(self),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
@@ -0,0 +1,101 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _AsyncCall:
+    """An in-flight `ado` call and the number of callers awaiting it"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution whose result is shared.
+
+    The first caller for a key runs the function; callers arriving while it is in
+    flight wait for and receive the same result (or exception) instead of running
+    it again. Nothing is cached: once the call finishes, the next caller runs it anew.
+    Threaded callers use `do`, event-loop callers `ado`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._async_calls: Dict[Hashable, "_AsyncCall"] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args) -> Tuple[Any, bool]:
+        """Run fn(*args) unless an identical call is in flight; returns (result, shared)"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return result, False
+
+    async def ado(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args) -> Tuple[Any, bool]:
+        """Async `do` for callers on one event loop.
+
+        The call runs as a task of its own that every caller, the first one included,
+        awaits through a shield: a cancelled caller stops waiting but the call goes on
+        for the others. It is only cancelled when no caller is left waiting for it.
+        """
+        call = self._async_calls.get(key)
+        shared = call is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.get_running_loop().create_task(fn(*args))
+            call = self._async_calls[key] = _AsyncCall(task)
+            self.executions += 1
+            task.add_done_callback(functools.partial(self._async_done, key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _async_done(self, key: Hashable, call: "_AsyncCall", task: asyncio.Task):
+        if self._async_calls.get(key) is call:
+            del self._async_calls[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved, so a failure nobody waited for any more isn't logged as lost
+
+    def get_stats(self) -> Dict[str, float]:
+        """Get coalescing statistics"""
+        requests = self.executions + self.coalesced
+        return {
+            "in_flight": len(self._calls) + len(self._async_calls),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesce_rate": self.coalesced / requests if requests else 0.0
+        }
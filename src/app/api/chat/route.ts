@@ -2,7 +2,7 @@ import { NextRequest, NextResponse } from 'next/server';
 
 export async function POST(request: NextRequest) {
   try {
-    const { message } = await request.json();
+    const { message, stream, session_id } = await request.json();
 
     if (!message) {
       return NextResponse.json(
@@ -14,28 +14,49 @@ export async function POST(request: NextRequest) {
     // Connect to Python backend with cache-busting
     const timestamp = Date.now();
     const backendBaseUrl = process.env.BACKEND_URL || 'http://localhost:5000';
-    const response = await fetch(`${backendBaseUrl}/api/chat?t=${timestamp}`, {
+    const endpoint = stream ? '/api/chat/stream' : '/api/chat';
+    const response = await fetch(`${backendBaseUrl}${endpoint}?t=${timestamp}`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
         'Cache-Control': 'no-cache, no-store, must-revalidate',
         'Pragma': 'no-cache',
       },
-      body: JSON.stringify({ message }),
+      body: JSON.stringify({ message, session_id }),
+      cache: 'no-store',
     });
 
-    if (response.ok) {
+    if (response.ok && stream && response.body) {
+      // Pass the Server-Sent Events body straight through without buffering it
+      return new Response(response.body, {
+        headers: {
+          'Content-Type': 'text/event-stream',
+          'Cache-Control': 'no-cache, no-store, must-revalidate',
+          'Connection': 'keep-alive',
+          'X-Accel-Buffering': 'no',
+        },
+      });
+    } else if (response.ok) {
       const data = await response.json();
-      const response_obj = NextResponse.json({ response: data.response });
+      const response_obj = NextResponse.json({ response: data.response, session_id: data.session_id });
       response_obj.headers.set('Cache-Control', 'no-cache, no-store, must-revalidate');
       response_obj.headers.set('Pragma', 'no-cache');
       response_obj.headers.set('Expires', '0');
       return response_obj;
+    } else if (response.status === 503) {
+      // Shed by the backend's admission control: pass the status and Retry-After on so the client can back off
+      const retryAfter = response.headers.get('Retry-After');
+      const response_obj = NextResponse.json(
+        { error: 'Server busy', retry_after: retryAfter ? Number(retryAfter) : null },
+        { status: 503 }
+      );
+      if (retryAfter) response_obj.headers.set('Retry-After', retryAfter);
+      return response_obj;
     } else {
       console.error('Backend error:', response.status, response.statusText);
       return NextResponse.json(
         { error: 'Backend server error' },
-        { status: 500 }
+        { status: response.status }
       );
     }
   } catch (error) {
@@ -45,4 +66,4 @@ export async function POST(request: NextRequest) {
       { status: 500 }
     );
   }
-} 
\ No newline at end of file
+}
@@ -15,6 +15,17 @@ export function ChatInterface() {
   const [input, setInput] = useState("");
   const [isLoading, setIsLoading] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const sessionIdRef = useRef<string>("");
+
+  // One conversation per browser tab: the backend keeps each session's history separately
+  const getSessionId = () => {
+    if (!sessionIdRef.current) {
+      const stored = window.sessionStorage.getItem("tft-session-id");
+      sessionIdRef.current = stored || crypto.randomUUID().replace(/-/g, "");
+      window.sessionStorage.setItem("tft-session-id", sessionIdRef.current);
+    }
+    return sessionIdRef.current;
+  };
 
   const scrollToBottom = () => {
     setTimeout(() => {
@@ -65,14 +76,47 @@ export function ChatInterface() {
           "Cache-Control": "no-cache, no-store, must-revalidate",
           "Pragma": "no-cache",
         },
-        body: JSON.stringify({ message: messageContent }),
+        body: JSON.stringify({ message: messageContent, stream: true, session_id: getSessionId() }),
       });
 
-      if (response.ok) {
-        const data = await response.json();
+      if (response.ok && response.body) {
+        // Render the answer as Server-Sent Events arrive
+        setMessages(prev => [...prev, { role: "assistant", content: "", timestamp: new Date() }]);
+        const appendToAnswer = (delta: string) => {
+          setMessages(prev => {
+            const updated = [...prev];
+            const last = updated[updated.length - 1];
+            updated[updated.length - 1] = { ...last, content: last.content + delta };
+            return updated;
+          });
+        };
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const events = buffer.split("\n\n");
+          buffer = events.pop() ?? "";
+          for (const event of events) {
+            if (event.startsWith("event: error")) {
+              appendToAnswer("Sorry, I encountered an error. Please try again!");
+            } else if (event.startsWith("data: ")) {
+              const { delta } = JSON.parse(event.slice(6));
+              if (delta) appendToAnswer(delta);
+            }
+          }
+        }
+      } else if (response.status === 503) {
+        // The backend is at capacity and turned the question away
+        const retryAfter = Number(response.headers.get("Retry-After"));
         const assistantMessage: Message = {
           role: "assistant",
-          content: data.response,
+          content: retryAfter > 0
+            ? `The server is busy right now, please retry in ${retryAfter} s.`
+            : "The server is busy right now, please retry in a few seconds.",
           timestamp: new Date(),
         };
         setMessages(prev => [...prev, assistantMessage]);
@@ -199,7 +243,7 @@ export function ChatInterface() {
           </motion.div>
         ))}
 
-        {isLoading && (
+        {isLoading && messages[messages.length - 1]?.role !== "assistant" && (
           <motion.div
             initial={{ opacity: 0, y: 20 }}
             animate={{ opacity: 1, y: 0 }}
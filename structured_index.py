@@ -0,0 +1,83 @@
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+_TIER_RE = re.compile(r"^Tier:\s*(\d+)", re.MULTILINE)
+
+
+class StructuredIndex:
+    """Exact-match lookups over knowledge base documents, built once per document set.
+
+    Covers champions by tier, documents by `metadata.type`, documents by name, and
+    which documents mention a given trait, item, champion or augment name, so
+    structured questions resolve with dictionary lookups instead of an embedding call.
+    """
+
+    def __init__(self, documents: List[Dict]):
+        self.by_type: Dict[str, List[Dict]] = defaultdict(list)
+        self.champions_by_tier: Dict[int, List[Dict]] = defaultdict(list)
+        self.by_name: Dict[str, List[Dict]] = defaultdict(list)
+        self.mentions: Dict[str, List[Dict]] = defaultdict(list)
+
+        for doc in documents:
+            metadata = doc.get('metadata', {})
+            doc_type = metadata.get('type', '')
+            self.by_type[doc_type].append(doc)
+            if metadata.get('name'):
+                self.by_name[metadata['name'].lower()].append(doc)
+            if doc_type == 'champion':
+                match = _TIER_RE.search(doc.get('content', ''))
+                if match:
+                    self.champions_by_tier[int(match.group(1))].append(doc)
+
+        # One alternation over every known name, longest first so "Bastion Crest" wins over "Bastion"
+        names = sorted(self.by_name, key=len, reverse=True)
+        self._name_re = re.compile(
+            r"(?<!\w)(?:" + "|".join(re.escape(name) for name in names) + r")(?!\w)"
+        ) if names else None
+
+        # Names nested in longer names ("Battle Academia" in "Battle Academia Emblem") count as mentioned too
+        self._nested = {name: self._nested_names(name) for name in names}
+
+        for doc in documents:
+            own_name = doc.get('metadata', {}).get('name', '').lower()
+            seen = set()
+            for match in self.names_in(doc.get('content', '')):
+                for name in [match] + self._nested[match]:
+                    if name != own_name and name not in seen:
+                        seen.add(name)
+                        self.mentions[name].append(doc)
+
+    def _nested_names(self, name: str) -> List[str]:
+        words = name.split()
+        nested = []
+        for length in range(len(words) - 1, 0, -1):
+            for start in range(len(words) - length + 1):
+                candidate = " ".join(words[start:start + length])
+                if candidate in self.by_name and candidate not in nested:
+                    nested.append(candidate)
+        return nested
+
+    def names_in(self, text: str) -> List[str]:
+        """Known entity names (lowercase) mentioned in a text, in order of appearance"""
+        if self._name_re is None:
+            return []
+        return [match.group(0) for match in self._name_re.finditer(text.lower())]
+
+    def champions_with_tier(self, tier: int) -> List[Dict]:
+        """All champion documents of a cost tier"""
+        return self.champions_by_tier.get(tier, [])
+
+    def documents_of_type(self, doc_type: str) -> List[Dict]:
+        """All documents with the given metadata.type"""
+        return self.by_type.get(doc_type, [])
+
+    def find_by_name(self, name: str, doc_type: Optional[str] = None) -> List[Dict]:
+        """Documents whose metadata.name matches exactly (case-insensitive)"""
+        docs = self.by_name.get(name.lower(), [])
+        return [doc for doc in docs if doc_type is None or doc.get('metadata', {}).get('type') == doc_type]
+
+    def documents_mentioning(self, name: str, doc_type: Optional[str] = None) -> List[Dict]:
+        """Documents whose content mentions an entity name, optionally of one type"""
+        docs = self.mentions.get(name.lower(), [])
+        return [doc for doc in docs if doc_type is None or doc.get('metadata', {}).get('type') == doc_type]
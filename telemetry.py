@@ -0,0 +1,455 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Prometheus-style metrics (text exposition format 0.0.4) and tracing spans for
+# the question answering pipeline, without a client library dependency.
+#
+#   with stage("query_embedding"):   # observed in tft_stage_seconds{stage=...}
+#       ...                          # and traced as a child of the current span
+#
+# Spans are exported to a JSONL file or an OTLP/HTTP collector (e.g. a local
+# OpenTelemetry Collector or Jaeger on :4318) when TFT_TRACE_EXPORTER is set.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+SERVICE_NAME = "tft-qa-bot"
+
+Labels = Tuple[str, ...]
+# A metric family produced at scrape time: (name, type, help, [(labels, value), ...])
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (key + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+               for key, value in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), const_labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.const_labels = const_labels if const_labels is not None else {}  # Shared with the registry
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, Any] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _label_dict(self, key: Labels) -> Dict[str, str]:
+        return {**self.const_labels, **dict(zip(self.labelnames, key))}
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, per label combination"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self._label_dict(key))} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observations with their sum and count, per label combination"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS,
+                 const_labels: Optional[Dict[str, str]] = None):
+        super().__init__(name, help, labelnames, const_labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Labels, List[float]] = {}  # labels -> per-bucket counts + [+Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def count(self, **labels) -> int:
+        counts = self._values.get(self._key(labels))
+        return int(sum(counts[:-1])) if counts else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        lines = []
+        for key, counts in values:
+            labels = self._label_dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts[:-1]):
+                cumulative += count
+                bucket = _format_labels({**labels, "le": _format_value(float(bound))})
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics rendered by the /metrics endpoints, plus collectors evaluated at scrape time.
+
+    The values live in this process. Under gunicorn every worker keeps its own and
+    answers /metrics with them alone, labelled `worker="<pid>"` (see `label_worker`),
+    so totals are the sum over workers.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: Dict[str, Callable[[], List[MetricFamily]]] = {}
+        self.const_labels: Dict[str, str] = {}  # Added to every sample
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames, self.const_labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets, self.const_labels)
+        self._metrics.append(metric)
+        return metric
+
+    def label_worker(self):
+        """Label every sample with this process's pid and start its metrics from zero.
+
+        Called in each forked worker, so that what the master did before forking
+        (such as embedding the knowledge base) isn't reported again by every worker.
+        """
+        self.const_labels["worker"] = str(os.getpid())
+        for metric in self._metrics:
+            metric.reset()
+
+    def register_collector(self, name: str, collector: Callable[[], List[MetricFamily]]):
+        """Add (or replace) a callback returning gauges and counters read from live objects"""
+        self._collectors[name] = collector
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, collector in list(self._collectors.items()):
+            try:
+                families = collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector {name} failed: {e}")
+                continue
+            for family, metric_type, help, samples in families:
+                lines.append(f"# HELP {family} {help}")
+                lines.append(f"# TYPE {family} {metric_type}")
+                lines.extend(f"{family}{_format_labels({**self.const_labels, **labels})} {_format_value(value)}"
+                             for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "tft_request_seconds", "Time to answer a question, by serving mode and outcome", ["mode", "outcome"])
+STAGE_SECONDS = REGISTRY.histogram(
+    "tft_stage_seconds", "Time spent in each stage of answering a question", ["stage"])
+REQUEST_TOKENS = REGISTRY.histogram(
+    "tft_request_tokens", "Tokens per generated answer: prompt (in) and completion (out)", ["direction"],
+    buckets=TOKEN_BUCKETS)
+TOKENS = REGISTRY.counter("tft_tokens_total", "Chat completion tokens, by direction", ["direction"])
+PROMPT_TOKENS = REGISTRY.histogram(
+    "tft_prompt_tokens", "Prompt tokens per generated answer, by part: system prompt, conversation history "
+    "and the question with its retrieved context (user)", ["part"], buckets=TOKEN_BUCKETS)
+HISTORY_TOKENS_SAVED = REGISTRY.counter(
+    "tft_history_tokens_saved_total", "Conversation history tokens left out of prompts by history compaction")
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "tft_upstream_errors_total", "Failed calls to upstream services, by upstream and error type", ["upstream", "error"])
+INTENT_ROUTES = REGISTRY.counter(
+    "tft_intent_routes_total", "Questions by the intent they were answered with from the knowledge base "
+    "without a completion (intent=none: sent to the LLM)", ["intent"])
+DEGRADED_ANSWERS = REGISTRY.counter(
+    "tft_degraded_answers_total", "Questions answered with retrieved documents only because the chat completion "
+    "failed or its circuit breaker was open, by reason", ["reason"])
+SPANS_DROPPED = REGISTRY.counter("tft_trace_spans_dropped_total", "Spans not exported because the export queue was full")
+
+
+def record_tokens(prompt_tokens: int, completion_tokens: int):
+    """Account the tokens in and out of one generated answer"""
+    for direction, count in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+        TOKENS.inc(count, direction=direction)
+        REQUEST_TOKENS.observe(count, direction=direction)
+
+
+class Span:
+    """One timed operation in a trace"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name,
+            "start_ns": self.start_ns, "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3) if self.end_ns else None,
+            "attributes": self.attributes, "error": self.error
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("tft_current_span", default=None)
+
+
+class SpanExporter:
+    """Exports finished spans in batches from a background thread, so requests never wait on it"""
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 256, interval: float = 2.0):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue)
+        self._flush_lock = threading.Lock()
+        self._start()
+        atexit.register(self.flush)
+        if hasattr(os, "register_at_fork"):
+            # Threads don't survive fork(); a forked worker starts its own with an empty queue
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._flush_lock = threading.Lock()
+        self._start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            SPANS_DROPPED.inc()
+
+    def flush(self):
+        """Export every queued span now"""
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                self._send_safely(batch)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def _send_safely(self, spans: List[Span]):
+        try:
+            self._send(spans)
+        except Exception as e:
+            logger.warning(f"Failed to export {len(spans)} spans: {e}")
+
+    def _send(self, spans: List[Span]):
+        raise NotImplementedError
+
+
+class JsonlSpanExporter(SpanExporter):
+    """Appends one JSON object per span to a file"""
+
+    def __init__(self, path: str, **kwargs):
+        self.path = path
+        self._write_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def _send(self, spans: List[Span]):
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        with self._write_lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPSpanExporter(SpanExporter):
+    """Posts spans to an OTLP/HTTP collector endpoint in the JSON encoding"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0, **kwargs):
+        import httpx  # Already required by the OpenAI client
+
+        self.endpoint = endpoint
+        self._client = httpx.Client(timeout=timeout)
+        super().__init__(**kwargs)
+
+    def _send(self, spans: List[Span]):
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": [self._span(span) for span in spans]}]
+        }]}
+        response = self._client.post(self.endpoint, json=payload)
+        response.raise_for_status()
+
+    @staticmethod
+    def _span(span: Span) -> Dict[str, Any]:
+        otlp = {
+            "traceId": span.trace_id, "spanId": span.span_id, "name": span.name, "kind": 1,
+            "startTimeUnixNano": str(span.start_ns), "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1}
+        }
+        if span.parent_id:
+            otlp["parentSpanId"] = span.parent_id
+        return otlp
+
+
+class Tracer:
+    """Creates spans nested by context (threads and asyncio tasks each follow their own chain)"""
+
+    def __init__(self, exporter: Optional[SpanExporter] = None):
+        self.exporter = exporter
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # A generator holding the span was closed from another context
+                pass
+            if self.exporter is not None:
+                self.exporter.export(span)
+
+
+TRACER = Tracer()
+
+
+def create_span_exporter() -> Optional[SpanExporter]:
+    """Span exporter from TFT_TRACE_EXPORTER: `jsonl` (TFT_TRACE_FILE), `otlp` (TFT_OTLP_ENDPOINT) or none"""
+    kind = os.getenv("TFT_TRACE_EXPORTER", "none").lower()
+    if kind == "jsonl":
+        return JsonlSpanExporter(os.getenv("TFT_TRACE_FILE", "traces.jsonl"))
+    if kind == "otlp":
+        return OTLPSpanExporter(os.getenv("TFT_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"))
+    if kind != "none":
+        raise ValueError(f"Unknown TFT_TRACE_EXPORTER {kind!r}, expected 'jsonl', 'otlp' or 'none'")
+    return None
+
+
+@contextmanager
+def stage(name: str, upstream: Optional[str] = None, **attributes) -> Iterator[Span]:
+    """Time one stage into tft_stage_seconds and trace it as a span.
+
+    With `upstream`, the stage is one call to that upstream and a failure is also
+    counted in tft_upstream_errors_total; a call its open circuit breaker refused
+    was never made, and is counted in tft_circuit_rejected_total instead.
+    """
+    from resilience import CircuitOpenError  # resilience imports this module
+
+    start = time.perf_counter()
+    try:
+        with TRACER.span(name, **attributes) as span:
+            yield span
+    except Exception as e:
+        if upstream and not isinstance(e, CircuitOpenError):
+            UPSTREAM_ERRORS.inc(upstream=upstream, error=type(e).__name__)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+
+@contextmanager
+def track_request(mode: str, **attributes) -> Iterator[Span]:
+    """Time answering one question into tft_request_seconds as the root span of its trace.
+
+    The outcome is `error` when the block raises, `routed` when the span's
+    `intent` attribute was set (answered without a completion), `degraded` when
+    its `degraded` attribute was set (answered from retrieval alone), `cached`
+    when its `cached` attribute was set, and `ok` otherwise.
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    with TRACER.span("chat", mode=mode, **attributes) as span:
+        try:
+            yield span
+            if span.attributes.get("intent"):
+                outcome = "routed"
+            elif span.attributes.get("degraded"):
+                outcome = "degraded"
+            else:
+                outcome = "cached" if span.attributes.get("cached") else "ok"
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, mode=mode, outcome=outcome)
@@ -0,0 +1,80 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from chatbot import TFTChatbot, TFTChatbotManager
+from embedding_cache import QueryEmbeddingCache
+from embedding_providers import OpenAIEmbeddingProvider
+from mock_openai import FakeOpenAIClient
+from vector_store import TFTVectorStore
+
+DIMENSION = 64
+
+
+def make_document(doc_id: str, content: str, doc_type: str = "item", set_name: str = "15", patch: str = "15.1"):
+    return {"content": content,
+            "metadata": {"id": doc_id, "name": doc_id.title(), "type": doc_type, "set": set_name, "patch": patch}}
+
+
+def filler_documents(count: int, doc_type: str = "item"):
+    """Distinct documents padding a shard past the size at which sq8 and ivfpq are trained"""
+    return [make_document(f"filler_{i}", f"Filler {doc_type} {i}: token{i} alpha{i % 17} beta{i % 29}", doc_type)
+            for i in range(count)]
+
+
+@pytest.fixture
+def client():
+    """Fake OpenAI client without latency, so tests only wait on the code under test"""
+    return FakeOpenAIClient(latency=0, per_input_latency=0, completion_latency=0, dimension=DIMENSION)
+
+
+@pytest.fixture
+def make_store(client):
+    def make(**options) -> TFTVectorStore:
+        provider = OpenAIEmbeddingProvider(client=client, dimension=DIMENSION)
+        return TFTVectorStore("test-key", embedding_provider=provider, **options)
+    return make
+
+
+@pytest.fixture
+def documents():
+    return [
+        make_document("infinity_edge", "Item: Infinity Edge grants critical strike chance and damage."),
+        make_document("guinsoos_rageblade", "Item: Guinsoo's Rageblade grants stacking attack speed."),
+        make_document("warmogs_armor", "Item: Warmog's Armor grants bonus health to tanks."),
+        make_document("luchador", "Trait: Luchador champions gain attack damage and cleanse.", doc_type="trait"),
+        make_document("star_guardian", "Trait: Star Guardian champions share mana.", doc_type="trait"),
+    ]
+
+
+@pytest.fixture
+def make_chatbot(make_store, documents, client):
+    def make(response_cache=None, query_cache=True, **options) -> TFTChatbot:
+        store = make_store(query_cache=QueryEmbeddingCache() if query_cache else None)
+        store.build_index(documents, store.create_embeddings(documents))
+        return TFTChatbot("test-key", store, response_cache=response_cache, client=client, async_client=client,
+                          **options)
+    return make
+
+
+class AsyncCompletions:
+    """Async chat completions answering like FakeOpenAIClient, after `latency` seconds on the event loop"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.client = FakeOpenAIClient(completion_latency=0)
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self.client.chat.completions.create(**kwargs)
+
+
+@pytest.fixture
+def manager(make_chatbot, client):
+    """Manager around a chatbot whose sync and async completions take 0.2s"""
+    client.completion_latency = 0.2
+    manager = TFTChatbotManager("test-key")
+    manager.chatbot = make_chatbot()
+    manager.chatbot.async_client = SimpleNamespace(chat=SimpleNamespace(completions=AsyncCompletions(0.2)))
+    return manager
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+from session_store import SessionStore
+
+QUESTION = "Which item grants stacking attack speed?"
+
+
+class RecordingSessionStore(SessionStore):
+    """Session store noting the thread of every read and write"""
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def history(self, *args, **kwargs):
+        self.threads.append(threading.get_ident())
+        return super().history(*args, **kwargs)
+
+    def append(self, *args, **kwargs):
+        self.threads.append(threading.get_ident())
+        return super().append(*args, **kwargs)
+
+
+def test_async_answers_keep_session_io_off_the_event_loop(manager):
+    sessions = manager.chatbot.sessions = RecordingSessionStore()
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        await asyncio.gather(manager.aget_response(QUESTION, "a"), manager.aget_response(QUESTION, "b"))
+        return loop_thread
+
+    loop_thread = asyncio.run(scenario())
+    threads = list(sessions.threads)
+    assert len(sessions.history("a")) == 2 and len(sessions.history("b")) == 2
+    # Coalescing keys, the history in the prompt, the leader's and the follower's writes
+    assert len(threads) >= 4
+    assert loop_thread not in threads
+
+
+def test_async_stream_records_the_exchange(manager):
+    manager.chatbot.async_client.chat.completions = StreamingCompletions()
+
+    async def scenario():
+        return "".join([delta async for delta in manager.chatbot.astream_response(QUESTION, "a")])
+
+    answer = asyncio.run(scenario())
+    assert [m["content"] for m in manager.chatbot.sessions.history("a")] == [QUESTION, answer]
+
+
+class StreamingCompletions:
+    async def create(self, **kwargs):
+        async def chunks():
+            for word in ("Rageblade ", "stacks."):
+                yield type("Chunk", (), {"choices": [type("Choice", (), {"delta": type("Delta", (), {"content": word})})]})
+        return chunks()
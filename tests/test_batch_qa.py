@@ -0,0 +1,48 @@
+import sys
+
+import pytest
+
+import batch_qa
+from batch_qa import BatchInputError, read_questions, with_ids
+
+
+def test_read_questions_accepts_objects_strings_and_blank_lines():
+    lines = ['{"id": "q1", "question": "  What is Luchador?  "}', "", '"Best item for Jinx?"',
+             '{"message": "Which traits share mana?"}']
+    assert read_questions(lines) == [
+        {"id": "q1", "question": "What is Luchador?"},
+        {"id": 1, "question": "Best item for Jinx?"},
+        {"id": 2, "question": "Which traits share mana?"},
+    ]
+    assert read_questions(["", "   "]) == []
+
+
+@pytest.mark.parametrize("line, message", [
+    ("{not json", "Line 2: invalid JSON"),
+    ("[1, 2]", "Line 2: expected an object or a string"),
+    ('{"question": "   "}', "Line 2: expected a question string"),
+    ('{"id": 3}', "Line 2: expected a question string"),
+])
+def test_read_questions_reports_the_bad_line(line, message):
+    with pytest.raises(BatchInputError, match=message):
+        read_questions(['"fine"', line])
+
+
+def test_with_ids_maps_completion_order_back_to_input_ids():
+    items = [{"id": "a", "question": "x"}, {"id": "b", "question": "y"}]
+    results = [{"index": 1, "answer": "second"}, {"index": 0, "answer": "first"}]
+    assert list(with_ids(results, items)) == [{"id": "b", "index": 1, "answer": "second"},
+                                              {"id": "a", "index": 0, "answer": "first"}]
+
+
+def test_main_reports_bad_input_without_a_traceback(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "questions.jsonl"
+    path.write_text('"fine"\n{broken\n')
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(sys, "argv", ["batch_qa.py", str(path)])
+    monkeypatch.setattr(batch_qa, "TFTChatbotManager", lambda api_key: pytest.fail("initialized on bad input"))
+
+    with pytest.raises(SystemExit) as exit_info:
+        batch_qa.main()
+    assert exit_info.value.code == 1
+    assert capsys.readouterr().err.startswith(f"{path}: Line 2: invalid JSON")
@@ -0,0 +1,26 @@
+import copy
+
+from context_builder import ContextBuilder, document_key
+
+
+def test_same_id_in_another_set_patch_or_type_is_kept(make_store, documents):
+    builder = ContextBuilder(make_store().encoding)
+    other_patch = copy.deepcopy(documents[0])
+    other_patch["metadata"]["patch"] = "15.2"
+    other_patch["content"] = "Item: Infinity Edge, as of patch 15.2."
+
+    context, stats, keys = builder.build([(documents[0], None), (other_patch, None), (documents[0], None)])
+    assert keys == [document_key(documents[0]), document_key(other_patch)]
+    assert stats["duplicates"] == 1
+    assert "patch 15.2" in context
+
+
+def test_header_counts_only_documents_within_the_budget(make_store, documents):
+    encoding = make_store().encoding
+    first = f"Document 1:\n{documents[0]['content']}"
+    budget = len(encoding.encode("Found 5 items:")) + len(encoding.encode(first)) + 2
+    builder = ContextBuilder(encoding, max_tokens=budget)
+
+    context, stats, _ = builder.build([(doc, None) for doc in documents], header="Found {count} items:")
+    assert stats["documents"] == 1 and stats["over_budget"] == len(documents) - 1
+    assert context.startswith("Found 1 items:\n\n")
@@ -0,0 +1,168 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import vector_store
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from mock_openai import FakeRateLimitError, FakeServerError, fake_embedding
+from tests.conftest import DIMENSION, make_document
+
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """Retry attempts instead of real backoff sleeps"""
+    attempts = []
+
+    def no_delay(attempt, error, *args, **kwargs):
+        attempts.append((attempt, type(error).__name__))
+        return 0.0
+
+    monkeypatch.setattr(vector_store, "_backoff_delay", no_delay)
+    return attempts
+
+
+def failing(client, should_fail, error=FakeServerError):
+    """Make the fake client raise `error` for every request whose inputs satisfy `should_fail`"""
+    create = client.embeddings.create
+    calls = []
+
+    def flaky(model, input, **kwargs):
+        calls.append(list(input))
+        if should_fail(input):
+            raise error("simulated")
+        return create(model=model, input=input, **kwargs)
+
+    client.embeddings.create = flaky
+    return calls
+
+
+def test_batches_are_bounded_by_tokens_and_inputs(make_store):
+    store = make_store()
+    assert store._batch_texts([5, 1, 1, 1, 6], max_batch_tokens=7, max_batch_size=3) == [[0, 1, 2], [3, 4]]
+    assert store._batch_texts([1, 1, 1, 1, 1], max_batch_tokens=100, max_batch_size=2) == [[0, 1], [2, 3], [4]]
+    # A text over the token budget still goes out, in a batch of its own
+    assert store._batch_texts([10, 1], max_batch_tokens=5, max_batch_size=8) == [[0], [1]]
+
+
+def test_create_embeddings_sends_one_request_per_batch(make_store, client):
+    documents = [make_document(f"doc{i}", f"Document number {i} about items") for i in range(10)]
+    embeddings = make_store().create_embeddings(documents, max_batch_size=4, max_concurrency=3)
+
+    assert client.embedding_calls == 3
+    assert client.embedded_inputs == 10
+    # Batches complete in any order but every vector lands on its own document
+    for doc, embedding in zip(documents, embeddings):
+        assert embedding == pytest.approx(fake_embedding(doc["content"], DIMENSION))
+
+
+def test_rate_limited_batches_are_retried(make_store, client, backoffs):
+    client.rate_limit_every = 2
+    documents = [make_document(f"doc{i}", f"Document {i}") for i in range(3)]
+    embeddings = make_store().create_embeddings(documents, max_batch_size=1, max_concurrency=1, max_retries=3)
+
+    assert [name for _, name in backoffs] == ["FakeRateLimitError", "FakeRateLimitError"]
+    assert client.embedding_calls == 5
+    assert all(np.any(embedding) for embedding in embeddings)
+
+
+def test_server_errors_are_retried_with_growing_attempts(make_store, client, backoffs):
+    errors = iter([True, True, False])
+    failing(client, lambda texts: next(errors))
+    embeddings = make_store().create_embeddings([make_document("a", "Some item")], max_retries=5)
+
+    assert backoffs == [(0, "FakeServerError"), (1, "FakeServerError")]
+    assert np.any(embeddings[0])
+
+
+def test_non_retryable_errors_are_not_retried(make_store, client, backoffs):
+    calls = failing(client, lambda texts: True, error=ValueError)
+    embeddings = make_store().create_embeddings([make_document("a", "Some item")], max_retries=5)
+
+    assert len(calls) == 1
+    assert backoffs == []
+    assert embeddings.shape == (1, DIMENSION) and not embeddings.any()
+
+
+def test_failed_batches_fall_back_to_uncached_zero_vectors(make_store, client, backoffs, tmp_path):
+    calls = failing(client, lambda texts: any("broken" in text for text in texts))
+    cache = EmbeddingCache(directory=str(tmp_path))
+    documents = [make_document("ok1", "First item"), make_document("bad", "A broken item"),
+                 make_document("ok2", "Second item")]
+    embeddings = make_store(embedding_cache=cache).create_embeddings(documents, max_batch_size=1, max_retries=2)
+
+    assert sum(1 for texts in calls if texts == ["A broken item"]) == 3
+    assert not embeddings[1].any()
+    assert np.any(embeddings[0]) and np.any(embeddings[2])
+    assert len(cache) == 2
+
+
+def test_every_batch_failing_without_a_known_dimension_raises(make_store, client, backoffs):
+    failing(client, lambda texts: True)
+    store = make_store()
+    store.embedding_provider.dimension = None
+    with pytest.raises(RuntimeError):
+        store.create_embeddings([make_document("a", "Some item")], max_retries=0)
+
+
+def test_cached_embeddings_are_not_requested_again(make_store, client, tmp_path):
+    cache = EmbeddingCache(directory=str(tmp_path))
+    documents = [make_document(f"doc{i}", f"Document {i}") for i in range(4)]
+    first = make_store(embedding_cache=cache).create_embeddings(documents)
+    calls = client.embedding_calls
+
+    second = make_store(embedding_cache=cache).create_embeddings(documents + [make_document("new", "New item")])
+    assert client.embedding_calls == calls + 1
+    assert client.embedded_inputs == 5
+    np.testing.assert_allclose(second[:4], first, rtol=1e-6)
+
+
+def test_backoff_honours_retry_after():
+    error = FakeRateLimitError("slow down")
+    error.response = SimpleNamespace(headers={"retry-after": "3"})
+    assert vector_store._backoff_delay(0, error) == 3.0
+    assert 0.0 <= vector_store._backoff_delay(2, FakeRateLimitError("slow down")) <= 4.0
+    assert vector_store._backoff_delay(10, FakeRateLimitError("slow down"), cap=30.0) <= 30.0
+
+
+def test_embeddings_come_back_as_one_float32_matrix(make_store, tmp_path):
+    cache = EmbeddingCache(directory=str(tmp_path))
+    documents = [make_document(f"doc{i}", f"Document {i}") for i in range(3)]
+    make_store(embedding_cache=cache).create_embeddings(documents[:2])
+
+    embeddings = make_store(embedding_cache=cache).create_embeddings(documents)
+    assert isinstance(embeddings, np.ndarray)
+    assert embeddings.dtype == np.float32 and embeddings.shape == (3, DIMENSION)
+    for doc, embedding in zip(documents, embeddings):
+        np.testing.assert_allclose(embedding, fake_embedding(doc["content"], DIMENSION), rtol=1e-6)
+
+
+def test_query_cache_saves_from_concurrent_workers_do_not_share_a_temp_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "query_cache.npz")
+    workers = [QueryEmbeddingCache(persist_path=path, model="m") for _ in range(2)]
+    for i, cache in enumerate(workers):
+        cache.put(f"question {i}", fake_embedding(f"question {i}", DIMENSION))
+
+    replaced = []
+    replace = os.replace
+    monkeypatch.setattr("embedding_cache.os.replace", lambda src, dst: replaced.append(src) or replace(src, dst))
+    for cache in workers:
+        cache.save()
+
+    assert len(set(replaced)) == 2
+    assert [p.name for p in tmp_path.iterdir()] == ["query_cache.npz"]
+    assert QueryEmbeddingCache(persist_path=path, model="m").peek("question 1") is not None
+
+
+def test_query_cache_save_removes_its_temp_file_on_failure(tmp_path, monkeypatch):
+    cache = QueryEmbeddingCache(persist_path=str(tmp_path / "query_cache.npz"), model="m")
+    cache.put("question", fake_embedding("question", DIMENSION))
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("embedding_cache.np.savez", fail)
+    with pytest.raises(OSError):
+        cache.save()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,90 @@
+import re
+
+from history_compactor import MAX_SUMMARY_ENTITIES, MESSAGE_OVERHEAD_TOKENS, HistoryCompactor
+
+
+class WordEncoding:
+    """One token per word, so budgets can be worked out by hand"""
+
+    def encode(self, text):
+        return text.split()
+
+
+def exchange(question, answer):
+    return [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+
+
+def capitalized(text):
+    return re.findall(r"\b[A-Z][a-z]+\b", text)
+
+
+# Every message is 3 words, so 3 + MESSAGE_OVERHEAD_TOKENS tokens
+MESSAGE_TOKENS = 3 + MESSAGE_OVERHEAD_TOKENS
+HISTORY = (exchange("about Ahri please", "Ahri is mage") + exchange("about Zed please", "Zed is assassin")
+           + exchange("about Jinx please", "Jinx is marksman"))
+
+
+def test_history_within_the_budget_is_kept_verbatim():
+    compactor = HistoryCompactor(WordEncoding(), max_tokens=1000, max_messages=6)
+    messages, stats = compactor.compact(HISTORY)
+    assert messages == HISTORY
+    assert stats == {"messages": 6, "kept": 6, "compacted": 0, "entities": 0,
+                     "raw_tokens": 6 * MESSAGE_TOKENS, "tokens": 6 * MESSAGE_TOKENS}
+
+
+def test_max_messages_keeps_the_newest_whole_exchanges():
+    compactor = HistoryCompactor(WordEncoding(), max_tokens=1000, max_messages=3)
+    messages, stats = compactor.compact(HISTORY)
+    assert messages == HISTORY[4:]
+    assert (stats["kept"], stats["compacted"]) == (2, 4)
+
+
+def test_token_budget_cuts_at_exchange_boundaries():
+    compactor = HistoryCompactor(WordEncoding(), max_tokens=4 * MESSAGE_TOKENS + 1, max_messages=6)
+    messages, stats = compactor.compact(HISTORY)
+    assert messages == HISTORY[2:]
+    # Tokens sent vs. tokens the full history would have cost
+    assert stats["tokens"] == 4 * MESSAGE_TOKENS
+    assert stats["raw_tokens"] - stats["tokens"] == 2 * MESSAGE_TOKENS
+
+
+def test_compacted_turns_are_summarized_by_entity_most_recent_first():
+    compactor = HistoryCompactor(WordEncoding(), max_tokens=5 * MESSAGE_TOKENS, max_messages=2,
+                                 entity_names=capitalized)
+    messages, stats = compactor.compact(HISTORY)
+    summary = messages[0]
+    assert summary["role"] == "system"
+    assert summary["content"] == "Earlier in this conversation the user discussed: Zed, Ahri"
+    assert messages[1:] == HISTORY[4:]
+    assert stats["entities"] == 2
+    assert stats["tokens"] == 2 * MESSAGE_TOKENS + compactor.count_tokens(summary)
+
+
+def test_summary_drops_the_oldest_entities_to_fit():
+    names = [f"Champion{i}" for i in range(MAX_SUMMARY_ENTITIES + 5)]
+    history = [message for i, name in enumerate(names) for message in exchange(f"about {name}", "ok")]
+    compactor = HistoryCompactor(WordEncoding(), max_tokens=1000, max_messages=0,
+                                 entity_names=lambda text: re.findall(r"Champion\d+", text))
+    messages, stats = compactor.compact(history)
+    # Capped at MAX_SUMMARY_ENTITIES, newest first
+    assert stats["entities"] == MAX_SUMMARY_ENTITIES
+    assert messages[0]["content"] == ("Earlier in this conversation the user discussed: "
+                                      + ", ".join(reversed(names[-MAX_SUMMARY_ENTITIES:])))
+
+    tight = HistoryCompactor(WordEncoding(), max_tokens=MESSAGE_OVERHEAD_TOKENS + 9, max_messages=0,
+                             entity_names=lambda text: re.findall(r"Champion\d+", text))
+    messages, stats = tight.compact(history)
+    # "Earlier in this conversation the user discussed:" is 7 words, leaving room for 2 names
+    assert messages == [{"role": "system",
+                         "content": f"Earlier in this conversation the user discussed: {names[-1]}, {names[-2]}"}]
+    assert stats["entities"] == 2 and stats["kept"] == 0
+
+
+def test_no_summary_without_entity_names_or_room():
+    messages, stats = HistoryCompactor(WordEncoding(), max_tokens=MESSAGE_TOKENS * 2, max_messages=6).compact(HISTORY)
+    assert messages == HISTORY[4:] and stats["entities"] == 0
+
+    compactor = HistoryCompactor(WordEncoding(), max_tokens=MESSAGE_TOKENS * 2, max_messages=6,
+                                 entity_names=capitalized)
+    messages, stats = compactor.compact(HISTORY)
+    assert messages == HISTORY[4:] and stats["tokens"] == 2 * MESSAGE_TOKENS
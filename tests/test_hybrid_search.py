@@ -0,0 +1,83 @@
+import pytest
+
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+NAMES = {"infinity_edge": "Infinity Edge", "guinsoos_rageblade": "Guinsoo's Rageblade",
+         "warmogs_armor": "Warmog's Armor", "luchador": "Luchador", "star_guardian": "Star Guardian"}
+
+
+@pytest.fixture
+def named_documents(documents):
+    for doc in documents:
+        doc["metadata"]["name"] = NAMES[doc["metadata"]["id"]]
+    return documents
+
+
+@pytest.fixture
+def store(make_store, named_documents):
+    store = make_store(query_cache=None)
+    store.build_index(named_documents, store.create_embeddings(named_documents))
+    return store
+
+
+def ids(results):
+    return [doc["metadata"]["id"] for doc, _ in results]
+
+
+def test_tokenize_drops_stopwords_and_keeps_apostrophes():
+    assert tokenize("What does Warmog's Armor do in Set 15?") == ["warmog's", "armor"]
+
+
+def test_bm25_ranks_matching_documents_and_honours_positions(documents):
+    index = BM25Index(documents)
+    ranked = [position for position, _ in index.search("champions attack damage")]
+    assert ranked[0] == 3  # Luchador matches all three terms
+    assert set(ranked) == {0, 1, 3, 4}
+
+    filtered = index.search("champions attack damage", positions={1, 4})
+    assert {position for position, _ in filtered} == {1, 4}
+    assert index.search("champions", positions=set()) == []
+    assert index.search("unknownword") == []
+
+
+def test_reciprocal_rank_fusion_orders_by_combined_rank():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [2, 1, 4]])
+    assert [position for position, _ in fused][:2] in ([1, 2], [2, 1])
+    assert fused[0][1] == fused[1][1] < 1.0
+    assert [position for position, _ in fused][2:] == [3, 4]
+
+    first_everywhere = reciprocal_rank_fusion([[7, 1], [7, 2]])
+    assert first_everywhere[0] == (7, pytest.approx(1.0))
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_lexical_search_is_restricted_to_filtered_shards(store, client):
+    calls = client.embedding_calls
+    results = store.lexical_search("champions grants", k=5, filters={"type": "trait"})
+    assert set(ids(results)) == {"luchador", "star_guardian"}
+    assert results[0][1] == 1.0
+    assert client.embedding_calls == calls
+
+
+def test_hybrid_search_skips_embedding_for_a_decisive_named_entity(store, client):
+    calls = client.embedding_calls
+    results = store.hybrid_search("What does Warmog's Armor do?", k=3)
+    assert ids(results)[0] == "warmogs_armor"
+    assert client.embedding_calls == calls
+
+
+def test_hybrid_search_embeds_queries_without_a_decisive_match(store, client):
+    calls = client.embedding_calls
+    results = store.hybrid_search("Which item grants stacking attack speed?", k=3)
+    assert ids(results)[0] == "guinsoos_rageblade"
+    assert client.embedding_calls == calls + 1
+
+    # Two named entities are never decisive, even when BM25 agrees on the first
+    store.hybrid_search("Warmog's Armor or Infinity Edge?", k=3)
+    assert client.embedding_calls == calls + 2
+
+
+def test_hybrid_search_respects_filters(store):
+    results = store.hybrid_search("grants champions attack", k=5, filters={"type": "item"})
+    assert results
+    assert all(doc["metadata"]["type"] == "item" for doc, _ in results)
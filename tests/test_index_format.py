@@ -0,0 +1,100 @@
+import faiss
+import numpy as np
+import pytest
+
+from index_backends import INDEX_TYPES, unwrap_ivf
+from index_format import INDEX_FILE_SUFFIX, IndexFormatError, read_index_file, write_index_file
+from tests.conftest import filler_documents
+
+
+def test_sections_round_trip(tmp_path):
+    path = str(tmp_path / f"index{INDEX_FILE_SUFFIX}")
+    vectors = np.random.default_rng(0).random((5, 8), dtype=np.float32)
+    ids = np.arange(5, dtype=np.int64)
+    write_index_file(path, {"model": "test", "count": 5},
+                     {"vectors": vectors, "ids": ids, "empty": np.empty((0, 8), dtype=np.float32),
+                      "documents": b'[{"content": "x"}]'})
+
+    metadata, sections = read_index_file(path)
+    assert metadata == {"model": "test", "count": 5}
+    np.testing.assert_array_equal(sections["vectors"], vectors)
+    np.testing.assert_array_equal(sections["ids"], ids)
+    assert sections["empty"].shape == (0, 8)
+    assert sections["documents"] == b'[{"content": "x"}]'
+    # Array sections are memory-mapped from the file, not copied into memory
+    assert isinstance(sections["vectors"], np.memmap)
+    assert not sections["vectors"].flags.writeable
+
+
+def test_corrupted_section_fails_its_checksum(tmp_path):
+    path = str(tmp_path / f"index{INDEX_FILE_SUFFIX}")
+    write_index_file(path, {}, {"vectors": np.ones((4, 4), dtype=np.float32)})
+    _, sections = read_index_file(path)
+    offset = sections["vectors"].offset
+    del sections
+
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(b"\x00\x00\x00\x00")
+    with pytest.raises(IndexFormatError, match="Checksum mismatch in section 'vectors'"):
+        read_index_file(path)
+    # Verification can be skipped, e.g. for a file already checked by another process
+    _, sections = read_index_file(path, verify=False)
+    assert sections["vectors"][0, 0] == 0.0
+
+
+def test_foreign_files_are_rejected(tmp_path):
+    path = tmp_path / f"index{INDEX_FILE_SUFFIX}"
+    path.write_bytes(b"not an index file at all")
+    with pytest.raises(IndexFormatError):
+        read_index_file(str(path))
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_vector_store_round_trip(make_store, documents, tmp_path, index_type):
+    # Enough items for the item shard to be trained as sq8 or ivfpq
+    corpus = documents + filler_documents(300)
+    store = make_store(index_type=index_type)
+    store.build_index(corpus, store.create_embeddings(corpus))
+    before = store.search("critical strike damage", k=3)
+    store.save_index(str(tmp_path / "tft15_index"))
+
+    loaded = make_store()
+    loaded.load_index(str(tmp_path / "tft15_index"))
+    assert loaded.index_type == index_type
+    assert loaded.documents == corpus
+    assert loaded.fingerprint == store.fingerprint
+    assert not loaded._shards  # Shards are only built when a search needs them
+    after = loaded.search("critical strike damage", k=3)
+    assert [doc for doc, _ in after] == [doc for doc, _ in before]
+    assert [score for _, score in after] == pytest.approx([score for _, score in before], abs=1e-5)
+
+
+def test_ivf_indexes_saved_inside_an_id_map_are_unwrapped():
+    vectors = np.random.default_rng(0).standard_normal((300, 64)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    ids = np.arange(1000, 1300, dtype=np.int64)
+    ivf = faiss.IndexIVFPQ(faiss.IndexFlatIP(64), 64, 4, 4, 8, faiss.METRIC_INNER_PRODUCT)
+    ivf.pq.cp.min_points_per_centroid = 1
+    ivf.train(vectors)
+    wrapped = faiss.IndexIDMap2(ivf)
+    wrapped.add_with_ids(vectors, ids)
+
+    index = unwrap_ivf(faiss.deserialize_index(faiss.serialize_index(wrapped)))
+    assert isinstance(index, faiss.IndexIVFPQ)
+    index.nprobe = 4
+    index.remove_ids(ids[:10])
+    _, found = index.search(vectors[10:30], 1)
+    assert index.ntotal == 290
+    assert (found[:, 0] == ids[10:30]).sum() >= 18
+
+
+def test_vector_store_rejects_a_corrupted_index(make_store, documents, tmp_path):
+    store = make_store()
+    store.build_index(documents, store.create_embeddings(documents))
+    store.save_index(str(tmp_path / "tft15_index"))
+
+    path = tmp_path / f"tft15_index{INDEX_FILE_SUFFIX}"
+    path.write_bytes(path.read_bytes().replace(b"Infinity Edge", b"Infinity Edgf"))
+    with pytest.raises(IndexFormatError):
+        make_store().load_index(str(tmp_path / "tft15_index"))
@@ -0,0 +1,30 @@
+import pytest
+
+from intent_router import IntentRouter
+from tests.conftest import make_document
+
+
+@pytest.fixture
+def router(make_store, documents):
+    extra = [make_document("aatrox", "Name: Aatrox\nTier: 1\nTraits: Mighty Mech, Heavyweight\nAbility: ...",
+                           doc_type="champion"),
+             make_document("bastion_crest", "Name: Bastion Crest\nDescription: Gain a Bastion Emblem.",
+                           doc_type="augment")]
+    extra[1]["metadata"]["name"] = "Bastion Crest"
+    store = make_store()
+    store.build_index(documents + extra, store.create_embeddings(documents + extra))
+    return IntentRouter(store, lambda docs: docs)
+
+
+def test_champion_tier_questions_are_routed(router):
+    assert router.route("What tier is Aatrox?") == ("champion_tier", "Aatrox is a Tier 1 champion.")
+
+
+@pytest.mark.parametrize("question", ["Tell me about Aatrox", "What is Aatrox?", "Describe the Aatrox champion"])
+def test_describing_a_champion_goes_to_the_llm(router, question):
+    assert router.route(question) is None
+
+
+def test_descriptions_are_routed(router):
+    assert router.route("What does the Bastion Crest augment do?") == (
+        "description", "Bastion Crest (augment): Gain a Bastion Emblem.")
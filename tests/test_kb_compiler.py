@@ -0,0 +1,133 @@
+import json
+
+import pytest
+
+import kb_compiler
+from kb_compiler import (DELTA_VERSION, KnowledgeBaseSourceError, compile_knowledge_base, read_delta,
+                         stream_section)
+
+SECTION = {
+    "quoted": "She said \"hi\" \\ then\nleft",
+    "unicode": "Café — \U0001F600",
+    "numbers": [0, -12, 3.25, 1e-7, 12345678901234, 6.02e+23],
+    "flags": [True, False, None],
+    "nested": {"list": [{"a": 1}, []], "empty": {}},
+}
+
+
+def write_json(path, value):
+    path.write_text(json.dumps(value, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def champion(set_number, name, tier=1):
+    return {"id": f"TFT{set_number}_{name}", "name": name, "tier": tier}
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    write_json(tmp_path / "tft-champion.json", {"type": "tft-champion", "version": "15.15.1", "data": {
+        "Shop/TFT15_Aatrox": champion(15, "Aatrox"),
+        "Shop/TFT15_Ahri": champion(15, "Ahri", 3),
+        "Shop/TFT14_Zed": champion(14, "Zed"),
+        "TFTSetTutorial/Shop/TFTTutorial_Garen": {"id": "TFTTutorial_Garen", "name": "Garen", "tier": 2},
+    }})
+    write_json(tmp_path / "tft-item.json", {"type": "tft-item", "version": "15.15.1", "data": {
+        "TFT_Item_InfinityEdge": {"id": "TFT_Item_InfinityEdge", "name": "Infinity Edge",
+                                  "description": "Critical strikes deal more damage."},
+        # Items of older sets still in the game keep their old ids
+        "TFT5_Item_Redemption": {"id": "TFT5_Item_Redemption", "name": "Redemption"},
+    }})
+    return tmp_path
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 11])
+def test_values_split_across_chunks_decode_whole(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(kb_compiler, "CHUNK_SIZE", chunk_size)
+    path = write_json(tmp_path / "source.json", {"version": "15.15.1", "data": SECTION, "count": 12.5})
+
+    header = {}
+    assert dict(stream_section(path, "data", header)) == SECTION
+    assert header == {"version": "15.15.1", "count": 12.5}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 64 * 1024])
+def test_array_sections_yield_values(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(kb_compiler, "CHUNK_SIZE", chunk_size)
+    path = write_json(tmp_path / "kb.json", {"documents": SECTION["numbers"], "total": 6})
+    assert [value for _, value in stream_section(path, "documents")] == SECTION["numbers"]
+
+
+def test_truncated_files_are_reported(tmp_path):
+    path = tmp_path / "source.json"
+    path.write_text('{"data": {"a": {"name": "Aatrox"', encoding="utf-8")
+    with pytest.raises(KnowledgeBaseSourceError, match="source.json"):
+        list(stream_section(str(path), "data"))
+
+
+def test_tutorial_and_other_set_entries_are_skipped(data_dir):
+    output = data_dir / "kb.json"
+    summary = compile_knowledge_base(str(data_dir), str(output))
+
+    ids = [doc["metadata"]["id"] for doc in json.loads(output.read_text())["documents"]]
+    assert ids == ["TFT15_Aatrox", "TFT15_Ahri", "TFT_Item_InfinityEdge", "TFT5_Item_Redemption"]
+    assert summary["skipped"] == {"other set": 1, "tutorial": 1}
+    assert summary["added"] == 4 and summary["data_dragon_version"] == "15.15.1"
+
+
+def test_delta_lists_changed_and_removed_documents_only(data_dir):
+    output, delta = data_dir / "kb.json", data_dir / "kb.delta.jsonl"
+    compile_knowledge_base(str(data_dir), str(output), delta_path=str(delta))
+    write_json(data_dir / "tft-champion.json", {"version": "15.15.2", "data": {
+        "Shop/TFT15_Aatrox": champion(15, "Aatrox"),
+        "Shop/TFT15_Ahri": champion(15, "Ahri", 4),
+    }})
+
+    summary = compile_knowledge_base(str(data_dir), str(output), delta_path=str(delta))
+    assert (summary["unchanged"], summary["changed"], summary["removed"], summary["added"]) == (3, 1, 0, 0)
+    lines = [json.loads(line) for line in delta.read_text().splitlines()]
+    assert lines[0] == {"delta_version": DELTA_VERSION, "set": "TFT Set 15"}
+    assert [(line["op"], line["document"]["metadata"]["id"]) for line in lines[1:]] == [("upsert", "TFT15_Ahri")]
+    assert "Tier: 4" in lines[1]["document"]["content"]
+
+    (data_dir / "tft-item.json").unlink()
+    summary = compile_knowledge_base(str(data_dir), str(output), delta_path=str(delta))
+    assert summary["removed"] == 2
+    upserts, removed = read_delta(str(delta))
+    assert upserts == []
+    assert sorted(doc["metadata"]["id"] for doc in removed) == ["TFT5_Item_Redemption", "TFT_Item_InfinityEdge"]
+
+
+def test_unchanged_output_is_not_rewritten(data_dir):
+    output = data_dir / "kb.json"
+    compile_knowledge_base(str(data_dir), str(output))
+    modified = output.stat().st_mtime_ns
+    assert compile_knowledge_base(str(data_dir), str(output))["unchanged"] == 4
+    assert output.stat().st_mtime_ns == modified
+
+
+def test_read_delta_tags_documents_with_the_delta_set(tmp_path):
+    delta = tmp_path / "kb.delta.jsonl"
+    delta.write_text("\n".join(json.dumps(record) for record in [
+        {"delta_version": DELTA_VERSION, "set": "TFT Set 15", "patch": "15.2"},
+        {"op": "upsert", "document": {"content": "Name: Ahri", "metadata": {"id": "TFT15_Ahri"}}},
+        {"op": "upsert", "document": {"content": "Name: Zed", "metadata": {"id": "TFT14_Zed", "set": "TFT Set 14"}}},
+        {"op": "delete", "id": "TFT15_Aatrox"},
+    ]) + "\n\n", encoding="utf-8")
+
+    upserts, removed = read_delta(str(delta))
+    assert [doc["metadata"] for doc in upserts] == [
+        {"id": "TFT15_Ahri", "set": "TFT Set 15", "patch": "15.2"},
+        {"id": "TFT14_Zed", "set": "TFT Set 14", "patch": "15.2"},  # An explicit set is kept
+    ]
+    assert removed == [{"metadata": {"id": "TFT15_Aatrox", "set": "TFT Set 15", "patch": "15.2"}}]
+
+
+def test_read_delta_rejects_other_files(tmp_path):
+    path = tmp_path / "kb.delta.jsonl"
+    path.write_text('{"documents": []}\n', encoding="utf-8")
+    with pytest.raises(KnowledgeBaseSourceError):
+        read_delta(str(path))
+    path.write_text(json.dumps({"delta_version": DELTA_VERSION}) + '\n{"op": "rename"}\n', encoding="utf-8")
+    with pytest.raises(KnowledgeBaseSourceError, match=":2: unknown op"):
+        read_delta(str(path))
@@ -0,0 +1,171 @@
+import threading
+import time
+
+import pytest
+
+from chatbot import DEGRADED_NOTICE
+from mock_openai import FakeServerError
+from resilience import CLOSED, HALF_OPEN, OPEN, AdmissionController, CircuitBreaker, CircuitOpenError, Overloaded
+from telemetry import UPSTREAM_ERRORS
+
+
+def fail_embeddings(client, should_fail=lambda texts: True):
+    """Make the fake client's embeddings endpoint fail for requests whose inputs satisfy `should_fail`"""
+    create = client.embeddings.create
+
+    def flaky(model, input, **kwargs):
+        if should_fail(input):
+            raise FakeServerError("simulated")
+        return create(model=model, input=input, **kwargs)
+
+    client.embeddings.create = flaky
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_after_reset():
+    breaker = CircuitBreaker("upstream", failure_threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(FakeServerError), breaker.call():
+            raise FakeServerError("down")
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError), breaker.call():
+        pass
+    assert breaker.rejected == 1
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one trial call at a time
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_breaker_ignores_cancelled_calls():
+    breaker = CircuitBreaker("upstream", failure_threshold=1)
+    with pytest.raises(KeyboardInterrupt), breaker.call():
+        raise KeyboardInterrupt
+    assert breaker.state == CLOSED
+
+
+def test_admission_sheds_beyond_the_queue():
+    admission = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=0.2)
+    admission.acquire()
+    waiter = threading.Thread(target=lambda: pytest.raises(Overloaded, admission.acquire))
+    waiter.start()
+    while admission.get_stats()["waiting"] == 0:
+        time.sleep(0.001)
+
+    with pytest.raises(Overloaded):
+        admission.acquire()
+    waiter.join()
+    admission.release()
+    assert admission.get_stats() == {"running": 0, "waiting": 0, "admitted": 1, "shed": 2}
+
+
+def test_degraded_answer_does_not_call_the_failing_embedding_upstream_again(make_chatbot, client):
+    breaker = CircuitBreaker("embeddings", failure_threshold=10)
+    chatbot = make_chatbot(completion_breaker=CircuitBreaker("chat_completions"))
+    chatbot.vector_store.embedding_breaker = breaker
+    chatbot.vector_store.embedding_provider.max_retries = 0
+    fail_embeddings(client)
+    client.error_rate = 1.0
+
+    answer = chatbot.get_response("Which item grants stacking attack speed?")
+    assert answer.startswith(DEGRADED_NOTICE)
+    assert "Rageblade" in answer
+    assert breaker._failures == 1
+
+
+def test_hybrid_search_many_falls_back_to_bm25_per_query(make_store, documents, client):
+    store = make_store()
+    store.build_index(documents, store.create_embeddings(documents))
+    store.embedding_provider.max_retries = 0
+    store.embedding_provider.max_batch_size = 1
+    fail_embeddings(client, lambda texts: any("tanks" in text for text in texts))
+
+    queries = ["bonus health for tanks", "critical strike damage"]
+    results, vectors = store.hybrid_search_many(queries, k=2)
+    assert results[0] == store.lexical_search(queries[0], k=2)
+    assert results[0][0][0]["metadata"]["id"] == "warmogs_armor"
+    assert vectors[0] is None
+    assert results[1][0][0]["metadata"]["id"] == "infinity_edge"
+    assert vectors[1] is not None
+
+
+def test_hybrid_search_many_survives_an_open_circuit(make_store, documents):
+    store = make_store()
+    store.build_index(documents, store.create_embeddings(documents))
+    store.embedding_breaker = CircuitBreaker("embeddings", failure_threshold=1)
+    store.embedding_breaker.record_failure()
+
+    results, vectors = store.hybrid_search_many(["bonus health for tanks", "critical strike damage"], k=1)
+    assert [r[0][0]["metadata"]["id"] for r in results] == ["warmogs_armor", "infinity_edge"]
+    assert vectors == [None, None]
+
+
+def test_batch_completions_take_an_admission_slot_each(make_chatbot, client):
+    client.completion_latency = 0.05
+    admission = AdmissionController(max_concurrency=4, max_queue=8)
+    admission.acquire()  # Held by the batch request
+    running = []
+    create = client.chat.completions.create
+
+    def counting(**kwargs):
+        running.append(admission.get_stats()["running"])
+        return create(**kwargs)
+
+    client.chat.completions.create = counting
+    questions = [f"Which item grants stacking attack speed? ({i})" for i in range(6)]
+    results = list(make_chatbot().answer_batch(questions, max_concurrency=3, admission=admission))
+    admission.release()
+
+    assert all("answer" in result for result in results)
+    # Three completions in flight hold the batch's slot and two of their own
+    assert max(running) == 3
+    assert admission.get_stats()["running"] == 0
+
+
+def test_batch_questions_beyond_the_admission_limits_are_shed(make_chatbot, client):
+    client.completion_latency = 0.05
+    admission = AdmissionController(max_concurrency=1, max_queue=0)
+    admission.acquire()
+    questions = [f"Which item grants stacking attack speed? ({i})" for i in range(4)]
+    results = list(make_chatbot().answer_batch(questions, max_concurrency=2, admission=admission))
+    admission.release()
+
+    shed = [result for result in results if "error" in result]
+    assert shed and all(result["retry_after"] == admission.retry_after for result in shed)
+    assert len(results) - len(shed) >= 1
+
+
+def test_each_failed_embedding_call_is_counted_once(make_store, documents, client):
+    store = make_store(query_cache=None)
+    store.build_index(documents, store.create_embeddings(documents))
+    store.embedding_provider.max_retries = 0
+    store.embedding_breaker = CircuitBreaker("embeddings", failure_threshold=2)
+    fail_embeddings(client)
+    before = UPSTREAM_ERRORS.value(upstream="embeddings", error="FakeServerError")
+
+    with pytest.raises(FakeServerError):
+        store.embed_query("bonus health for tanks")
+    assert UPSTREAM_ERRORS.value(upstream="embeddings", error="FakeServerError") == before + 1
+    with pytest.raises(RuntimeError):
+        store.embed_queries(["critical strike damage"])
+    assert UPSTREAM_ERRORS.value(upstream="embeddings", error="FakeServerError") == before + 2
+
+    # The breaker is now open: refused calls are rejections, not upstream errors
+    with pytest.raises(CircuitOpenError):
+        store.embed_query("bonus health for tanks")
+    assert UPSTREAM_ERRORS.value(upstream="embeddings", error="CircuitOpenError") == 0
+    assert UPSTREAM_ERRORS.value(upstream="embeddings", error="FakeServerError") == before + 2
+    assert store.embedding_breaker.rejected == 1
+
+
+def test_refused_completions_are_not_upstream_errors(make_chatbot):
+    breaker = CircuitBreaker("chat_completions", failure_threshold=1)
+    breaker.record_failure()
+    chatbot = make_chatbot(completion_breaker=breaker)
+
+    answer = chatbot.get_response("Which item grants stacking attack speed?")
+    assert answer.startswith(DEGRADED_NOTICE)
+    assert UPSTREAM_ERRORS.value(upstream="chat_completions", error="CircuitOpenError") == 0
+    assert breaker.rejected == 1
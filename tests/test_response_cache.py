@@ -0,0 +1,111 @@
+import numpy as np
+
+from context_builder import context_fingerprint, document_key
+from mock_openai import fake_embedding
+from response_cache import SemanticResponseCache
+from tests.conftest import DIMENSION
+
+CONTEXT = "context-a"
+
+
+def vector(text):
+    return np.array(fake_embedding(text, DIMENSION), dtype=np.float32)
+
+
+def test_same_question_hits_by_text():
+    cache = SemanticResponseCache()
+    cache.put("What does Infinity Edge do?", "Crits.", CONTEXT, "kb1")
+    assert cache.lookup("what does infinity edge do", CONTEXT, "kb1") == "Crits."
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_paraphrase_hits_by_similarity():
+    cache = SemanticResponseCache(threshold=0.8)
+    cache.put("What does Infinity Edge do?", "Crits.", CONTEXT, "kb1", latency=1.5,
+              query_vector=vector("What does Infinity Edge do?"))
+    paraphrase = "What does the Infinity Edge do?"
+    assert float(vector(paraphrase) @ vector("What does Infinity Edge do?")) >= 0.8
+
+    assert cache.lookup(paraphrase, CONTEXT, "kb1", vector(paraphrase)) == "Crits."
+    assert cache.get_stats()["latency_saved_seconds"] == 1.5
+
+
+def test_dissimilar_question_misses():
+    cache = SemanticResponseCache(threshold=0.95)
+    cache.put("What does Infinity Edge do?", "Crits.", CONTEXT, "kb1", query_vector=vector("What does Infinity Edge do?"))
+    assert cache.lookup("Which items suit tanks?", CONTEXT, "kb1", vector("Which items suit tanks?")) is None
+    assert cache.get_stats()["hit_rate"] == 0.0
+
+
+def test_other_context_misses():
+    cache = SemanticResponseCache(threshold=0.8)
+    question = "What does Infinity Edge do?"
+    cache.put(question, "Crits.", CONTEXT, "kb1", query_vector=vector(question))
+    assert cache.lookup(question, "context-b", "kb1", vector(question)) is None
+
+
+def test_knowledge_base_change_invalidates():
+    cache = SemanticResponseCache()
+    cache.put("What does Infinity Edge do?", "Crits.", CONTEXT, "kb1")
+    assert cache.lookup("What does Infinity Edge do?", CONTEXT, "kb2") is None
+    assert len(cache) == 0 and cache.invalidations == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = SemanticResponseCache(max_entries=2)
+    for question in ("one", "two"):
+        cache.put(question, question.upper(), CONTEXT, "kb1", query_vector=vector(question))
+    cache.lookup("one", CONTEXT, "kb1")
+    cache.put("three", "THREE", CONTEXT, "kb1", query_vector=vector("three"))
+
+    assert cache.lookup("two", CONTEXT, "kb1") is None
+    assert cache.lookup("one", CONTEXT, "kb1") == "ONE"
+    assert cache.index.ntotal == 2
+
+
+def test_expired_entries_miss():
+    cache = SemanticResponseCache(ttl_seconds=0)
+    cache.put("What does Infinity Edge do?", "Crits.", CONTEXT, "kb1")
+    assert cache.lookup("What does Infinity Edge do?", CONTEXT, "kb1") is None
+
+
+def test_context_fingerprint_ignores_relevance_scores(documents, make_chatbot):
+    chatbot = make_chatbot()
+    first, first_fingerprint = chatbot._build_context([(documents[0], 0.91), (documents[1], 0.52)])
+    second, second_fingerprint = chatbot._build_context([(documents[0], 0.87), (documents[1], 0.60)])
+    assert first != second
+    assert first_fingerprint == second_fingerprint == context_fingerprint([document_key(documents[0]),
+                                                                           document_key(documents[1])])
+    # Order matters: the documents are presented differently
+    assert chatbot._build_context([(documents[1], 0.9), (documents[0], 0.5)])[1] != first_fingerprint
+
+
+def test_repeated_question_is_answered_from_the_cache(make_chatbot, client):
+    chatbot = make_chatbot(response_cache=SemanticResponseCache(threshold=0.9))
+    answer = chatbot.get_response("Which item grants stacking attack speed?", session_id="a")
+    calls = client.completion_calls
+
+    assert chatbot.get_response("Which item grants the stacking attack speed?", session_id="b") == answer
+    assert client.completion_calls == calls
+    assert chatbot.response_cache.get_stats()["hits"] == 1
+
+
+def test_cache_lookup_never_embeds_the_question(make_chatbot, client):
+    chatbot = make_chatbot(response_cache=SemanticResponseCache(), query_cache=False)
+    calls = client.embedding_calls
+    chatbot.get_response("Which item grants stacking attack speed?")
+    # The retrieval embedding only; without a query cache there is no vector to reuse
+    assert client.embedding_calls == calls + 1
+    assert chatbot.response_cache.index is None  # Cached by question text only
+
+
+def test_follow_ups_are_not_shared_across_conversations(make_chatbot, client):
+    chatbot = make_chatbot(response_cache=SemanticResponseCache())
+    chatbot.get_response("Tell me about Guinsoo's Rageblade", session_id="a")
+    chatbot.get_response("Tell me about Warmog's Armor", session_id="b")
+    calls = client.completion_calls
+
+    chatbot.get_response("Is it good early?", session_id="a")
+    chatbot.get_response("Is it good early?", session_id="b")
+    assert client.completion_calls == calls + 2
+    assert chatbot.response_cache.get_stats()["hits"] == 0
@@ -0,0 +1,169 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import async_server
+import backend_server
+from chatbot import DEGRADED_NOTICE, TFTChatbotManager
+from kb_compiler import DELTA_VERSION
+from mock_openai import FakeServerError
+from tests.conftest import make_document
+
+
+@pytest.fixture
+def kb_manager(make_chatbot, tmp_path):
+    """Manager serving the test documents, with its index saved under tmp_path"""
+    manager = TFTChatbotManager("test-key")
+    manager.chatbot = make_chatbot()
+    manager.vector_store = manager.chatbot.vector_store
+    manager.index_path = str(tmp_path / "tft15_index")
+    manager.vector_store.save_index(manager.index_path)
+    return manager
+
+
+@pytest.fixture
+def flask_client(kb_manager, monkeypatch):
+    monkeypatch.setattr(backend_server, "chatbot_manager", kb_manager)
+    return backend_server.app.test_client()
+
+
+def write_delta(path, *records):
+    path.write_text("\n".join(json.dumps(record) for record in [{"delta_version": DELTA_VERSION}, *records]) + "\n")
+    return str(path)
+
+
+def test_knowledge_base_info_revalidates_with_its_etag(flask_client):
+    response = flask_client.get("/api/knowledge-base-info")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    assert response.get_json()["total_documents"] == 5
+
+    revalidated = flask_client.get("/api/knowledge-base-info", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b""
+    assert revalidated.headers["ETag"] == etag
+    assert flask_client.get("/api/knowledge-base-info", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_etag_changes_after_a_sync(flask_client, kb_manager, tmp_path):
+    etag = flask_client.get("/api/knowledge-base-info").headers["ETag"]
+    new = make_document("bloodthirster", "Item: Bloodthirster grants omnivamp and a shield.")
+    kb_manager.sync_knowledge_base(write_delta(tmp_path / "kb.delta.jsonl", {"op": "upsert", "document": new}))
+
+    response = flask_client.get("/api/knowledge-base-info", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json()["total_documents"] == 6
+
+
+def test_etag_changes_after_a_reload(flask_client, kb_manager, make_store, documents):
+    etag = flask_client.get("/api/knowledge-base-info").headers["ETag"]
+    # Another process rebuilds the index on disk
+    rebuilt = make_store()
+    rebuilt.build_index(documents[:3], rebuilt.create_embeddings(documents[:3]))
+    rebuilt.save_index(kb_manager.index_path)
+    assert kb_manager.reload_index()
+
+    response = flask_client.get("/api/knowledge-base-info", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json()["total_documents"] == 3
+
+
+def test_async_knowledge_base_info_revalidates_with_its_etag(kb_manager):
+    async def close():
+        pass
+
+    kb_manager.chatbot.async_client = SimpleNamespace(close=close)  # Closed on app cleanup
+
+    async def scenario():
+        async with TestClient(TestServer(async_server.create_app(kb_manager))) as client:
+            response = await client.get("/api/knowledge-base-info")
+            etag = response.headers["ETag"]
+            assert response.status == 200 and (await response.json())["total_documents"] == 5
+
+            revalidated = await client.get("/api/knowledge-base-info", headers={"If-None-Match": etag})
+            assert revalidated.status == 304
+            assert await revalidated.read() == b""
+
+            kb_manager.vector_store.apply_delta([make_document("bloodthirster", "Item: Bloodthirster")], [])
+            response = await client.get("/api/knowledge-base-info", headers={"If-None-Match": etag})
+            assert response.status == 200 and response.headers["ETag"] != etag
+
+    asyncio.run(scenario())
+
+
+def test_batch_endpoint_streams_one_answer_per_question(flask_client):
+    body = '{"id": "rageblade", "question": "Which item grants stacking attack speed?"}\n"What is Luchador?"\n'
+    response = flask_client.post("/api/chat/batch", data=body, content_type="application/x-ndjson")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+
+    results = {result["id"]: result for result in map(json.loads, response.get_data(as_text=True).splitlines())}
+    assert set(results) == {"rageblade", 1}
+    assert results["rageblade"]["index"] == 0 and "error" not in results["rageblade"]
+    assert results["rageblade"]["answer"]
+
+
+@pytest.mark.parametrize("body, status, error", [
+    ('"fine"\n{broken\n', 400, "Line 2: invalid JSON"),
+    ("\n\n", 400, "At least one question is required"),
+    ('"a"\n"b"\n"c"\n', 413, "At most 2 questions per batch"),
+])
+def test_batch_endpoint_rejects_bad_bodies(flask_client, monkeypatch, body, status, error):
+    monkeypatch.setenv("TFT_BATCH_MAX_QUESTIONS", "2")
+    response = flask_client.post("/api/chat/batch", data=body, content_type="application/x-ndjson")
+    assert response.status_code == status
+    assert response.get_json()["error"].startswith(error)
+
+
+def read_events(response):
+    """(event, data) pairs of a Server-Sent Events body; unnamed events are "message" events"""
+    events = []
+    for block in response.get_data(as_text=True).split("\n\n"):
+        if not block:
+            continue
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+def test_chat_stream_sends_deltas_then_done(flask_client):
+    response = flask_client.post("/api/chat/stream", json={"message": "Which item grants stacking attack speed?"})
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    session_id = response.headers["X-Session-ID"]
+
+    events = read_events(response)
+    assert events[-1] == ("done", {"session_id": session_id})
+    deltas = events[:-1]
+    assert len(deltas) > 1
+    assert all(event == "message" and set(data) == {"delta"} for event, data in deltas)
+    assert "".join(data["delta"] for _, data in deltas).strip()
+
+
+def test_chat_stream_degrades_when_the_completion_fails_up_front(flask_client, client):
+    client.error_rate = 1.0
+    events = read_events(flask_client.post("/api/chat/stream", json={"message": "What is Luchador?"}))
+    assert events[0][1]["delta"].startswith(DEGRADED_NOTICE)
+    assert events[-1][0] == "done"
+
+
+def test_chat_stream_ends_with_an_error_event_when_the_stream_breaks(flask_client, kb_manager):
+    def broken_stream(message, session_id):
+        yield "Luchador champions "
+        raise FakeServerError("connection reset mid-stream")
+
+    kb_manager.chatbot.stream_response = broken_stream
+    events = read_events(flask_client.post("/api/chat/stream", json={"message": "What is Luchador?"}))
+    assert events == [("message", {"delta": "Luchador champions "}),
+                      ("error", {"error": "Internal server error"})]
+
+
+def test_chat_stream_requires_a_message(flask_client):
+    response = flask_client.post("/api/chat/stream", json={"message": "  "})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Message is required"}
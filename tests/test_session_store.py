@@ -0,0 +1,68 @@
+import time
+
+from session_store import SessionStore, SQLiteSessionBackend
+
+
+def test_history_keeps_the_last_turns():
+    store = SessionStore(max_turns=2)
+    for turn in range(3):
+        store.append("a", f"question {turn}", f"answer {turn}")
+    assert [m["content"] for m in store.history("a")] == ["question 1", "answer 1", "question 2", "answer 2"]
+    assert [m["content"] for m in store.history("a", limit=1)] == ["answer 2"]
+
+
+def test_reading_an_unknown_session_creates_nothing(tmp_path):
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"))
+    store = SessionStore(backend=backend)
+    assert store.history("nobody") == []
+    assert len(store) == 0
+    assert backend.load("nobody") is None
+
+
+def test_sessions_are_independent():
+    store = SessionStore()
+    store.append("a", "qa", "aa")
+    store.append("b", "qb", "ab")
+    assert [m["content"] for m in store.history("a")] == ["qa", "aa"]
+    store.clear("a")
+    assert store.history("a") == [] and len(store) == 1
+
+
+def test_memory_cap_holds_across_shards():
+    # Each exchange holds 10 + 4 + 10 + 9 = 33 bytes; three fit under the cap
+    store = SessionStore(max_bytes=100, shards=16)
+    for number in range(8):
+        store.append(f"session{number}", "q" * 10, "a" * 10)
+        time.sleep(0.001)
+    assert store.size <= 100
+    assert len(store) == 3
+    assert store.get_stats()["evictions"] == 5
+    # Least recently used sessions went first, whichever shard they were in
+    assert store.history("session0") == []
+    assert store.history("session7") != []
+
+
+def test_a_session_alone_over_the_cap_is_kept():
+    store = SessionStore(max_bytes=10)
+    store.append("a", "q" * 50, "a" * 50)
+    assert len(store.history("a")) == 2
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(ttl_seconds=0.01)
+    store.append("a", "q", "a")
+    time.sleep(0.02)
+    assert store.history("a") == []
+    assert store.get_stats()["expirations"] == 1
+
+
+def test_evicted_sessions_reload_from_the_backend(tmp_path):
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"))
+    store = SessionStore(max_bytes=40, backend=backend)
+    store.append("a", "q" * 10, "a" * 10)
+    store.append("b", "q" * 10, "a" * 10)
+    assert len(store) == 1
+
+    assert [m["content"] for m in store.history("a")] == ["q" * 10, "a" * 10]
+    restarted = SessionStore(backend=backend)
+    assert len(restarted.history("b")) == 2
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import SingleFlight
+
+QUESTION = "Which item grants stacking attack speed?"
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.1)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        leader = executor.submit(flight.do, "key", slow)
+        started.wait()
+        followers = [executor.submit(flight.do, "key", slow) for _ in range(3)]
+        assert leader.result() == ("result", False)
+        assert [f.result() for f in followers] == [("result", True)] * 3
+    assert flight.get_stats()["executions"] == 1
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+    executions = []
+
+    async def slow():
+        executions.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        leader = asyncio.create_task(flight.ado("key", slow))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.ado("key", slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == ("result", True)
+    assert executions == [1]
+
+
+def test_call_is_cancelled_once_nobody_waits():
+    flight = SingleFlight()
+    finished = []
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+
+    async def scenario():
+        leader = asyncio.create_task(flight.ado("key", slow))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert finished == []
+    assert flight.get_stats()["in_flight"] == 0
+
+
+def test_coalesced_request_in_the_leaders_session_is_recorded_once(manager):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        answers = [executor.submit(manager.get_response, QUESTION, "same") for _ in range(2)]
+        time.sleep(0.01)
+        answers = [answer.result() for answer in answers]
+    assert manager.single_flight.coalesced == 1
+    assert [m["content"] for m in manager.chatbot.sessions.history("same")] == [QUESTION, answers[0]]
+
+
+def test_coalesced_request_is_recorded_in_its_own_session(manager):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        answers = [executor.submit(manager.get_response, QUESTION, session) for session in ("a", "b")]
+        answers = [answer.result() for answer in answers]
+    assert manager.single_flight.coalesced == 1
+    for session in ("a", "b"):
+        assert len(manager.chatbot.sessions.history(session)) == 2
+
+
+def test_coalescing_key_creates_no_session(manager):
+    manager._coalescing_key(QUESTION, "unknown")
+    assert len(manager.chatbot.sessions) == 0
+
+
+def test_async_followers_survive_a_cancelled_leader(manager):
+    async def scenario():
+        leader = asyncio.create_task(manager.aget_response(QUESTION, "leader"))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(manager.aget_response(QUESTION, "follower"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    answer = asyncio.run(scenario())
+    assert answer.startswith("Based on the knowledge base")
+    assert [m["content"] for m in manager.chatbot.sessions.history("follower")] == [QUESTION, answer]
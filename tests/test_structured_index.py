@@ -0,0 +1,61 @@
+from structured_index import StructuredIndex
+
+
+def document(name: str, doc_type: str, content: str):
+    return {"content": content, "metadata": {"name": name, "type": doc_type}}
+
+
+def names(docs):
+    return [doc["metadata"]["name"] for doc in docs]
+
+
+DOCUMENTS = [
+    document("Ezreal", "champion", "Tier: 1\nTraits: Battle Academia, Prodigy"),
+    document("Garen", "champion", "Tier: 1\nTraits: Battle Academia, Bastion"),
+    document("Jinx", "champion", "Tier: 4\nTraits: Star Guardian, Sniper"),
+    document("Battle Academia", "trait", "Battle Academia champions gain Potential."),
+    document("Battle Academia Emblem", "item", "The holder gains the Battle Academia trait."),
+    document("Bastion", "trait", "Bastion champions gain armor."),
+    document("Bastion Crest", "augment", "Your Bastion Crest champions gain resistances."),
+    document("Star Guardian", "trait", "Star Guardian champions share mana."),
+    document("Starter Kit", "augment", "Gain a Star Guardian Emblem-free start with Ezreal."),
+]
+
+
+def test_champions_by_tier_and_documents_by_type():
+    index = StructuredIndex(DOCUMENTS)
+    assert names(index.champions_with_tier(1)) == ["Ezreal", "Garen"]
+    assert names(index.champions_with_tier(4)) == ["Jinx"]
+    assert index.champions_with_tier(5) == []
+    assert names(index.documents_of_type("trait")) == ["Battle Academia", "Bastion", "Star Guardian"]
+    assert index.documents_of_type("unknown") == []
+
+
+def test_find_by_name_is_case_insensitive_and_filters_by_type():
+    index = StructuredIndex(DOCUMENTS)
+    assert names(index.find_by_name("bastion CREST")) == ["Bastion Crest"]
+    assert index.find_by_name("Bastion Crest", doc_type="trait") == []
+
+
+def test_longest_name_wins_over_its_prefix():
+    index = StructuredIndex(DOCUMENTS)
+    assert index.names_in("Is Bastion Crest better than Bastion?") == ["bastion crest", "bastion"]
+    assert index.names_in("Who carries Battle Academia Emblem?") == ["battle academia emblem"]
+    # Names only match on word boundaries
+    assert index.names_in("Garenfield and Jinxed") == []
+
+
+def test_mentions_include_names_nested_in_longer_names():
+    index = StructuredIndex(DOCUMENTS)
+    assert names(index.documents_mentioning("Battle Academia")) == ["Ezreal", "Garen", "Battle Academia Emblem"]
+    assert names(index.documents_mentioning("Battle Academia", doc_type="champion")) == ["Ezreal", "Garen"]
+    # A document does not mention itself, even through a nested name
+    assert "Bastion Crest" not in names(index.documents_mentioning("Bastion Crest"))
+    assert names(index.documents_mentioning("Bastion")) == ["Garen", "Bastion Crest"]
+    assert names(index.documents_mentioning("Ezreal")) == ["Starter Kit"]
+
+
+def test_empty_index_finds_nothing():
+    index = StructuredIndex([])
+    assert index.names_in("Bastion") == []
+    assert index.documents_mentioning("Bastion") == []
@@ -0,0 +1,153 @@
+import copy
+
+import faiss
+import numpy as np
+import pytest
+
+from index_backends import INDEX_TYPES, index_ids
+from tests.conftest import filler_documents, make_document
+
+# Enough items for the item shard to be trained as sq8 or ivfpq when asked for
+FILLERS = 300
+
+
+@pytest.fixture(params=INDEX_TYPES)
+def index_type(request):
+    return request.param
+
+
+@pytest.fixture
+def corpus(documents):
+    return documents + filler_documents(FILLERS)
+
+
+@pytest.fixture
+def store(make_store, corpus, index_type):
+    store = make_store(index_type=index_type)
+    store.build_index(corpus, store.create_embeddings(corpus))
+    return store
+
+
+def indexed_ids(store):
+    """Document id -> shard key of every vector in the index"""
+    located = {}
+    for key in store.shard_keys:
+        for faiss_id in index_ids(store._shard(key)):
+            located[store.documents[store._positions[int(faiss_id)]]["metadata"]["id"]] = key
+    return located
+
+
+def top_id(store, query, **filters):
+    return store.search(query, k=1, filters=filters or None)[0][0]["metadata"]["id"]
+
+
+def self_hits(store):
+    """Documents found first when searched with their own content"""
+    return sum(top_id(store, doc["content"]) == doc["metadata"]["id"] for doc in store.documents)
+
+
+def test_item_shard_is_built_with_the_requested_type(store, index_type):
+    index = store._shard(("15", "15.1", "item"))
+    assert isinstance(index, faiss.IndexIVF) == (index_type == "ivfpq")
+    # A trained quantized index must not be wrapped in an id map it can't keep in step
+    assert not isinstance(index, faiss.IndexIDMap) or not isinstance(faiss.downcast_index(index.index),
+                                                                     faiss.IndexIVF)
+
+
+def test_added_documents_are_the_only_ones_embedded(store, corpus, client):
+    inputs = client.embedded_inputs
+    new = make_document("bloodthirster", "Item: Bloodthirster grants omnivamp and a shield.")
+    summary = store.sync(corpus + [new])
+
+    assert summary == {"added": 1, "removed": 0, "changed": 0, "unchanged": len(corpus)}
+    assert client.embedded_inputs == inputs + 1
+    assert top_id(store, new["content"]) == "bloodthirster"
+    assert len(indexed_ids(store)) == len(corpus) + 1
+
+
+def test_removed_documents_leave_the_index(store, corpus, client):
+    inputs = client.embedded_inputs
+    summary = store.sync([doc for doc in corpus if doc["metadata"]["type"] != "trait"])
+
+    assert summary == {"added": 0, "removed": 2, "changed": 0, "unchanged": len(corpus) - 2}
+    assert client.embedded_inputs == inputs
+    assert not {"luchador", "star_guardian"} & set(indexed_ids(store))
+    # The trait shard emptied and is gone
+    assert all(key[2] != "trait" for key in store.shard_keys)
+
+
+def test_search_still_finds_every_document_after_removals(store, corpus):
+    before = self_hits(store)
+    store.sync(corpus[:3] + corpus[3 + 40:])
+
+    assert len(indexed_ids(store)) == len(corpus) - 40
+    assert self_hits(store) >= before - 40
+    assert self_hits(store) >= 0.9 * len(store.documents)
+
+
+def test_changed_content_is_replaced_under_the_same_id(store, corpus):
+    faiss_id = store.ids[0]
+    edited = copy.deepcopy(corpus)
+    edited[0]["content"] = "Item: Infinity Edge now grants mana regeneration."
+    summary = store.sync(edited)
+
+    assert summary["changed"] == 1 and summary["unchanged"] == len(corpus) - 1
+    assert store.ids[0] == faiss_id
+    assert top_id(store, edited[0]["content"]) == "infinity_edge"
+    assert len(indexed_ids(store)) == len(corpus)
+
+
+def test_documents_moving_shard_are_searched_in_the_new_one(store, corpus):
+    moved = copy.deepcopy(corpus)
+    moved[0]["metadata"]["type"] = "trait"
+    summary = store.sync(moved)
+
+    assert summary["changed"] == 1
+    assert indexed_ids(store)["infinity_edge"] == ("15", "15.1", "trait")
+    assert top_id(store, "critical strike damage", type="trait") == "infinity_edge"
+    assert "infinity_edge" not in [doc["metadata"]["id"] for doc, _ in
+                                   store.search("critical strike damage", k=5, filters={"type": "item"})]
+
+
+def test_metadata_only_edits_are_not_embedded(store, corpus, client):
+    inputs = client.embedded_inputs
+    edited = copy.deepcopy(corpus)
+    edited[1]["metadata"]["name"] = "Guinsoo's Rageblade (reworked)"
+    summary = store.sync(edited)
+
+    assert summary == {"added": 0, "removed": 0, "changed": 0, "unchanged": len(corpus)}
+    assert client.embedded_inputs == inputs
+    assert store.documents[1]["metadata"]["name"] == "Guinsoo's Rageblade (reworked)"
+
+
+def test_failed_sync_leaves_the_index_untouched(store, corpus, monkeypatch):
+    fingerprint, ids = store.fingerprint, list(store.ids)
+    monkeypatch.setattr(store, "create_embeddings", lambda docs: [[1.0, 0.0] for _ in docs])
+    edited = corpus[1:] + [make_document("new", "Item: something new")]
+
+    with pytest.raises(ValueError, match="dimension"):
+        store.sync(edited)
+    assert store.fingerprint == fingerprint and store.ids == ids
+    assert set(indexed_ids(store)) == {doc["metadata"]["id"] for doc in corpus}
+
+
+def test_apply_delta(store, corpus):
+    upsert = make_document("bloodthirster", "Item: Bloodthirster grants omnivamp and a shield.")
+    summary = store.apply_delta([upsert], [corpus[2]])
+
+    assert summary == {"added": 1, "removed": 1, "changed": 0, "unchanged": len(corpus) - 1}
+    assert "warmogs_armor" not in indexed_ids(store)
+    assert top_id(store, upsert["content"]) == "bloodthirster"
+
+
+def test_sync_of_a_loaded_index(store, corpus, make_store, tmp_path):
+    store.save_index(str(tmp_path / "index"))
+    loaded = make_store()
+    loaded.load_index(str(tmp_path / "index"))
+    new = make_document("bloodthirster", "Item: Bloodthirster grants omnivamp and a shield.")
+
+    assert loaded.sync(corpus[1:] + [new])["added"] == 1
+    assert top_id(loaded, new["content"]) == "bloodthirster"
+    assert loaded.ids[-1] == max(store.ids) + 1
+    assert np.isin(loaded.ids, store.ids[1:] + [max(store.ids) + 1]).all()
+    assert self_hits(loaded) >= 0.9 * len(loaded.documents)
@@ -0,0 +1,23 @@
+import os
+
+from telemetry import Registry
+
+
+def test_worker_label_is_added_and_preforked_counts_dropped():
+    registry = Registry()
+    requests = registry.counter("tft_test_requests_total", "Requests", ["mode"])
+    latency = registry.histogram("tft_test_seconds", "Latency", buckets=[1.0])
+    registry.register_collector("test", lambda: [("tft_test_running", "gauge", "Running", [({}, 2)])])
+    requests.inc(mode="sync")
+    latency.observe(0.5)
+
+    registry.label_worker()
+    assert requests.value(mode="sync") == 0
+    requests.inc(mode="async")
+    text = registry.render()
+    worker = f'worker="{os.getpid()}"'
+
+    assert f'tft_test_requests_total{{{worker},mode="async"}} 1' in text
+    assert 'mode="sync"' not in text
+    assert "tft_test_seconds_count" not in text
+    assert f"tft_test_running{{{worker}}} 2" in text
@@ -1,60 +1,317 @@
 import faiss
+import hashlib
+import heapq
+import json
 import numpy as np
 import pickle
 import os
-from typing import List, Dict, Tuple
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from functools import partial
+from typing import Callable, Iterable, List, Dict, Tuple, Optional, Union
 import logging
-from openai import OpenAI
 import tiktoken
 
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from embedding_providers import EmbeddingProvider, OpenAIEmbeddingProvider, OPENAI_EMBEDDING_MODEL
+from index_backends import DEFAULT_NPROBE, create_index, set_nprobe, unwrap_ivf
+from index_format import INDEX_FILE_SUFFIX, IndexFormatError, read_index_file, write_index_file
+from structured_index import StructuredIndex
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from resilience import CircuitBreaker, CircuitOpenError
+from telemetry import UPSTREAM_ERRORS, stage
+
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL = OPENAI_EMBEDDING_MODEL  # Default embedding model
+
+# Hybrid retrieval: candidates taken from each retriever before fusion, and how far the
+# top BM25 hit must lead the runner-up to answer a single-entity question lexically
+HYBRID_CANDIDATES = 50
+LEXICAL_DECISIVE_MARGIN = 1.25
+
+# Documents are indexed in one FAISS sub-index per (set, patch, type) shard, so a
+# search filtered on any of these fields only scans the shards that can match
+SHARD_FIELDS = ("set", "patch", "type")
+ShardKey = Tuple[str, str, str]
+Filters = Dict[str, Union[str, Iterable[str]]]
+
+
+def shard_key(doc: Dict) -> ShardKey:
+    """The shard a document is indexed in"""
+    metadata = doc.get('metadata', {})
+    return tuple(str(metadata.get(field, '')) for field in SHARD_FIELDS)
+
+
+def _group_by_shard(documents: List[Dict]) -> Dict[ShardKey, List[int]]:
+    shards = defaultdict(list)
+    for position, doc in enumerate(documents):
+        shards[shard_key(doc)].append(position)
+    return dict(shards)
+
+
+def shard_matches(key: ShardKey, filters: Filters) -> bool:
+    """Whether a shard satisfies every field of `filters`"""
+    for field, value in filters.items():
+        if field not in SHARD_FIELDS:
+            raise ValueError(f"Cannot filter on {field!r}, only on {', '.join(SHARD_FIELDS)}")
+        allowed = {value} if isinstance(value, str) else set(value)
+        if key[SHARD_FIELDS.index(field)] not in allowed:
+            return False
+    return True
+
+
+def _backoff_delay(attempt: int, error: Exception, base: float = 1.0, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter, honouring a Retry-After header when present"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after:
+        try:
+            return min(float(retry_after), cap)
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
 class TFTVectorStore:
     """FAISS-based vector store for TFT Set 15 data"""
     
-    def __init__(self, openai_api_key: str):
-        self.client = OpenAI(api_key=openai_api_key)
-        self.index = None
+    def __init__(self, openai_api_key: str, client=None, embedding_cache: Optional[EmbeddingCache] = None,
+                 query_cache: Optional[QueryEmbeddingCache] = None, index_type: str = "flat",
+                 nprobe: int = DEFAULT_NPROBE, embedding_provider: Optional[EmbeddingProvider] = None):
+        # Embeddings come from OpenAI unless another provider is given; `client` lets callers inject
+        # any object exposing `embeddings.create` (e.g. mock_openai.FakeOpenAIClient)
+        self.embedding_provider = embedding_provider or OpenAIEmbeddingProvider(client, api_key=openai_api_key)
+        self.embedding_cache = embedding_cache
+        self.query_cache = query_cache
+        # Guards query embedding calls; while it is open hybrid search ranks by BM25 alone
+        self.embedding_breaker: Optional[CircuitBreaker] = None
+        self.index_type = index_type  # See index_backends.INDEX_TYPES
+        self.nprobe = nprobe
+        self.dimension: Optional[int] = None
+        self._shards: Dict[ShardKey, faiss.Index] = {}
+        # Shards of a loaded index file that no search has needed yet, built from the memory-mapped file on first use
+        self._shard_loaders: Dict[ShardKey, Callable[[], faiss.Index]] = {}
+        self._shard_lock = threading.Lock()
+        self._shard_positions: Dict[ShardKey, List[int]] = {}
         self.documents = []
-        self.embeddings = []
+        self.ids: List[int] = []  # FAISS id of each document in self.documents
+        self._positions: Dict[int, int] = {}
+        self._next_id = 0
+        self.fingerprint: Optional[str] = None  # Changes whenever the indexed documents change
+        self.structured = StructuredIndex([])
+        self.lexical = BM25Index([])
+        self.hybrid = True  # Fuse BM25 with dense results in get_relevant_context
+        self._lowercase_contents: List[str] = []
+        self.document_stats: Dict = {}  # Recomputed with the other document views
         self.encoding = tiktoken.get_encoding("cl100k_base")
         
+    @property
+    def is_built(self) -> bool:
+        """Whether an index has been built or loaded"""
+        return bool(self._shards or self._shard_loaders)
+    
+    @property
+    def shard_keys(self) -> List[ShardKey]:
+        """Every (set, patch, type) shard of the index, loaded or not"""
+        return sorted(set(self._shards) | set(self._shard_loaders))
+    
+    def _shard(self, key: ShardKey) -> faiss.Index:
+        """The FAISS index of a shard, loading it on first use"""
+        index = self._shards.get(key)
+        if index is None:
+            with self._shard_lock:
+                index = self._shards.get(key)
+                if index is None:
+                    index = self._shards[key] = self._shard_loaders.pop(key)()
+                    logger.info(f"Loaded index shard {'/'.join(key)} with {index.ntotal} vectors")
+        return index
+    
+    def load_all_shards(self):
+        """Build every shard not loaded yet, e.g. before forking worker processes so they all share it"""
+        for key in list(self._shard_loaders):
+            self._shard(key)
+    
+    def _matching_shards(self, filters: Optional[Filters]) -> List[ShardKey]:
+        if not filters:
+            return self.shard_keys
+        return [key for key in self.shard_keys if shard_matches(key, filters)]
+    
+    def _filtered_positions(self, filters: Optional[Filters]) -> Optional[set]:
+        """Document positions in the shards matching `filters`, or None for no filtering"""
+        if not filters:
+            return None
+        return {position for key in self._matching_shards(filters) for position in self._shard_positions.get(key, [])}
+    
+    @property
+    def embedding_model(self) -> str:
+        """Name of the embedding model, recorded in index files and cache keys"""
+        return self.embedding_provider.model
+    
     def get_embedding(self, text: str) -> List[float]:
-        """Get embedding for a text using OpenAI's text-embedding-ada-002"""
+        """Get the embedding of a text from the embedding provider"""
         try:
-            response = self.client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=text
-            )
-            return response.data[0].embedding
+            with self._embedding_call():
+                return self.embedding_provider.embed([text])[0]
+        except CircuitOpenError:
+            raise
         except Exception as e:
+            UPSTREAM_ERRORS.inc(upstream="embeddings", error=type(e).__name__)
             logger.error(f"Error getting embedding: {e}")
             raise
     
-    def create_embeddings(self, documents: List[Dict]) -> List[List[float]]:
-        """Create embeddings for all documents"""
-        embeddings = []
-        logger.info(f"Creating embeddings for {len(documents)} documents...")
-        
-        for i, doc in enumerate(documents):
+    def _embedding_call(self):
+        """Context guarding one query embedding call with the embedding circuit breaker, if any"""
+        return self.embedding_breaker.call() if self.embedding_breaker is not None else nullcontext()
+    
+    def _prepare_text(self, text: str) -> Tuple[str, int]:
+        """Truncate a document to the provider's per-input token limit and return it with its token count"""
+        tokens = self.encoding.encode(text)
+        limit = self.embedding_provider.max_input_tokens
+        if limit is not None and len(tokens) > limit:
+            tokens = tokens[:limit]
+            text = self.encoding.decode(tokens)
+        # The embeddings endpoint rejects empty strings
+        return (text or " "), max(len(tokens), 1)
+    
+    def _batch_texts(self, token_counts: List[int], max_batch_tokens: int, max_batch_size: int) -> List[List[int]]:
+        """Pack text indices into batches bounded by total token count and number of inputs"""
+        batches = []
+        current = []
+        current_tokens = 0
+        for i, n_tokens in enumerate(token_counts):
+            if current and (current_tokens + n_tokens > max_batch_tokens or len(current) >= max_batch_size):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += n_tokens
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _embed_batch(self, texts: List[str], max_retries: int) -> List[List[float]]:
+        """Embed one batch in a single provider call, retrying rate limits and transient errors with backoff"""
+        attempt = 0
+        while True:
             try:
-                embedding = self.get_embedding(doc['content'])
-                embeddings.append(embedding)
-                
-                if (i + 1) % 10 == 0:
-                    logger.info(f"Processed {i + 1}/{len(documents)} documents")
-                    
+                return self.embedding_provider.embed(texts)
             except Exception as e:
-                logger.error(f"Error creating embedding for document {i}: {e}")
-                # Use zero vector as fallback
-                embeddings.append([0.0] * 1536)  # OpenAI ada-002 embedding dimension
+                UPSTREAM_ERRORS.inc(upstream="embeddings", error=type(e).__name__)
+                if attempt >= max_retries or not self.embedding_provider.is_retryable(e):
+                    raise
+                delay = _backoff_delay(attempt, e)
+                attempt += 1
+                logger.warning(f"Embedding batch of {len(texts)} failed ({e}); retry {attempt}/{max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+    
+    def _embed_texts(self, texts: List[str], token_counts: List[int], max_batch_tokens: int,
+                     max_batch_size: int, max_concurrency: int, max_retries: int) -> List[Optional[List[float]]]:
+        """Embed texts in token-bounded batches sent concurrently; failed batches come back as None"""
+        batches = self._batch_texts(token_counts, max_batch_tokens, max_batch_size)
+        logger.info(f"Creating embeddings for {len(texts)} documents in {len(batches)} batches "
+                    f"(max {max_concurrency} concurrent)...")
+        
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        start = time.perf_counter()
+        done = 0
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = {
+                executor.submit(self._embed_batch, [texts[i] for i in batch], max_retries): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    for i, embedding in zip(batch, future.result()):
+                        embeddings[i] = embedding
+                except Exception as e:
+                    logger.error(f"Error creating embeddings for documents {batch[0]}-{batch[-1]}: {e}")
+                done += len(batch)
+                elapsed = time.perf_counter() - start
+                logger.info(f"Processed {done}/{len(texts)} documents ({done / max(elapsed, 1e-9):.1f} docs/s)")
         
-        logger.info("Finished creating embeddings")
+        elapsed = time.perf_counter() - start
+        logger.info(f"Finished creating embeddings in {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-9):.1f} docs/s)")
         return embeddings
     
-    def build_index(self, documents: List[Dict], embeddings: List[List[float]]):
+    def create_embeddings(self, documents: List[Dict],
+                          max_batch_tokens: Optional[int] = None,
+                          max_batch_size: Optional[int] = None,
+                          max_concurrency: Optional[int] = None,
+                          max_retries: Optional[int] = None) -> np.ndarray:
+        """Create embeddings for all documents, embedding only those missing from the cache.
+        
+        Batching, concurrency and retries default to the embedding provider's settings.
+        Returns a (documents, dimension) float32 matrix; cached vectors are stacked
+        into it as they are, without a round trip through Python lists.
+        """
+        if not documents:
+            return np.empty((0, self.dimension or self.embedding_provider.dimension or 0), dtype=np.float32)
+        
+        provider = self.embedding_provider
+        max_batch_tokens = max_batch_tokens or provider.max_batch_tokens
+        max_batch_size = max_batch_size or provider.max_batch_size
+        max_concurrency = max_concurrency or provider.max_concurrency
+        max_retries = provider.max_retries if max_retries is None else max_retries
+        
+        contents = [doc.get('content', '') for doc in documents]
+        cached_rows: List[int] = []
+        cached_vectors: List[np.ndarray] = []
+        
+        keys = []
+        if self.embedding_cache is not None:
+            keys = [EmbeddingCache.key(self.embedding_model, content) for content in contents]
+            cached = self.embedding_cache.get_many(keys)
+            for i, key in enumerate(keys):
+                if key in cached:
+                    cached_rows.append(i)
+                    cached_vectors.append(cached[key])
+            logger.info(f"Embedding cache: {len(cached)}/{len(documents)} documents already embedded")
+        
+        cached_set = set(cached_rows)
+        missing = [i for i in range(len(documents)) if i not in cached_set]
+        embedded_rows: List[int] = []
+        embedded_vectors: List[List[float]] = []
+        if missing:
+            prepared = [self._prepare_text(contents[i]) for i in missing]
+            new_embeddings = self._embed_texts([text for text, _ in prepared], [n for _, n in prepared],
+                                               max_batch_tokens, max_batch_size, max_concurrency, max_retries)
+            for i, embedding in zip(missing, new_embeddings):
+                if embedding is not None:
+                    embedded_rows.append(i)
+                    embedded_vectors.append(embedding)
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many({keys[i]: embedding for i, embedding in zip(embedded_rows, embedded_vectors)})
+        
+        if cached_vectors:
+            dimension = len(cached_vectors[0])
+        elif embedded_vectors:
+            dimension = len(embedded_vectors[0])
+        else:
+            dimension = provider.dimension
+        if dimension is None:
+            raise RuntimeError(f"Failed to embed any of {len(documents)} documents with {self.embedding_model}")
+        
+        # Rows left at zero are the fallback for batches that failed after all retries (never cached)
+        embeddings = np.zeros((len(documents), dimension), dtype=np.float32)
+        if cached_rows:
+            embeddings[cached_rows] = np.stack(cached_vectors)
+        if embedded_rows:
+            embeddings[embedded_rows] = np.array(embedded_vectors, dtype=np.float32)
+        failed = len(documents) - len(cached_rows) - len(embedded_rows)
+        if failed:
+            logger.warning(f"{failed} documents fell back to zero vectors")
+        return embeddings
+    
+    def build_index(self, documents: List[Dict], embeddings: np.ndarray):
         """Build FAISS index from embeddings"""
-        if not embeddings:
+        if len(embeddings) == 0:
             raise ValueError("No embeddings provided")
         
         # Convert to numpy array
@@ -63,82 +320,518 @@ class TFTVectorStore:
         # Normalize embeddings for cosine similarity
         faiss.normalize_L2(embeddings_array)
         
-        # Create FAISS index
-        dimension = embeddings_array.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
-        self.index.add(embeddings_array)
+        # Create one FAISS index per shard; the ID map lets sync() remove and replace vectors in place
+        ids = np.arange(len(documents), dtype=np.int64)
+        self._build_shards(documents, embeddings_array, ids)
         
         self.documents = documents
-        self.embeddings = embeddings
+        self._set_ids(ids.tolist())
+        
+        logger.info(f"Built {self.index_type} FAISS index with {len(documents)} documents "
+                    f"in {len(self._shards)} shards")
+    
+    def _build_shards(self, documents: List[Dict], vectors: np.ndarray, ids: np.ndarray):
+        """Index normalized vectors (row i belonging to documents[i]) in per-shard FAISS indexes"""
+        self.dimension = int(vectors.shape[1])
+        self._shard_loaders = {}
+        self._shards = {
+            key: create_index(vectors[positions], ids[positions], self.index_type, self.nprobe)
+            for key, positions in _group_by_shard(documents).items()
+        }
+    
+    def _set_ids(self, ids: List[int]):
+        """Record the FAISS id of each document (parallel to self.documents)"""
+        self.ids = ids
+        self._positions = {faiss_id: position for position, faiss_id in enumerate(ids)}
+        self._next_id = max(ids) + 1 if ids else 0
+        self._refresh_document_views()
+    
+    def _refresh_document_views(self):
+        """Recompute everything derived from self.documents (fingerprint and lookup structures)"""
+        digest = hashlib.sha256()
+        for doc in self.documents:
+            digest.update(self.document_key(doc).encode('utf-8'))
+            digest.update(doc.get('content', '').encode('utf-8'))
+        self.fingerprint = digest.hexdigest()[:16]
+        
+        self.structured = StructuredIndex(self.documents)
+        self.lexical = BM25Index(self.documents)
+        self._shard_positions = _group_by_shard(self.documents)
+        self._lowercase_contents = [doc.get('content', '').lower() for doc in self.documents]
+        self.document_stats = self._count_documents()
+    
+    def _count_documents(self) -> Dict:
+        """Document counts by type and by set, read off the shard groups rather than the documents"""
+        types = defaultdict(int)
+        sets = defaultdict(int)
+        for (set_name, _, doc_type), positions in self._shard_positions.items():
+            types[doc_type or "unknown"] += len(positions)
+            if set_name:
+                sets[set_name] += len(positions)
+        return {"total_documents": len(self.documents), "types": dict(sorted(types.items())),
+                "sets": dict(sorted(sets.items())), "fingerprint": self.fingerprint}
+    
+    @staticmethod
+    def document_key(doc: Dict) -> str:
+        """Stable identity of a document across knowledge base versions"""
+        metadata = doc.get('metadata', {})
+        if metadata.get('id'):
+            # The same entity can appear in several sets and patches
+            scope = [str(metadata[field]) for field in ("set", "patch") if metadata.get(field)]
+            return "/".join(scope + [str(metadata['id'])])
+        if metadata.get('name'):
+            return f"{metadata.get('type', '')}:{metadata['name']}"
+        return EmbeddingCache.key("content", doc.get('content', ''))
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Get the L2-normalized embedding of a query, served from the query cache when possible"""
+        if self.query_cache is not None:
+            cached = self.query_cache.get(query)
+            if cached is not None:
+                return cached
+        
+        # Failed provider calls are counted where they are made, in get_embedding and _embed_batch
+        with stage("query_embedding"):
+            query_vector = np.array([self.get_embedding(query)], dtype=np.float32)
+        faiss.normalize_L2(query_vector)
+        query_vector = query_vector[0]
+        
+        if self.query_cache is not None:
+            self.query_cache.put(query, query_vector)
+        return query_vector
+    
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """L2-normalized embeddings of many queries as one (n, dimension) matrix.
+        
+        Raises RuntimeError when any query could not be embedded.
+        """
+        vectors = self._embed_queries(queries)
+        failed = sum(1 for vector in vectors if vector is None)
+        if failed:
+            raise RuntimeError(f"Failed to embed {failed} queries")
+        if not vectors:
+            return np.empty((0, self.dimension or self.embedding_provider.dimension or 0), dtype=np.float32)
+        return np.vstack(vectors).astype(np.float32, copy=False)
+    
+    def _embed_queries(self, queries: List[str]) -> List[Optional[np.ndarray]]:
+        """L2-normalized embedding of each query, None for queries whose batch failed after all retries.
         
-        logger.info(f"Built FAISS index with {len(documents)} documents")
+        Query cache hits are reused; the rest are embedded in token-bounded batched
+        requests, like documents in create_embeddings. Raises when the embedding
+        circuit breaker is open or not a single query could be embedded.
+        """
+        vectors: List[Optional[np.ndarray]] = [
+            self.query_cache.get(query) if self.query_cache is not None else None for query in queries
+        ]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            prepared = [self._prepare_text(queries[i]) for i in missing]
+            provider = self.embedding_provider
+            with self._embedding_call(), stage("query_embedding", queries=len(missing)):
+                embedded = self._embed_texts([text for text, _ in prepared], [n for _, n in prepared],
+                                             provider.max_batch_tokens, provider.max_batch_size,
+                                             provider.max_concurrency, provider.max_retries)
+                if all(embedding is None for embedding in embedded):
+                    raise RuntimeError(f"Failed to embed {len(missing)} queries")
+            for i, embedding in zip(missing, embedded):
+                if embedding is None:
+                    continue
+                vector = np.array([embedding], dtype=np.float32)
+                faiss.normalize_L2(vector)
+                vectors[i] = vector[0]
+                if self.query_cache is not None:
+                    self.query_cache.put(queries[i], vectors[i])
+        return vectors
     
-    def search(self, query: str, k: int = 5) -> List[Tuple[Dict, float]]:
-        """Search for similar documents"""
-        if not self.index:
+    def search(self, query: str, k: int = 5, filters: Optional[Filters] = None) -> List[Tuple[Dict, float]]:
+        """Search for similar documents.
+        
+        `filters` maps shard fields (set, patch, type) to a value or a list of values;
+        only the shards matching every field are searched.
+        """
+        if not self.is_built:
             raise ValueError("Index not built. Call build_index() first.")
         
         # Get query embedding
-        query_embedding = self.get_embedding(query)
-        query_vector = np.array([query_embedding], dtype=np.float32)
-        faiss.normalize_L2(query_vector)
+        query_vector = self.embed_query(query)
         
-        # Search
-        scores, indices = self.index.search(query_vector, k)
+        return [(self.documents[position], score) for position, score in self._dense_search(query_vector, k, filters)]
+    
+    def _dense_search(self, query_vector: np.ndarray, k: int,
+                      filters: Optional[Filters] = None) -> List[Tuple[int, float]]:
+        """FAISS search returning (document position, cosine score) pairs"""
+        return self._dense_search_many(query_vector.reshape(1, -1), k, filters)[0]
+    
+    def _dense_search_many(self, query_vectors: np.ndarray, k: int,
+                           filters: Optional[Filters] = None) -> List[List[Tuple[int, float]]]:
+        """One FAISS search per matching shard over a matrix of query vectors, merged into (position, score) pairs per query"""
+        if len(query_vectors) == 0:
+            return []
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
         
-        # Return results
-        results = []
-        for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-            if idx < len(self.documents):
-                results.append((self.documents[idx], float(score)))
+        with stage("dense_search", queries=len(query_vectors)):
+            candidates = [[] for _ in range(len(query_vectors))]
+            for key in self._matching_shards(filters):
+                shard = self._shard(key)
+                if shard.ntotal == 0:
+                    continue
+                scores, indices = shard.search(query_vectors, min(k, shard.ntotal))
+                for row, row_scores, row_ids in zip(candidates, scores, indices):
+                    for score, faiss_id in zip(row_scores, row_ids):
+                        position = self._positions.get(int(faiss_id))
+                        if position is not None:
+                            row.append((float(score), position))
+            
+            return [[(position, score) for score, position in heapq.nlargest(k, row)] for row in candidates]
+    
+    def _dense_search_each(self, query_vectors: np.ndarray, k: int,
+                           filters: List[Optional[Filters]]) -> List[List[Tuple[int, float]]]:
+        """`_dense_search_many` with filters per query; queries with the same filters share their shard searches"""
+        groups = defaultdict(list)
+        for row, query_filters in enumerate(filters):
+            groups[json.dumps(query_filters, sort_keys=True, default=sorted)].append(row)
         
+        results: List[List[Tuple[int, float]]] = [[] for _ in filters]
+        for rows in groups.values():
+            for row, dense in zip(rows, self._dense_search_many(query_vectors[rows], k, filters[rows[0]])):
+                results[row] = dense
         return results
     
+    def search_many(self, queries: List[str], k: int = 5, filters: Optional[List[Optional[Filters]]] = None
+                    ) -> Tuple[List[List[Tuple[Dict, float]]], List[Optional[np.ndarray]]]:
+        """`search` for many queries, with optional filters per query: batched embedding calls and one search per shard.
+        
+        Returns the results per query and the query embeddings used.
+        """
+        if not self.is_built:
+            raise ValueError("Index not built. Call build_index() first.")
+        
+        query_vectors = self.embed_queries(queries)
+        results = [[(self.documents[position], score) for position, score in dense]
+                   for dense in self._dense_search_each(query_vectors, k, filters or [None] * len(queries))]
+        return results, list(query_vectors)
+    
+    def _is_decisive_lexical_match(self, query: str, lexical: List[Tuple[int, float]]) -> bool:
+        """Whether a query names exactly one entity and BM25 ranks that entity's document clearly first"""
+        if not lexical:
+            return False
+        names = set(self.structured.names_in(query))
+        if len(names) != 1:
+            return False
+        name = names.pop()
+        top_position, top_score = lexical[0]
+        if self.documents[top_position].get('metadata', {}).get('name', '').lower() != name:
+            return False
+        return len(lexical) == 1 or top_score >= LEXICAL_DECISIVE_MARGIN * lexical[1][1]
+    
+    def hybrid_search(self, query: str, k: int = 5, filters: Optional[Filters] = None) -> List[Tuple[Dict, float]]:
+        """BM25 + dense retrieval fused by reciprocal rank, both restricted to the shards matching `filters`.
+        
+        When the question names a single entity that BM25 ranks clearly first, the
+        lexical ranking is returned directly and no embedding call is made. The same
+        BM25-only ranking is returned when the query cannot be embedded (upstream
+        failure or open circuit).
+        """
+        if not self.is_built:
+            raise ValueError("Index not built. Call build_index() first.")
+        
+        with stage("lexical_search"):
+            lexical = self.lexical.search(query, max(k, HYBRID_CANDIDATES), self._filtered_positions(filters))
+        if self._is_decisive_lexical_match(query, lexical):
+            return self._lexical_results(lexical, k)
+        
+        try:
+            query_vector = self.embed_query(query)
+        except Exception as e:
+            logger.warning(f"Ranking by BM25 alone, the query could not be embedded: {e}")
+            return self._lexical_results(lexical, k)
+        dense = self._dense_search(query_vector, max(k, HYBRID_CANDIDATES), filters)
+        return self._fuse(dense, lexical, k)
+    
+    def lexical_search(self, query: str, k: int = 5, filters: Optional[Filters] = None) -> List[Tuple[Dict, float]]:
+        """BM25 ranking alone, restricted to the shards matching `filters`; never calls the embedding upstream"""
+        with stage("lexical_search"):
+            lexical = self.lexical.search(query, k, self._filtered_positions(filters))
+        return self._lexical_results(lexical, k)
+    
+    def _lexical_results(self, lexical: List[Tuple[int, float]], k: int) -> List[Tuple[Dict, float]]:
+        """The top BM25 results, scored relative to the first"""
+        if not lexical:
+            return []
+        top_score = lexical[0][1]
+        return [(self.documents[position], score / top_score) for position, score in lexical[:k]]
+    
+    def _fuse(self, dense: List[Tuple[int, float]], lexical: List[Tuple[int, float]], k: int) -> List[Tuple[Dict, float]]:
+        fused = reciprocal_rank_fusion([[position for position, _ in dense], [position for position, _ in lexical]])
+        return [(self.documents[position], score) for position, score in fused[:k]]
+    
+    def hybrid_search_many(self, queries: List[str], k: int = 5,
+                           filters: Optional[List[Optional[Filters]]] = None
+                           ) -> Tuple[List[List[Tuple[Dict, float]]], List[Optional[np.ndarray]]]:
+        """`hybrid_search` for many queries, with optional filters per query.
+        
+        Queries BM25 doesn't settle on its own are embedded in batched calls and
+        searched with one FAISS search per shard and distinct filters; those that cannot
+        be embedded are ranked by BM25 alone. Returns the results per query and the
+        query embeddings used (None where only the lexical ranking was used).
+        """
+        if not self.is_built:
+            raise ValueError("Index not built. Call build_index() first.")
+        
+        filters = filters or [None] * len(queries)
+        candidates = max(k, HYBRID_CANDIDATES)
+        with stage("lexical_search", queries=len(queries)):
+            lexical = [self.lexical.search(query, candidates, self._filtered_positions(query_filters))
+                       for query, query_filters in zip(queries, filters)]
+        results: List[Optional[List[Tuple[Dict, float]]]] = [None] * len(queries)
+        pending = []
+        for i, query in enumerate(queries):
+            if self._is_decisive_lexical_match(query, lexical[i]):
+                results[i] = self._lexical_results(lexical[i], k)
+            else:
+                pending.append(i)
+        
+        vectors: List[Optional[np.ndarray]] = [None] * len(queries)
+        try:
+            embedded = self._embed_queries([queries[i] for i in pending])
+        except Exception as e:
+            logger.warning(f"Ranking {len(pending)} queries by BM25 alone, they could not be embedded: {e}")
+            embedded = [None] * len(pending)
+        for i, query_vector in zip(pending, embedded):
+            if query_vector is None:
+                results[i] = self._lexical_results(lexical[i], k)
+        pending = [(i, query_vector) for i, query_vector in zip(pending, embedded) if query_vector is not None]
+        if pending:
+            query_vectors = np.vstack([query_vector for _, query_vector in pending])
+            dense_results = self._dense_search_each(query_vectors, candidates, [filters[i] for i, _ in pending])
+            for (i, query_vector), dense in zip(pending, dense_results):
+                results[i] = self._fuse(dense, lexical[i], k)
+                vectors[i] = query_vector
+        return results, vectors
+    
+    def sync(self, documents: List[Dict]) -> Dict[str, int]:
+        """Incrementally update the index to match `documents`, diffed by metadata id.
+        
+        Only added documents and documents whose content or shard changed are embedded;
+        removed and replaced vectors are dropped from their shard's index by id, in place.
+        """
+        if not self.is_built:
+            self.build_index(documents, self.create_embeddings(documents))
+            return {"added": len(documents), "removed": 0, "changed": 0, "unchanged": 0}
+        
+        current = {self.document_key(doc): (faiss_id, doc) for faiss_id, doc in zip(self.ids, self.documents)}
+        incoming = {}
+        for doc in documents:
+            key = self.document_key(doc)
+            if key in incoming:
+                logger.warning(f"Duplicate document id {key} in knowledge base; keeping the last one")
+            incoming[key] = doc
+        
+        removed = [key for key in current if key not in incoming]
+        added = [key for key in incoming if key not in current]
+        changed = [key for key in incoming
+                   if key in current and (current[key][1].get('content') != incoming[key].get('content')
+                                          or shard_key(current[key][1]) != shard_key(incoming[key]))]
+        
+        to_embed = changed + added
+        new_ids = {key: current[key][0] for key in changed}
+        next_id = self._next_id
+        for key in added:
+            new_ids[key] = next_id
+            next_id += 1
+        # Embed before touching the index, so a failed call or a dimension mismatch leaves it as it was
+        if to_embed:
+            embeddings_array = np.asarray(self.create_embeddings([incoming[key] for key in to_embed]), dtype=np.float32)
+            if embeddings_array.shape[1] != self.dimension:
+                raise ValueError(f"Embedding dimension {embeddings_array.shape[1]} does not match index dimension {self.dimension}")
+            faiss.normalize_L2(embeddings_array)
+            ids = np.array([new_ids[key] for key in to_embed], dtype=np.int64)
+        
+        stale_ids = defaultdict(list)
+        for key in removed + changed:
+            faiss_id, doc = current[key]
+            stale_ids[shard_key(doc)].append(faiss_id)
+        for shard, faiss_ids in stale_ids.items():
+            index = self._shard(shard)
+            index.remove_ids(np.array(faiss_ids, dtype=np.int64))
+            if index.ntotal == 0:
+                del self._shards[shard]
+        
+        if to_embed:
+            for shard, rows in _group_by_shard([incoming[key] for key in to_embed]).items():
+                if shard in self._shards or shard in self._shard_loaders:
+                    self._shard(shard).add_with_ids(embeddings_array[rows], ids[rows])
+                else:
+                    self._shards[shard] = create_index(embeddings_array[rows], ids[rows], self.index_type, self.nprobe)
+        
+        # Metadata-only edits within a shard keep their vectors and just take the new document
+        self.documents = list(incoming.values())
+        self._set_ids([new_ids.get(key, current[key][0] if key in current else None) for key in incoming])
+        self._next_id = max(self._next_id, next_id)
+        
+        summary = {
+            "added": len(added),
+            "removed": len(removed),
+            "changed": len(changed),
+            "unchanged": len(incoming) - len(added) - len(changed)
+        }
+        logger.info(f"Synced index: {summary}")
+        return summary
+
+    def apply_delta(self, upserts: List[Dict], removed: List[Dict]) -> Dict[str, int]:
+        """Sync to the current documents with `upserts` added or replaced and `removed` dropped (matched by
+        document_key), so a knowledge base delta is applied without the full knowledge base"""
+        documents = {self.document_key(doc): doc for doc in self.documents}
+        for doc in removed:
+            documents.pop(self.document_key(doc), None)
+        for doc in upserts:
+            documents[self.document_key(doc)] = doc
+        return self.sync(list(documents.values()))
+
     def save_index(self, filepath: str):
-        """Save FAISS index and documents to disk"""
-        if not self.index:
+        """Save every shard, the ids and the documents to a single pickle-free index file, replaced atomically.
+        
+        Flat shards store their float32 vectors and ids, which are memory-mapped on
+        load; quantized shards store the serialized FAISS index, which is much smaller.
+        """
+        if not self.is_built:
             raise ValueError("No index to save")
         
-        # Save FAISS index
-        faiss.write_index(self.index, f"{filepath}.faiss")
+        sections = {}
+        shards = []
+        for number, key in enumerate(self.shard_keys):
+            index = self._shard(key)
+            name = f"shard{number}"
+            if self.index_type == "flat":
+                sections[f"{name}.vectors"] = index.index.reconstruct_n(0, index.ntotal)
+                sections[f"{name}.ids"] = faiss.vector_to_array(index.id_map)
+            else:
+                sections[f"{name}.index"] = faiss.serialize_index(index)
+            shards.append({"section": name, "count": int(index.ntotal), **dict(zip(SHARD_FIELDS, key))})
+        sections["ids"] = np.array(self.ids, dtype=np.int64)
+        sections["documents"] = json.dumps(self.documents, ensure_ascii=False).encode('utf-8')
+        metadata = {
+            "model": self.embedding_model,
+            "dimension": self.dimension,
+            "count": len(self.documents),
+            "index_type": self.index_type,
+            "shards": shards,
+            "fingerprint": self.fingerprint,
+            "created_at": time.time()
+        }
+        write_index_file(f"{filepath}{INDEX_FILE_SUFFIX}", metadata, sections)
+        
+        logger.info(f"Saved index to {filepath}{INDEX_FILE_SUFFIX}")
+    
+    def load_index(self, filepath: str, verify: bool = True):
+        """Load an index from disk without any network calls.
         
-        # Save documents
-        with open(f"{filepath}.pkl", 'wb') as f:
-            pickle.dump(self.documents, f)
+        The single-file format is memory-mapped and checksum-verified; each shard's
+        FAISS index is only built when a search first needs it. `index_type` becomes the
+        type the file was saved with. Legacy `.faiss` + `.pkl` pairs are still read.
+        """
+        start = time.perf_counter()
+        if os.path.exists(f"{filepath}{INDEX_FILE_SUFFIX}"):
+            metadata, sections = read_index_file(f"{filepath}{INDEX_FILE_SUFFIX}", verify=verify)
+            if metadata.get("model") != self.embedding_model:
+                raise IndexFormatError(f"Index was built with {metadata.get('model')}, expected {self.embedding_model}")
+            expected_dimension = self.embedding_provider.dimension
+            if expected_dimension is not None and metadata.get("dimension") not in (None, expected_dimension):
+                raise IndexFormatError(f"Index has {metadata.get('dimension')}-dimensional vectors, "
+                                       f"{self.embedding_model} produces {expected_dimension}")
+            self.documents = json.loads(sections["documents"].decode('utf-8'))
+            self._set_ids(sections["ids"].tolist())
+            self.index_type = metadata.get("index_type", "flat")
+            self.dimension = metadata.get("dimension")
+            self._shards = {}
+            self._shard_loaders = self._shard_loaders_for(metadata, sections)
+        else:
+            self._load_legacy_index(filepath)
         
-        logger.info(f"Saved index to {filepath}")
+        logger.info(f"Loaded index from {filepath} with {len(self.documents)} documents "
+                    f"in {(time.perf_counter() - start) * 1000:.1f}ms")
     
-    def load_index(self, filepath: str):
-        """Load FAISS index and documents from disk"""
-        # Load FAISS index
-        self.index = faiss.read_index(f"{filepath}.faiss")
+    def _shard_loaders_for(self, metadata: Dict, sections: Dict) -> Dict[ShardKey, Callable[[], faiss.Index]]:
+        if "shards" not in metadata:
+            if "vectors" not in sections:
+                raise IndexFormatError("Index file predates sharding and holds a quantized index; rebuild it")
+            # Unsharded flat file: vectors are in document order, split them up by shard
+            ids = np.array(self.ids, dtype=np.int64)
+            return {key: partial(self._load_flat_shard, sections["vectors"], ids, positions)
+                    for key, positions in self._shard_positions.items()}
         
-        # Load documents
+        loaders = {}
+        for shard in metadata["shards"]:
+            key = tuple(shard[field] for field in SHARD_FIELDS)
+            name = shard["section"]
+            if self.index_type == "flat":
+                loaders[key] = partial(self._load_flat_shard, sections[f"{name}.vectors"], sections[f"{name}.ids"])
+            else:
+                loaders[key] = partial(self._load_serialized_shard, sections[f"{name}.index"])
+        return loaders
+    
+    @staticmethod
+    def _load_flat_shard(vectors: np.ndarray, ids: np.ndarray, rows: Optional[List[int]] = None) -> faiss.Index:
+        if rows is not None:
+            vectors, ids = vectors[rows], ids[rows]
+        return create_index(vectors, ids, "flat")
+    
+    def _load_serialized_shard(self, data: np.ndarray) -> faiss.Index:
+        index = unwrap_ivf(faiss.deserialize_index(np.asarray(data)))
+        set_nprobe(index, self.nprobe)
+        return index
+    
+    def _load_legacy_index(self, filepath: str):
+        """Load the older FAISS + pickle index pair"""
+        index = faiss.read_index(f"{filepath}.faiss")
         with open(f"{filepath}.pkl", 'rb') as f:
-            self.documents = pickle.load(f)
+            saved = pickle.load(f)
         
-        logger.info(f"Loaded index from {filepath} with {len(self.documents)} documents")
-    
-    def get_relevant_context(self, query: str, k: int = 3) -> str:
-        """Get relevant context for a query"""
-        results = self.search(query, k)
+        if isinstance(saved, dict):
+            documents = saved["documents"]
+            ids = saved["ids"]
+        else:
+            # Older indexes stored a bare document list alongside a plain IndexFlatIP
+            documents = saved
+            ids = list(range(len(saved)))
+        
+        if isinstance(index, faiss.IndexIDMap):
+            stored = index.index.reconstruct_n(0, index.ntotal)
+            rows = {int(faiss_id): row for row, faiss_id in enumerate(faiss.vector_to_array(index.id_map))}
+            vectors = stored[[rows[faiss_id] for faiss_id in ids]]
+        else:
+            vectors = index.reconstruct_n(0, index.ntotal)
         
-        context = ""
-        for i, (doc, score) in enumerate(results):
-            context += f"Document {i+1} (Relevance: {score:.3f}):\n{doc['content']}\n\n"
+        self.index_type = "flat"
+        self._build_shards(documents, vectors, np.array(ids, dtype=np.int64))
+        self.documents = documents
+        self._set_ids(ids)
+    
+    def get_relevant_context(self, query: str, k: int = 3, filters: Optional[Filters] = None,
+                             lexical_only: bool = False) -> str:
+        """Get relevant context for a query; `lexical_only` ranks by BM25 alone, without an embedding call"""
+        if lexical_only:
+            results = self.lexical_search(query, k, filters)
+        elif self.hybrid:
+            results = self.hybrid_search(query, k, filters)
+        else:
+            results = self.search(query, k, filters)
         
-        return context.strip()
+        return "\n\n".join(
+            f"Document {i+1} (Relevance: {score:.3f}):\n{doc['content']}" for i, (doc, score) in enumerate(results)
+        )
     
     def search_by_pattern(self, pattern: str) -> List[Dict]:
         """Search for documents containing a specific pattern"""
-        matching_docs = []
-        for doc in self.documents:
-            if pattern.lower() in doc.get('content', '').lower():
-                matching_docs.append(doc)
-        return matching_docs
+        pattern = pattern.lower()
+        return [doc for doc, content in zip(self.documents, self._lowercase_contents) if pattern in content]
     
     def index_exists(self, filepath: str) -> bool:
-        """Check if index files exist"""
+        """Check if an index file (or a legacy FAISS + pickle pair) exists"""
+        return os.path.exists(f"{filepath}{INDEX_FILE_SUFFIX}") or self.legacy_index_exists(filepath)
+    
+    def legacy_index_exists(self, filepath: str) -> bool:
+        """Check if a legacy FAISS + pickle index pair exists"""
         return os.path.exists(f"{filepath}.faiss") and os.path.exists(f"{filepath}.pkl")
 
 if __name__ == "__main__":